@@ -3,9 +3,17 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, CallbackQueryHandler, CommandHandler, filters
 from telegram.constants import ParseMode
 
-from database import (
-    get_user_stats, get_feedback, get_all_user_ids
-)
+from async_db import db
+from localization import get_language_cache_stats
+from storage_config import get_storage_status
+from http_client import http
+from price_service import prices
+from money import format_amount
+from broadcast import create_broadcast, run_broadcast, get_broadcast_progress
+from outbox import outbox
+from news_service import NEWS_FEED_URLS, format_feed_health
+from database import get_news_feed_states
+from job_checkpoints import get_job_checkpoints, JOB_SKIPPED
 from keyboards import (
     get_admin_menu_keyboard
 )
@@ -38,10 +46,51 @@ async def admin_password_handler(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text("Ein Fehler ist aufgetreten.")
         return States.ADMIN_LOGIN_PASSWORD
 
+def _escape_markdown(text: str) -> str:
+    # Markdown (v1): nur diese Zeichen werden mit Backslash maskiert
+    for char in ('_', '*', '`', '['):
+        text = text.replace(char, '\\' + char)
+    return text
+
 async def admin_bot_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        stats = get_user_stats()
+        stats = await db.get_user_stats()
         text = f"📊 Bot Status\n\nGesamtzahl Nutzer: {stats['total_users']}\nNutzer mit Feedback: {stats['users_with_feedback']}\nGesamtzahl Produkte: {stats['total_products']}\nGesamtzahl Transaktionen: {stats['total_transactions']}"
+        db_stats = db.stats()
+        text += (f"\n\nDB-Queue: {db_stats['queue_depth']}/{db_stats['queue_capacity']} (max {db_stats['max_queue_depth']})"
+                 f"\nDB-Wartezeit p50/p99: {db_stats['wait_ms_p50']:.1f}/{db_stats['wait_ms_p99']:.1f} ms")
+        pending_fees, pending_count = await db.get_pending_fees()
+        text += f"\nOffene Gebühren: {format_amount(pending_fees)} SCAMCOIN ({pending_count} Käufe)"
+        lang_stats = get_language_cache_stats()
+        text += f"\nSprach-Cache: {lang_stats['hits']} Treffer / {lang_stats['misses']} Fehlgriffe ({lang_stats['hit_ratio']:.0%})"
+        storage = await db.run(get_storage_status)
+        text += (f"\n\nSQLite: {storage['journal_mode']}, synchronous={storage['synchronous']}, Cache {storage['cache_size_kb']} KiB"
+                 f"\nDB-Größe: {storage['db_size_kb']} KiB, WAL: {storage['wal_size_kb']} KiB")
+        checkpoint = storage['last_checkpoint']
+        if checkpoint:
+            text += f"\nLetzter Checkpoint: {checkpoint['at']} ({checkpoint['mode']}, {checkpoint['checkpointed_frames']}/{checkpoint['log_frames']} Frames)"
+        if storage['last_optimize']:
+            text += f"\nLetztes optimize: {storage['last_optimize']['at']}"
+        price_stats = prices.stats()
+        text += (f"\nPreis-Cache: {price_stats['cached_symbols']} Symbole, Trefferquote {price_stats['hit_ratio']:.0%}"
+                 f", {price_stats['upstream_requests']} Upstream-Anfragen ({price_stats['coalesced']} zusammengelegt)")
+        http_stats = http.stats()
+        text += (f"\n\nHTTP: {http_stats['connections']} Verbindungen ({http_stats['idle_connections']} frei), HTTP/2 {'an' if http_stats['http2'] else 'aus'}"
+                 f"\nHTTP-Anfragen: {http_stats['requests']} ({http_stats['failed']} fehlgeschlagen), p50/p99: {http_stats['latency_ms_p50']:.0f}/{http_stats['latency_ms_p99']:.0f} ms")
+        outbox_stats = outbox.stats()
+        queued = outbox_stats['queued']
+        text += (f"\n\nSende-Queue: {queued['interactive']}/{queued['transactional']}/{queued['bulk']} wartend (interaktiv/Transaktion/Bulk)"
+                 f", {outbox_stats['sent']} gesendet, {outbox_stats['failed']} fehlgeschlagen, {outbox_stats['retries']} Wiederholungen"
+                 f"\nWartezeit p99 interaktiv/Bulk: {outbox_stats['wait_ms_p99']['interactive']:.0f}/{outbox_stats['wait_ms_p99']['bulk']:.0f} ms")
+        for progress in get_broadcast_progress():
+            text += (f"\nBroadcast {progress['id']}: {progress['sent']} gesendet, {progress['blocked']} blockiert"
+                     f", {progress['rate_per_second']:.1f}/s")
+        feed_states = await db.run(get_news_feed_states, NEWS_FEED_URLS)
+        text += "\n\nNews-Feeds:\n" + _escape_markdown(format_feed_health(feed_states))
+        text += "\n\nJobs:"
+        for job in await db.run(get_job_checkpoints):
+            running = f", läuft bis {job['lease_expires_at']}" if job['lease_owner'] else ""
+            text += f"\n{_escape_markdown(job['job'])}: {job['last_run_at'] or 'nie'} ({job['last_status'] or '-'}){running}"
         await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=get_admin_menu_keyboard())
     except Exception as e:
         logger.error(f"Error in admin_bot_status: {e}")
@@ -50,7 +99,7 @@ async def admin_bot_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def admin_read_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        feedbacks = get_feedback()
+        feedbacks = await db.get_feedback()
         if not feedbacks:
             await update.callback_query.edit_message_text("Kein Feedback verfügbar.", reply_markup=get_admin_menu_keyboard())
             return
@@ -67,7 +116,9 @@ async def admin_check_news_manual(update: Update, context: ContextTypes.DEFAULT_
     try:
         await update.callback_query.edit_message_text("Starte manuelle News-Prüfung...", reply_markup=get_admin_menu_keyboard())
         # Assuming check_and_post_news is imported or accessible
-        await context.bot_data['check_and_post_news'](context)
+        if await context.bot_data['check_and_post_news'](context, force=True) is JOB_SKIPPED:
+            await update.callback_query.edit_message_text("News-Prüfung übersprungen: sie läuft gerade bereits.", reply_markup=get_admin_menu_keyboard())
+            return
         await update.callback_query.edit_message_text("Manuelle News-Prüfung abgeschlossen.", reply_markup=get_admin_menu_keyboard())
     except Exception as e:
         logger.error(f"Error in admin_check_news_manual: {e}")
@@ -102,25 +153,19 @@ async def broadcast_confirm_handler(update: Update, context: ContextTypes.DEFAUL
         query = update.callback_query
         await query.answer()
         if query.data == 'no':
-            await update.edit_message_text("Broadcast abgebrochen.", reply_markup=get_admin_menu_keyboard())
+            await query.edit_message_text("Broadcast abgebrochen.", reply_markup=get_admin_menu_keyboard())
             context.user_data.pop('broadcast_message', None)
             return ConversationHandler.END
 
         message = context.user_data.pop('broadcast_message', None)
         if not message:
-            await update.edit_message_text("Fehler: Keine Nachricht gefunden.", reply_markup=get_admin_menu_keyboard())
+            await query.edit_message_text("Fehler: Keine Nachricht gefunden.", reply_markup=get_admin_menu_keyboard())
             return ConversationHandler.END
 
-        await update.edit_message_text("Sende Broadcast...")
-        sent, failed = 0, 0
-        for user_id in get_all_user_ids():
-            try:
-                await context.bot.send_message(chat_id=user_id, text=message)
-                sent += 1
-                await asyncio.sleep(0.1)
-            except Exception:
-                failed += 1
-        await update.edit_message_text(f"Broadcast abgeschlossen!\nGesendet: {sent}\nFehlgeschlagen: {failed}", reply_markup=get_admin_menu_keyboard())
+        # Läuft als eigener Task weiter, der Handler wartet nicht auf alle Nutzer
+        await query.edit_message_text("📢 Broadcast läuft...")
+        broadcast_id = await db.run(create_broadcast, message, query.message.chat.id, query.message.message_id)
+        context.application.create_task(run_broadcast(context.bot, broadcast_id, reply_markup=get_admin_menu_keyboard()))
         return ConversationHandler.END
     except Exception as e:
         logger.error(f"Error in broadcast_confirm_handler: {e}")
@@ -1,6 +1,6 @@
 import os
 import asyncio
-import httpx
+from http_client import http
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
@@ -28,22 +28,21 @@ async def generate_image(prompt: str) -> str:
         }
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        prediction = response.json()
+    response = await http.post(url, headers=headers, json=data)
+    response.raise_for_status()
+    prediction = response.json()
 
-        # Poll for prediction result
-        prediction_url = prediction["urls"]["get"]
-        while True:
-            res = await client.get(prediction_url, headers=headers)
-            res.raise_for_status()
-            result = res.json()
-            if result["status"] == "succeeded":
-                return result["output"][0]
-            elif result["status"] == "failed":
-                raise RuntimeError("Image generation failed")
-            await asyncio.sleep(1)
+    # Poll for prediction result
+    prediction_url = prediction["urls"]["get"]
+    while True:
+        res = await http.get(prediction_url, headers=headers)
+        res.raise_for_status()
+        result = res.json()
+        if result["status"] == "succeeded":
+            return result["output"][0]
+        elif result["status"] == "failed":
+            raise RuntimeError("Image generation failed")
+        await asyncio.sleep(1)
 
 async def generate_video(prompt: str) -> str:
     """
@@ -63,15 +62,14 @@ async def generate_video(prompt: str) -> str:
         "duration": 10  # seconds
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
+    response = await http.post(url, headers=headers, json=data)
+    response.raise_for_status()
+    result = response.json()
 
-        video_url = result.get("video_url")
-        if not video_url:
-            raise RuntimeError("Video generation failed or no video URL returned")
-        return video_url
+    video_url = result.get("video_url")
+    if not video_url:
+        raise RuntimeError("Video generation failed or no video URL returned")
+    return video_url
 
 async def bild_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
@@ -1,40 +1,37 @@
-import sqlite3
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
+from db_pool import connection
 
 logger = logging.getLogger(__name__)
-DB_NAME = 'scamlingbot.db'
 
 def get_usage_stats():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    try:
-        cursor.execute('SELECT COUNT(DISTINCT id) FROM users')
-        total_users = cursor.fetchone()[0]
-        cursor.execute('SELECT COUNT(*) FROM feedback')
-        total_feedback = cursor.fetchone()[0]
-        cursor.execute('SELECT COUNT(*) FROM products')
-        total_products = cursor.fetchone()[0]
-        cursor.execute('SELECT COUNT(*) FROM transactions')
-        total_transactions = cursor.fetchone()[0]
-        cursor.execute('SELECT COUNT(*) FROM wallets')
-        total_wallets = cursor.fetchone()[0]
-        cursor.execute('SELECT COUNT(*) FROM pools')
-        total_pools = cursor.fetchone()[0]
-        return {
-            'total_users': total_users,
-            'total_feedback': total_feedback,
-            'total_products': total_products,
-            'total_transactions': total_transactions,
-            'total_wallets': total_wallets,
-            'total_pools': total_pools
-        }
-    except Exception as e:
-        logger.error(f"Error fetching usage stats: {e}")
-        return {}
-    finally:
-        conn.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT COUNT(DISTINCT id) FROM users')
+            total_users = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM feedback')
+            total_feedback = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM products')
+            total_products = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM transactions')
+            total_transactions = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM wallets')
+            total_wallets = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM pools')
+            total_pools = cursor.fetchone()[0]
+            return {
+                'total_users': total_users,
+                'total_feedback': total_feedback,
+                'total_products': total_products,
+                'total_transactions': total_transactions,
+                'total_wallets': total_wallets,
+                'total_pools': total_pools
+            }
+        except Exception as e:
+            logger.error(f"Error fetching usage stats: {e}")
+            return {}
 
 async def analytics_dashboard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     stats = get_usage_stats()
@@ -0,0 +1,169 @@
+import time
+import queue
+import asyncio
+import logging
+import threading
+import functools
+
+import database
+from metrics import percentile, sample_window
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# ASYNC-FASSADE FÜR DATABASE.PY
+# =================================================================================
+# Handler rufen `await db.get_all_active_products(...)` statt der synchronen
+# Funktion. Die Abfrage läuft auf dedizierten Worker-Threads, der Event-Loop
+# bleibt frei, während SQLite auf die Platte wartet.
+
+DB_WORKER_THREADS = 2 # Anzahl der Worker-Threads für Datenbankabfragen
+DB_MAX_QUEUE = 256 # Maximale Anzahl wartender Abfragen, danach warten die Aufrufer
+
+
+class AsyncDatabase:
+    """Führt synchrone Datenbankfunktionen auf einem Worker-Pool mit begrenzter Queue aus."""
+
+    def __init__(self, module=database, workers: int = DB_WORKER_THREADS, max_queue: int = DB_MAX_QUEUE):
+        self._module = module
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._slots = None
+        self._slots_loop = None
+        self._lock = threading.Lock()
+        self._wait_ms = sample_window()
+        self._run_ms = sample_window()
+        self._per_query = {}
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"db-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            fn, args, kwargs, loop, future, enqueued_at, slots = item
+            # Erst jetzt ist der Platz in der Queue wieder frei
+            _call_soon(loop, slots.release)
+            started_at = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                self.failed += 1
+                _call_soon(loop, _set_exception, future, e)
+            else:
+                self.completed += 1
+                _call_soon(loop, _set_result, future, result)
+            finally:
+                finished_at = time.perf_counter()
+                self._record(fn, (started_at - enqueued_at) * 1000, (finished_at - started_at) * 1000)
+                self._queue.task_done()
+
+    def _record(self, fn, wait_ms: float, run_ms: float):
+        self._wait_ms.append(wait_ms)
+        self._run_ms.append(run_ms)
+        name = getattr(fn, '__name__', repr(fn))
+        entry = self._per_query.setdefault(name, {'calls': 0, 'wait_ms_total': 0.0, 'run_ms_total': 0.0, 'wait_ms_max': 0.0})
+        entry['calls'] += 1
+        entry['wait_ms_total'] += wait_ms
+        entry['run_ms_total'] += run_ms
+        entry['wait_ms_max'] = max(entry['wait_ms_max'], wait_ms)
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Die Semaphore begrenzt die Queue, ohne dass queue.put() den Event-Loop blockiert.
+        # Ein Platz bleibt belegt, bis ein Worker das Item entnimmt, auch wenn der Aufrufer abbricht.
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_queue)
+            self._slots_loop = loop
+        return self._slots
+
+    async def run(self, fn, *args, **kwargs):
+        """Führt fn(*args, **kwargs) auf einem Worker-Thread aus und wartet auf das Ergebnis."""
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        slots = self._get_slots()
+        await slots.acquire()
+        future = loop.create_future()
+        try:
+            self._queue.put_nowait((fn, args, kwargs, loop, future, time.perf_counter(), slots))
+        except BaseException:
+            slots.release()
+            raise
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return await future
+
+    def __getattr__(self, name):
+        target = getattr(self._module, name)
+        if not callable(target):
+            return target
+
+        @functools.wraps(target)
+        async def call(*args, **kwargs):
+            return await self.run(target, *args, **kwargs)
+        return call
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        wait = list(self._wait_ms)
+        run = list(self._run_ms)
+        return {
+            'workers': len(self._threads),
+            'queue_depth': self._queue.qsize(),
+            'max_queue_depth': self.max_depth,
+            'queue_capacity': self.max_queue,
+            'completed': self.completed,
+            'failed': self.failed,
+            'wait_ms_p50': percentile(wait, 50),
+            'wait_ms_p99': percentile(wait, 99),
+            'run_ms_p50': percentile(run, 50),
+            'run_ms_p99': percentile(run, 99),
+            'per_query': {name: dict(entry) for name, entry in self._per_query.items()},
+        }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+def _call_soon(loop: asyncio.AbstractEventLoop, callback, *args):
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        pass # Event-Loop bereits geschlossen, niemand wartet mehr
+
+
+def _set_result(future: asyncio.Future, result):
+    if not future.cancelled():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exc: BaseException):
+    if not future.cancelled():
+        future.set_exception(exc)
+
+
+# Gemeinsame Instanz für alle Handler
+db = AsyncDatabase()
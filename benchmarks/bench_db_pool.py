@@ -0,0 +1,66 @@
+"""Vergleicht Aufrufe pro Sekunde: connect-per-call gegen den gemeinsamen Pool.
+
+Aufruf aus dem Repo-Verzeichnis:
+    python benchmarks/bench_db_pool.py [anzahl_aufrufe] [threads]
+"""
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_pool
+import database
+
+
+def connect_per_call_language(db_path: str, user_id: int) -> str:
+    # Das alte Muster aus database.py vor der Umstellung auf den Pool
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT language FROM users WHERE id = ?', (user_id,))
+    result = cursor.fetchone()
+    conn.close()
+    return result[0] if result else 'en'
+
+
+def run(label: str, fn, calls: int, threads: int) -> float:
+    per_thread = calls // threads
+
+    def worker(offset):
+        for i in range(per_thread):
+            fn(offset + i % 100)
+
+    workers = [threading.Thread(target=worker, args=(t * 1000,)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    rate = per_thread * threads / elapsed
+    print(f"{label:<20} {rate:>12,.0f} Aufrufe/s  ({elapsed:.2f}s, {threads} Threads)")
+    return rate
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        db_pool.configure_pool(db_path)
+        database.init_db()
+        for user_id in range(100):
+            database.add_user_to_db(user_id, f"user{user_id}")
+
+        old = run("connect-per-call", lambda uid: connect_per_call_language(db_path, uid), calls, threads)
+        new = run("pool", database.get_user_language_from_db, calls, threads)
+        print(f"Faktor: {new / old:.1f}x")
+        print(f"Pool-Statistik: {db_pool.get_pool_stats()}")
+        db_pool.close_pool()
+
+
+if __name__ == '__main__':
+    main()
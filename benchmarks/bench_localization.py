@@ -0,0 +1,43 @@
+"""Mikro-Benchmark: Kosten pro Übersetzung vor und nach dem kompilierten Katalog.
+
+Aufruf aus dem Repo-Verzeichnis:
+    python benchmarks/bench_localization.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from localization import LOCALIZATION_DATA, CATALOG
+
+
+def legacy_translate(key: str, lang: str, **kwargs) -> str:
+    # Der bisherige Weg in T(): verschachtelte Dicts, Fallback, format() auf dem Roh-Text
+    if lang not in LOCALIZATION_DATA:
+        lang = 'en'
+    text = LOCALIZATION_DATA[lang].get(key, LOCALIZATION_DATA['en'].get(key, f"UNKNOWN_TEXT_KEY_{key}"))
+    if kwargs:
+        text = text.format(**kwargs)
+    return text
+
+
+CASES = [
+    ("statisch", "menu_tools", {}),
+    ("Platzhalter", "marketplace_buy_button", {'price': 12.5, 'currency': 'SCAMCOIN'}),
+    ("Fallback", "menu_tools", {}, 'fr'),
+]
+
+
+def main():
+    number = 200000
+    for case in CASES:
+        label, key, kwargs = case[:3]
+        lang = case[3] if len(case) > 3 else 'de'
+        old = timeit.timeit(lambda: legacy_translate(key, lang, **kwargs), number=number) / number * 1e9
+        new = timeit.timeit(lambda: CATALOG.render(lang, key, **kwargs), number=number) / number * 1e9
+        print(f"{label:<12} vorher {old:7.0f} ns  nachher {new:7.0f} ns  ({old / new:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Misst die Dauer der FTS5-Produktsuche mit 100k synthetischen Produkten.
+
+Aufruf aus dem Repo-Verzeichnis:
+    python benchmarks/bench_product_search.py [anzahl_produkte] [anzahl_abfragen]
+"""
+import os
+import sys
+import time
+import random
+import itertools
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_pool
+import database
+
+# Häufige Marktplatz-Begriffe plus ein großes synthetisches Vokabular mit
+# Zipf-Verteilung, damit die Trefferlisten realistisch lang sind. Die
+# Domänenbegriffe stehen am Anfang und sind damit die häufigsten Wörter.
+DOMAIN_WORDS = [
+    'bitcoin', 'ethereum', 'xrp', 'wallet', 'guide', 'ebook', 'kunst', 'musik', 'software', 'lizenz',
+    'trading', 'bot', 'strategie', 'anleitung', 'poster', 'foto', 'album', 'track', 'vorlage', 'kurs',
+    'sammlung', 'paket', 'premium', 'basic', 'pro', 'set', 'bundle', 'edition', 'digital', 'druck',
+]
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'ta', 'ber', 'dan', 'fel', 'gor', 'hin', 'jas', 'kor', 'lum', 'mor', 'nix']
+CATEGORIES = ['General', 'EBooks', 'Software', 'Art', 'Music', 'Other']
+QUERIES = ['bitcoin', 'wallet guide', 'xrp trading bot', 'kunst poster', 'musik album premium', 'soft', 'bi', 'kalo', 'edition 42']
+
+
+def build_vocabulary(rng: random.Random, size: int = 20000) -> list:
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return DOMAIN_WORDS + sorted(words)
+
+
+def populate(count: int):
+    rng = random.Random(42)
+    vocabulary = build_vocabulary(rng)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    database.add_user_to_db(1, 'seller')
+    with db_pool.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO products (seller_id, name, description, price, currency, category, status) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((1,
+              f"{' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=3))} {i}",
+              ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=20)),
+              round(rng.uniform(1, 500), 2),
+              'SCAMCOIN',
+              rng.choice(CATEGORIES),
+              'active' if rng.random() < 0.8 else 'sold')
+             for i in range(count)))
+    with db_pool.connection() as conn:
+        conn.execute('PRAGMA optimize')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with tempfile.TemporaryDirectory() as tmp:
+        db_pool.configure_pool(os.path.join(tmp, 'bench.db'))
+        database.init_db()
+        start = time.perf_counter()
+        populate(count)
+        print(f"{count:,} Produkte angelegt in {time.perf_counter() - start:.1f}s")
+        for text in QUERIES:
+            timings = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                products, has_next = database.search_products(text, page_size=10)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            print(f"{text!r:<24} p50 {timings[len(timings) // 2]:6.2f} ms  p99 {timings[int(len(timings) * 0.99) - 1]:6.2f} ms  "
+                  f"({len(products)} Treffer auf Seite 1, weitere: {has_next})")
+        db_pool.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Lasttest für Marktplatz-Käufe: Owner-Gebühr per UPDATE gegen Gebühren-Journal.
+
+Aufruf aus dem Repo-Verzeichnis:
+    python benchmarks/bench_purchases.py [anzahl_käufe] [threads]
+"""
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_pool
+import database
+import storage_config
+from db_pool import connection
+from money import apply_rate, format_amount, to_micros
+
+FEE_PERCENTAGE = 0.01
+PRICE = to_micros(10) # Preise und Guthaben in Mikro-SCAMCOIN
+
+
+def legacy_process_transaction(product_id: int, buyer_id: int, seller_id: int, price: int, fee_percentage: float,
+                               begin: str = "BEGIN TRANSACTION") -> bool:
+    # Das alte Muster aus database.py: jede Transaktion bucht die Gebühr direkt auf die Owner-Zeile
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(begin)
+            fee_amount = apply_rate(price, fee_percentage)
+            total_paid = price + fee_amount
+            cursor.execute('SELECT internal_balance FROM users WHERE id = ?', (buyer_id,))
+            buyer_current_balance = cursor.fetchone()
+            if buyer_current_balance is None or buyer_current_balance[0] < total_paid:
+                raise ValueError("Insufficient funds for buyer or buyer not found.")
+            cursor.execute('UPDATE users SET internal_balance = internal_balance - ? WHERE id = ?', (total_paid, buyer_id))
+            cursor.execute('UPDATE users SET internal_balance = internal_balance + ? WHERE id = ?', (price - fee_amount, seller_id))
+            cursor.execute('UPDATE users SET internal_balance = internal_balance + ? WHERE id = ?', (fee_amount, database.BOT_OWNER_ID))
+            cursor.execute('UPDATE products SET status = "sold" WHERE id = ? AND status = "active"', (product_id,))
+            if cursor.rowcount == 0:
+                raise ValueError("Product not found or already sold.")
+            cursor.execute('''
+                INSERT INTO transactions (product_id, buyer_id, seller_id, amount, fee_amount, total_paid)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (product_id, buyer_id, seller_id, price, fee_amount, total_paid))
+            conn.commit()
+            return True
+        except (ValueError, sqlite3.Error):
+            conn.rollback()
+            return False
+
+
+def setup(db_path: str, purchases: int, threads: int) -> list:
+    storage_config.configure_storage(db_path)
+    database.init_db()
+    # Jeder Thread hat eigene Käufer und Verkäufer, Konflikte gibt es nur über die Owner-Zeile
+    with db_pool.transaction() as conn:
+        for t in range(threads):
+            for role in (1, 2):
+                conn.execute('INSERT INTO users (id, username, internal_balance) VALUES (?, ?, ?)',
+                             (t * 10 + role, f"user{t}_{role}", to_micros(10 ** 9)))
+        conn.executemany(
+            'INSERT INTO products (seller_id, name, price, currency) VALUES (?, ?, ?, ?)',
+            ((t * 10 + 2, f"produkt {i}", PRICE, 'SCAMCOIN') for t in range(threads) for i in range(purchases // threads)))
+        rows = conn.execute('SELECT id, seller_id FROM products ORDER BY id').fetchall()
+    jobs = [[] for _ in range(threads)]
+    for product_id, seller_id in rows:
+        t = (seller_id - 2) // 10
+        jobs[t].append((product_id, t * 10 + 1, seller_id))
+    return jobs
+
+
+def run(label: str, fn, jobs: list) -> float:
+    ok = [0] * len(jobs)
+
+    def worker(index):
+        for product_id, buyer_id, seller_id in jobs[index]:
+            if fn(product_id, buyer_id, seller_id, PRICE, FEE_PERCENTAGE):
+                ok[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(len(jobs))]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    total = sum(len(j) for j in jobs)
+    rate = sum(ok) / elapsed
+    print(f"{label:<22} {rate:>9,.0f} Käufe/s  ({sum(ok)}/{total} erfolgreich, {elapsed:.2f}s, {len(jobs)} Threads)")
+    return rate
+
+
+def main():
+    purchases = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rates = {}
+    variants = (
+        ("vorher (Owner-UPDATE)", legacy_process_transaction),
+        # Nur BEGIN IMMEDIATE, Gebühr weiterhin auf der Owner-Zeile: trennt die beiden Effekte
+        ("Owner-UPDATE+IMMEDIATE", lambda *args: legacy_process_transaction(*args, begin="BEGIN IMMEDIATE")),
+        ("nachher (fee_ledger)", database.process_transaction),
+    )
+    for label, fn in variants:
+        with tempfile.TemporaryDirectory() as tmp:
+            jobs = setup(os.path.join(tmp, 'bench.db'), purchases, threads)
+            rates[label] = run(label, fn, jobs)
+            if fn is database.process_transaction:
+                started = time.perf_counter()
+                settled = database.settle_fees()
+                print(f"settle_fees: {format_amount(settled)} SCAMCOIN in {(time.perf_counter() - started) * 1000:.1f} ms")
+            db_pool.close_pool()
+    before, immediate, after = rates.values()
+    print(f"Faktor gegenüber vorher: {after / before:.2f}x, gegenüber Owner-UPDATE+IMMEDIATE: {after / immediate:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
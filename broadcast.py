@@ -0,0 +1,224 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+
+from telegram.error import Forbidden
+
+from async_db import db
+from database import get_user_ids_page
+from db_pool import connection
+from rate_limit import ThrottledEditor
+from outbox import outbox, BULK
+from job_checkpoints import job_checkpoints, LeaseLost
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# BROADCASTS: PARALLEL, RATENBEGRENZT UND FORTSETZBAR
+# =================================================================================
+# Die Nutzer-IDs werden seitenweise aus der DB gelesen und von einer festen Zahl
+# Sender-Tasks abgearbeitet. Gesendet wird als Bulk über die Sende-Queue
+# (outbox.py), die Ratenlimit, Flood-Wartezeiten und Wiederholungen übernimmt
+# und interaktive Antworten vorlässt.
+# In broadcasts steht die höchste ID, bis zu der alle Nutzer erledigt sind.
+# Nach einem Neustart geht es dort weiter.
+
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", 8)) # Nachrichten gleichzeitig in der Sende-Queue
+BROADCAST_PAGE_SIZE = int(os.environ.get("BROADCAST_PAGE_SIZE", 500)) # Nutzer-IDs pro DB-Abfrage
+BROADCAST_CHECKPOINT_SECONDS = 2.0 # Wie oft der Fortschritt gespeichert wird
+BROADCAST_PROGRESS_SECONDS = 3.0 # Wie oft die Fortschrittsnachricht aktualisiert wird
+
+# Laufende Broadcasts in diesem Prozess: id -> BroadcastRun
+_progress = {}
+
+
+def create_broadcast(message: str, admin_chat_id: int = None, progress_message_id: int = None) -> int:
+    with connection() as conn:
+        cursor = conn.execute('INSERT INTO broadcasts (message, admin_chat_id, progress_message_id) VALUES (?, ?, ?)',
+                              (message, admin_chat_id, progress_message_id))
+        conn.commit()
+        return cursor.lastrowid
+
+
+def get_broadcast(broadcast_id: int) -> dict | None:
+    with connection() as conn:
+        row = conn.execute('''
+            SELECT id, message, status, last_user_id, sent, failed, blocked, admin_chat_id, progress_message_id
+            FROM broadcasts WHERE id = ?
+        ''', (broadcast_id,)).fetchone()
+    if row is None:
+        return None
+    keys = ('id', 'message', 'status', 'last_user_id', 'sent', 'failed', 'blocked', 'admin_chat_id', 'progress_message_id')
+    return dict(zip(keys, row))
+
+
+def get_running_broadcast_ids() -> list:
+    with connection() as conn:
+        return [row[0] for row in conn.execute("SELECT id FROM broadcasts WHERE status = 'running' ORDER BY id")]
+
+
+def save_broadcast_checkpoint(broadcast_id: int, last_user_id: int, sent: int, failed: int, blocked: int, done: bool = False):
+    with connection() as conn:
+        conn.execute('''
+            UPDATE broadcasts SET last_user_id = ?, sent = ?, failed = ?, blocked = ?, updated_at = CURRENT_TIMESTAMP,
+                   status = CASE WHEN ? THEN 'done' ELSE status END,
+                   finished_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE finished_at END
+            WHERE id = ?
+        ''', (last_user_id, sent, failed, blocked, done, done, broadcast_id))
+        conn.commit()
+
+
+class BroadcastRun:
+    """Ein laufender Broadcast: Produzent liest IDs seitenweise, Sender arbeiten sie parallel ab."""
+
+    def __init__(self, sender, broadcast: dict, concurrency: int = BROADCAST_CONCURRENCY,
+                 page_size: int = BROADCAST_PAGE_SIZE, clock=time.monotonic):
+        self.sender = sender # OutboundQueue
+        self.id = broadcast['id']
+        self.message = broadcast['message']
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self._clock = clock
+        self.watermark = broadcast['last_user_id']
+        self.sent = broadcast['sent']
+        self.failed = broadcast['failed']
+        self.blocked = broadcast['blocked']
+        self.sent_this_run = 0
+        self.started_at = clock()
+        self._order = deque() # Verteilte IDs in Reihenfolge, für den Wasserstand
+        self._done = set()
+        self._last_checkpoint = clock()
+
+    def progress(self) -> dict:
+        elapsed = max(self._clock() - self.started_at, 1e-9)
+        return {
+            'id': self.id,
+            'sent': self.sent,
+            'failed': self.failed,
+            'blocked': self.blocked,
+            'last_user_id': self.watermark,
+            'rate_per_second': self.sent_this_run / elapsed,
+        }
+
+    async def _send(self, user_id: int):
+        try:
+            await self.sender.send_message(user_id, self.message, priority=BULK)
+            self.sent += 1
+            self.sent_this_run += 1
+        except Forbidden:
+            self.blocked += 1 # Bot blockiert oder Nutzer gelöscht
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Broadcast {self.id}: Nachricht an {user_id} fehlgeschlagen: {e}")
+
+    def _complete(self, user_id: int):
+        self._done.add(user_id)
+        while self._order and self._order[0] in self._done:
+            self._done.discard(self._order[0])
+            self.watermark = self._order.popleft()
+
+    async def _checkpoint(self, done: bool = False):
+        self._last_checkpoint = self._clock()
+        await db.run(save_broadcast_checkpoint, self.id, self.watermark, self.sent, self.failed, self.blocked, done)
+
+    async def _worker(self, queue: asyncio.Queue, on_progress):
+        while True:
+            user_id = await queue.get()
+            try:
+                if user_id is None:
+                    return
+                await self._send(user_id)
+                self._complete(user_id)
+                if self._clock() - self._last_checkpoint >= BROADCAST_CHECKPOINT_SECONDS:
+                    await self._checkpoint()
+                if on_progress is not None:
+                    await on_progress(self.progress())
+            finally:
+                queue.task_done()
+
+    async def run(self, on_progress=None):
+        """Sendet an alle Nutzer nach dem Wasserstand. Nach einem Abbruch wird höchstens an die
+        Nutzer seit dem letzten Checkpoint erneut gesendet."""
+        queue = asyncio.Queue(maxsize=self.concurrency * 2) # Begrenzt, der Produzent liest nur nach, was gebraucht wird
+        workers = [asyncio.create_task(self._worker(queue, on_progress)) for _ in range(self.concurrency)]
+        try:
+            after_id = self.watermark
+            while True:
+                page = await db.run(get_user_ids_page, after_id, self.page_size)
+                if not page:
+                    break
+                for user_id in page:
+                    self._order.append(user_id)
+                    await queue.put(user_id)
+                after_id = page[-1]
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        except BaseException:
+            for worker in workers:
+                worker.cancel()
+            await self._checkpoint()
+            raise
+        await self._checkpoint(done=True)
+        return self.progress()
+
+
+def format_progress(progress: dict, done: bool = False) -> str:
+    title = "✅ Broadcast abgeschlossen!" if done else "📢 Broadcast läuft..."
+    return (f"{title}\nGesendet: {progress['sent']}\nFehlgeschlagen: {progress['failed']}"
+            f"\nBlockiert: {progress['blocked']}"
+            f"\nDurchsatz: {progress['rate_per_second']:.1f} Nachrichten/s")
+
+
+async def run_broadcast(bot, broadcast_id: int, reply_markup=None):
+    """Führt einen Broadcast ab seinem Checkpoint aus und hält die Fortschrittsnachricht aktuell."""
+    broadcast = await db.run(get_broadcast, broadcast_id)
+    if broadcast is None or broadcast['status'] != 'running':
+        return None
+    chat_id, message_id = broadcast['admin_chat_id'], broadcast['progress_message_id']
+    editor = None
+    if chat_id and message_id:
+        editor = ThrottledEditor(lambda text: bot.edit_message_text(text, chat_id=chat_id, message_id=message_id),
+                                 interval=BROADCAST_PROGRESS_SECONDS)
+    run = BroadcastRun(outbox, broadcast)
+
+    async def on_progress(progress):
+        if editor is not None:
+            await editor.update(format_progress(progress))
+
+    # Die Lease verhindert, dass eine zweite Instanz denselben Broadcast fortsetzt
+    try:
+        async with job_checkpoints.lease(f'broadcast:{broadcast_id}') as held:
+            if not held:
+                logger.info(f"Broadcast {broadcast_id} läuft bereits in einem anderen Prozess.")
+                return None
+            _progress[broadcast_id] = run
+            try:
+                progress = await run.run(on_progress)
+            finally:
+                _progress.pop(broadcast_id, None)
+    except LeaseLost:
+        return None # Ein anderer Prozess setzt den Broadcast ab dem letzten Checkpoint fort
+    logger.info(f"Broadcast {broadcast_id} abgeschlossen: {progress}")
+    if editor is not None:
+        try:
+            await bot.edit_message_text(format_progress(progress, done=True), chat_id=chat_id, message_id=message_id,
+                                        reply_markup=reply_markup)
+        except Exception as e:
+            logger.warning(f"Abschlussmeldung für Broadcast {broadcast_id} fehlgeschlagen: {e}")
+    return progress
+
+
+def get_broadcast_progress() -> list:
+    """Fortschritt aller Broadcasts, die gerade in diesem Prozess laufen."""
+    return [run.progress() for run in _progress.values()]
+
+
+async def resume_broadcasts_job(context):
+    """Einmal nach dem Start: unterbrochene Broadcasts ab ihrem Checkpoint fortsetzen."""
+    for broadcast_id in await db.run(get_running_broadcast_ids):
+        if broadcast_id not in _progress:
+            logger.info(f"Setze Broadcast {broadcast_id} fort.")
+            context.application.create_task(run_broadcast(context.bot, broadcast_id))
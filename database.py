@@ -1,392 +1,617 @@
+import re
 import sqlite3
 import datetime
+import json
 import logging
 
+from db_pool import connection
+from migrations import migrate
+from money import to_micros, apply_rate
+from idempotency import complete_idempotency_key, release_idempotency_key
+from ledger import post_entries, user_account, BONUS_ACCOUNT, EXTERNAL_ACCOUNT, FEES_ACCOUNT
+
 logger = logging.getLogger(__name__)
 
-DB_NAME = 'scamlingbot.db'
-INITIAL_INTERNAL_BALANCE = 1000.0 # Startguthaben für neue Nutzer (simulierter SCAMCOIN)
+INITIAL_INTERNAL_BALANCE = to_micros(1000) # Startguthaben für neue Nutzer in Mikro-SCAMCOIN (siehe money.py)
 BOT_OWNER_ID = 5096684838 # Deine ADMIN_USER_ID, um Gebühren gutzuschreiben
 
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    # Tabelle für Benutzer (existiert bereits, wird aber erweitert)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY,
-            language TEXT DEFAULT 'en',
-            registered_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            username TEXT,
-            first_name TEXT,
-            last_name TEXT,
-            internal_balance REAL DEFAULT 0.0 -- NEU: Für internes Währungssystem
-        )
-    ''')
-
-    # Tabelle für Feedback (existiert bereits)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS feedback (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            username TEXT,
-            feedback_text TEXT,
-            timestamp TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Tabelle für Wallets (existiert bereits)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS wallets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            currency TEXT NOT NULL,
-            address TEXT NOT NULL,
-            UNIQUE(user_id, currency, address)
-        )
-    ''')
-
-    # Tabelle für Pools (existiert bereits)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS pools (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            pool_type TEXT NOT NULL,
-            pool_address TEXT NOT NULL,
-            UNIQUE(user_id, pool_type, pool_address)
-        )
-    ''')
-
-    # Tabelle für News (existiert bereits)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS news (
-            link TEXT PRIMARY KEY,
-            title TEXT,
-            published TEXT,
-            sent_to_telegram INTEGER DEFAULT 0
-        )
-    ''')
-
-    # NEU: Tabelle für Marktplatz-Produkte
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            seller_id INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            description TEXT,
-            price REAL NOT NULL,
-            currency TEXT NOT NULL, -- Z.B. 'SCAMCOIN' für internes System
-            category TEXT DEFAULT 'General', -- NEU: Produktkategorie
-            file_id TEXT, -- Telegram file_id des hochgeladenen Gutes
-            status TEXT DEFAULT 'active', -- 'active', 'sold', 'deleted'
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (seller_id) REFERENCES users(id)
-        )
-    ''')
-
-    # NEU: Tabelle für Marktplatz-Transaktionen
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_id INTEGER NOT NULL,
-            buyer_id INTEGER NOT NULL,
-            seller_id INTEGER NOT NULL,
-            amount REAL NOT NULL, -- Preis des Produkts (ohne Gebühr)
-            fee_amount REAL NOT NULL, -- Gebühr für den Bot
-            total_paid REAL NOT NULL, -- Gesamtbetrag, den der Käufer zahlt
-            timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-            status TEXT DEFAULT 'completed', -- 'completed', 'failed', 'refunded'
-            FOREIGN KEY (product_id) REFERENCES products(id),
-            FOREIGN KEY (buyer_id) REFERENCES users(id),
-            FOREIGN KEY (seller_id) REFERENCES users(id)
-        )
-    ''')
-
-    # Füge eine interne Bot-Owner-Wallet hinzu, falls nicht vorhanden, um Gebühren zu sammeln
-    # Dies ist eine spezielle Nutzer-ID, die nur für Gebühren existiert
-    cursor.execute("INSERT OR IGNORE INTO users (id, username, internal_balance) VALUES (?, ?, ?)", 
-                   (BOT_OWNER_ID, "ScamlingBotOwner", 0.0))
-
-    conn.commit()
-    conn.close()
+    # Tabellen und Indizes werden über die versionierten Migrationen angelegt
+    migrate()
+    with connection() as conn:
+        cursor = conn.cursor()
+        # Füge eine interne Bot-Owner-Wallet hinzu, falls nicht vorhanden, um Gebühren zu sammeln
+        # Dies ist eine spezielle Nutzer-ID, die nur für Gebühren existiert
+        cursor.execute("INSERT OR IGNORE INTO users (id, username, internal_balance) VALUES (?, ?, ?)", 
+                       (BOT_OWNER_ID, "ScamlingBotOwner", 0))
+
+        conn.commit()
 
 def add_user_to_db(user_id: int, username: str = None, first_name: str = None, last_name: str = None):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR IGNORE INTO users (id, username, first_name, last_name, internal_balance)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (user_id, username, first_name, last_name, INITIAL_INTERNAL_BALANCE)) # Gib neuem Nutzer Startguthaben
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR IGNORE INTO users (id, username, first_name, last_name, internal_balance)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, username, first_name, last_name, INITIAL_INTERNAL_BALANCE)) # Gib neuem Nutzer Startguthaben
+        if cursor.rowcount == 1:
+            # Auch das Startguthaben ist eine Buchung, sonst geht reconcile_balances nicht auf
+            post_entries(cursor, 'signup_bonus', [(user_account(user_id), INITIAL_INTERNAL_BALANCE),
+                                                  (BONUS_ACCOUNT, -INITIAL_INTERNAL_BALANCE)])
+            _log_scamcoin(cursor, [(user_id, INITIAL_INTERNAL_BALANCE, 'signup_bonus', 'Startguthaben')])
+        conn.commit()
 
 def set_user_language(user_id: int, lang: str):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE users SET language = ? WHERE id = ?', (lang, user_id))
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE users SET language = ? WHERE id = ?', (lang, user_id))
+        conn.commit()
+    from localization import invalidate_user_language # Importiere hier, um Zirkelabhängigkeit zu vermeiden
+    invalidate_user_language(user_id)
 
 def get_user_language_from_db(user_id: int) -> str:
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT language FROM users WHERE id = ?', (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else 'en' # Default to English if not found
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT language FROM users WHERE id = ?', (user_id,))
+        result = cursor.fetchone()
+        return result[0] if result else 'en' # Default to English if not found
 
 def add_feedback(user_id: int, username: str, feedback_text: str):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO feedback (user_id, username, feedback_text)
-        VALUES (?, ?, ?)
-    ''', (user_id, username, feedback_text))
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO feedback (user_id, username, feedback_text)
+            VALUES (?, ?, ?)
+        ''', (user_id, username, feedback_text))
+        conn.commit()
 
 def get_feedback():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT username, feedback_text, timestamp FROM feedback ORDER BY timestamp DESC LIMIT 10')
-    feedbacks = cursor.fetchall()
-    conn.close()
-    return feedbacks
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT username, feedback_text, timestamp FROM feedback ORDER BY timestamp DESC LIMIT 10')
+        feedbacks = cursor.fetchall()
+        return feedbacks
 
 def get_user_stats():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(DISTINCT id) FROM users')
-    total_users = cursor.fetchone()[0]
-    cursor.execute('SELECT COUNT(DISTINCT user_id) FROM feedback')
-    users_with_feedback = cursor.fetchone()[0]
-    cursor.execute('SELECT COUNT(*) FROM products') # NEU: Anzahl der Produkte
-    total_products = cursor.fetchone()[0]
-    cursor.execute('SELECT COUNT(*) FROM transactions WHERE status = "completed"') # NEU: Anzahl der Transaktionen
-    total_transactions = cursor.fetchone()[0]
-
-    conn.close()
-    return {
-        'total_users': total_users,
-        'users_with_feedback': users_with_feedback,
-        'total_products': total_products,
-        'total_transactions': total_transactions
-    }
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(DISTINCT id) FROM users')
+        total_users = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(DISTINCT user_id) FROM feedback')
+        users_with_feedback = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM products') # NEU: Anzahl der Produkte
+        total_products = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM transactions WHERE status = "completed"') # NEU: Anzahl der Transaktionen
+        total_transactions = cursor.fetchone()[0]
+
+        return {
+            'total_users': total_users,
+            'users_with_feedback': users_with_feedback,
+            'total_products': total_products,
+            'total_transactions': total_transactions
+        }
 
 def get_all_user_ids():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id FROM users')
-    user_ids = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return user_ids
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM users')
+        user_ids = [row[0] for row in cursor.fetchall()]
+        return user_ids
+
+def get_user_ids_page(after_id: int = 0, limit: int = 500) -> list:
+    """Nächste Seite Nutzer-IDs nach after_id (aufsteigend), ohne alle IDs auf einmal zu laden."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM users WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit))
+        return [row[0] for row in cursor.fetchall()]
 
 def add_user_wallet(user_id: int, currency: str, address: str) -> bool:
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    try:
-        cursor.execute('''
-            INSERT INTO wallets (user_id, currency, address)
-            VALUES (?, ?, ?)
-        ''', (user_id, currency, address))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        logger.warning(f"Wallet for user {user_id} with currency {currency} and address {address} already exists.")
-        return False
-    finally:
-        conn.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT INTO wallets (user_id, currency, address)
+                VALUES (?, ?, ?)
+            ''', (user_id, currency, address))
+            conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            logger.warning(f"Wallet for user {user_id} with currency {currency} and address {address} already exists.")
+            return False
 
 def get_user_wallets(user_id: int):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, currency, address FROM wallets WHERE user_id = ?', (user_id,))
-    wallets = cursor.fetchall()
-    conn.close()
-    return wallets
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, currency, address FROM wallets WHERE user_id = ?', (user_id,))
+        wallets = cursor.fetchall()
+        return wallets
 
 def remove_user_wallet(wallet_id: int, user_id: int) -> bool:
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM wallets WHERE id = ? AND user_id = ?', (wallet_id, user_id))
-    rows_affected = cursor.rowcount
-    conn.commit()
-    conn.close()
-    return rows_affected > 0
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM wallets WHERE id = ? AND user_id = ?', (wallet_id, user_id))
+        rows_affected = cursor.rowcount
+        conn.commit()
+        return rows_affected > 0
 
 def add_user_pool(user_id: int, pool_type: str, pool_address: str) -> bool:
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    try:
-        cursor.execute('''
-            INSERT INTO pools (user_id, pool_type, pool_address)
-            VALUES (?, ?, ?)
-        ''', (user_id, pool_type, pool_address))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        logger.warning(f"Pool for user {user_id} with type {pool_type} and address {pool_address} already exists.")
-        return False
-    finally:
-        conn.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT INTO pools (user_id, pool_type, pool_address)
+                VALUES (?, ?, ?)
+            ''', (user_id, pool_type, pool_address))
+            conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            logger.warning(f"Pool for user {user_id} with type {pool_type} and address {pool_address} already exists.")
+            return False
 
 def get_user_pools(user_id: int):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, pool_type, pool_address FROM pools WHERE user_id = ?', (user_id,))
-    pools = cursor.fetchall()
-    conn.close()
-    return pools
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, pool_type, pool_address FROM pools WHERE user_id = ?', (user_id,))
+        pools = cursor.fetchall()
+        return pools
 
 def remove_user_pool(pool_id: int, user_id: int) -> bool:
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM pools WHERE id = ? AND user_id = ?', (pool_id, user_id))
-    rows_affected = cursor.rowcount
-    conn.commit()
-    conn.close()
-    return rows_affected > 0
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM pools WHERE id = ? AND user_id = ?', (pool_id, user_id))
+        rows_affected = cursor.rowcount
+        conn.commit()
+        return rows_affected > 0
 
 def mark_news_item_as_sent(link: str):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE news SET sent_to_telegram = 1 WHERE link = ?', (link,))
-    conn.commit()
-    conn.close()
+    record_news_items([(link, None, None)], sent=True)
 
 def check_if_news_item_sent(link: str) -> bool:
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT sent_to_telegram FROM news WHERE link = ?', (link,))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] == 1 if result else False
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT sent_to_telegram FROM news WHERE link = ?', (link,))
+        result = cursor.fetchone()
+        return result[0] == 1 if result else False
+
+def get_sent_news_items(links) -> set:
+    """Welche der IDs bereits gesendet wurden, mit einer Abfrage für beliebig viele IDs."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        # json_each statt IN (?, ?, ...), sonst stößt man bei tausenden IDs an das Parameter-Limit
+        cursor.execute('SELECT link FROM news WHERE sent_to_telegram = 1 AND link IN (SELECT value FROM json_each(?))',
+                       (json.dumps(list(links)),))
+        return {row[0] for row in cursor.fetchall()}
+
+def record_news_items(items, sent: bool = False) -> int:
+    """Speichert (link, title, published)-Tupel als gesehen bzw. gesendet, in einer Transaktion.
+
+    Ein einmal gesendeter Artikel wird nie wieder auf ungesendet zurückgesetzt.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO news (link, title, published, sent_to_telegram) VALUES (?, ?, ?, ?)
+            ON CONFLICT (link) DO UPDATE SET
+                title = COALESCE(excluded.title, title),
+                published = COALESCE(excluded.published, published),
+                sent_to_telegram = MAX(sent_to_telegram, excluded.sent_to_telegram)
+        ''', [(link, title, published, int(sent)) for link, title, published in items])
+        conn.commit()
+        return len(items)
+
+NEWS_FEED_STATE_COLUMNS = ('etag', 'last_modified', 'last_status', 'checked_at', 'last_success_at', 'latency_ms',
+                           'error_streak', 'avg_publish_seconds', 'last_item_at', 'poll_interval_seconds', 'next_poll_at')
+
+def get_news_feed_states(urls) -> dict:
+    """Validatoren und Gesundheitszustand je Feed-URL, unbekannte Feeds fehlen im Ergebnis."""
+    urls = list(urls)
+    if not urls:
+        return {}
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT url, {", ".join(NEWS_FEED_STATE_COLUMNS)} FROM news_feeds WHERE url IN ({",".join("?" * len(urls))})', urls)
+        return {row[0]: dict(zip(NEWS_FEED_STATE_COLUMNS, row[1:])) for row in cursor.fetchall()}
+
+def save_news_feed_state(url: str, status: int | None, etag: str = None, last_modified: str = None,
+                         latency_ms: int = None, schedule: dict = None):
+    """Speichert das Ergebnis eines Feed-Abrufs. Validatoren werden nur bei neuem Inhalt (200) ersetzt.
+
+    200 und 304 zählen als Erfolg und setzen die Fehlerserie zurück. schedule ist der
+    Zeitplan aus feed_scheduler.plan_next_poll, fehlende Werte bleiben unverändert.
+    """
+    changed = status == 200
+    ok = status in (200, 304)
+    schedule = schedule or {}
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO news_feeds (url, etag, last_modified, last_status, checked_at, changed_at, last_success_at, latency_ms,
+                                    error_streak, avg_publish_seconds, last_item_at, poll_interval_seconds, next_poll_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CASE WHEN ? THEN CURRENT_TIMESTAMP END, CASE WHEN ? THEN CURRENT_TIMESTAMP END, ?,
+                    CASE WHEN ? THEN 0 ELSE 1 END, ?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET
+                etag = CASE WHEN ? THEN excluded.etag ELSE etag END,
+                last_modified = CASE WHEN ? THEN excluded.last_modified ELSE last_modified END,
+                last_status = excluded.last_status,
+                checked_at = excluded.checked_at,
+                changed_at = COALESCE(excluded.changed_at, changed_at),
+                last_success_at = COALESCE(excluded.last_success_at, last_success_at),
+                latency_ms = excluded.latency_ms,
+                error_streak = CASE WHEN ? THEN 0 ELSE error_streak + 1 END,
+                avg_publish_seconds = COALESCE(excluded.avg_publish_seconds, avg_publish_seconds),
+                last_item_at = COALESCE(excluded.last_item_at, last_item_at),
+                poll_interval_seconds = COALESCE(excluded.poll_interval_seconds, poll_interval_seconds),
+                next_poll_at = COALESCE(excluded.next_poll_at, next_poll_at)
+        ''', (url, etag, last_modified, status, changed, ok, latency_ms, ok,
+              schedule.get('avg_publish_seconds'), schedule.get('last_item_at'),
+              schedule.get('poll_interval_seconds'), schedule.get('next_poll_at'),
+              changed, changed, ok))
+        conn.commit()
 
 # NEU: Marktplatz-spezifische Datenbankfunktionen
 
 def add_product(seller_id: int, name: str, description: str, price: float, currency: str, file_id: str, category: str = 'General') -> int | None:
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    try:
-        cursor.execute('''
-            INSERT INTO products (seller_id, name, description, price, currency, category, file_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (seller_id, name, description, price, currency, category, file_id))
-        conn.commit()
-        return cursor.lastrowid
-    except sqlite3.Error as e:
-        logger.error(f"Error adding product: {e}")
-        return None
-    finally:
-        conn.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT INTO products (seller_id, name, description, price, currency, category, file_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (seller_id, name, description, price, currency, category, file_id))
+            conn.commit()
+            return cursor.lastrowid
+        except sqlite3.Error as e:
+            logger.error(f"Error adding product: {e}")
+            return None
 
 def get_all_active_products(category: str = None):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    with connection() as conn:
+        cursor = conn.cursor()
+        if category:
+            cursor.execute('SELECT id, seller_id, name, description, price, currency, file_id, status FROM products WHERE status = "active" AND category = ? ORDER BY created_at DESC', (category,))
+        else:
+            cursor.execute('SELECT id, seller_id, name, description, price, currency, file_id, status FROM products WHERE status = "active" ORDER BY created_at DESC')
+        products = cursor.fetchall()
+        return products
+
+def get_active_products_page(category: str = None, page_size: int = 10, after_id: int = None, before_id: int = None):
+    """Eine Seite aktiver Produkte, neueste zuerst (Keyset-Pagination über (created_at, id)).
+
+    after_id blättert vorwärts hinter das Produkt, before_id rückwärts davor.
+    Es werden höchstens page_size + 1 Zeilen gelesen, die zusätzliche Zeile
+    zeigt nur an, ob es in Leserichtung weitere Produkte gibt.
+    Gibt (products, has_prev, has_next) zurück.
+    """
+    conditions = ['status = "active"']
+    params = []
     if category:
-        cursor.execute('SELECT id, seller_id, name, description, price, currency, file_id, status FROM products WHERE status = "active" AND category = ? ORDER BY created_at DESC', (category,))
-    else:
-        cursor.execute('SELECT id, seller_id, name, description, price, currency, file_id, status FROM products WHERE status = "active" ORDER BY created_at DESC')
-    products = cursor.fetchall()
-    conn.close()
-    return products
+        conditions.append('category = ?')
+        params.append(category)
+    backwards = before_id is not None
+    cursor_id = before_id if backwards else after_id
+    with connection() as conn:
+        if cursor_id is not None:
+            # Der Cursor ist nur die Produkt-ID, created_at kommt per Primärschlüssel dazu.
+            # Gibt es das Produkt nicht mehr, beginnt die Liste wieder bei der ersten Seite.
+            row = conn.execute('SELECT created_at FROM products WHERE id = ?', (cursor_id,)).fetchone()
+            if row is None:
+                backwards, after_id = False, None
+            else:
+                conditions.append(f'(created_at, id) {">" if backwards else "<"} (?, ?)')
+                params.extend([row[0], cursor_id])
+        order = 'ASC' if backwards else 'DESC'
+        sql = (f'SELECT id, seller_id, name, description, price, currency, file_id, status FROM products '
+               f'WHERE {" AND ".join(conditions)} ORDER BY created_at {order}, id {order} LIMIT ?')
+        params.append(page_size + 1)
+        rows = conn.execute(sql, params).fetchall()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+        return rows, has_more, True
+    return rows, after_id is not None, has_more
+
+def _fts_query(text: str) -> str:
+    # Jedes Wort wird in Anführungszeichen gesetzt, damit Nutzereingaben keine
+    # FTS5-Syntax (AND, NEAR, Spaltenfilter ...) auslösen. "In Anführungszeichen"
+    # wird als Phrase gesucht. Ist das letzte Element ein einzelnes Wort, ist es
+    # eine Präfix-Suche, so findet auch eine angefangene Eingabe Treffer.
+    terms = []
+    prefix = False
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        words = (phrase or word).replace('"', ' ').split()
+        if words:
+            terms.append('"' + ' '.join(words) + '"')
+            prefix = not phrase
+    if terms and prefix:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+def search_products(text: str, page_size: int = 10, offset: int = 0):
+    """Volltextsuche über aktive Produkte, nach Relevanz (bm25) sortiert.
+
+    Gerankt wird die vollständige Treffermenge, bei gleicher Relevanz gewinnt
+    das neuere Produkt. Gibt (products, has_next) zurück.
+    """
+    match = _fts_query(text)
+    if not match:
+        return [], False
+    with connection() as conn:
+        try:
+            rows = conn.execute('''
+                SELECT p.id, p.seller_id, p.name, p.description, p.price, p.currency, p.file_id, p.status
+                FROM products_fts
+                JOIN products p ON p.id = products_fts.rowid
+                WHERE products_fts MATCH :match AND p.status = 'active'
+                ORDER BY products_fts.rank, p.id DESC
+                LIMIT :limit OFFSET :offset
+            ''', {'match': match, 'limit': page_size + 1, 'offset': offset}).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error searching products: {e}")
+            return [], False
+    return rows[:page_size], len(rows) > page_size
 
 def get_product_by_id(product_id: int):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, seller_id, name, description, price, currency, file_id, status FROM products WHERE id = ?', (product_id,))
-    product = cursor.fetchone()
-    conn.close()
-    return product
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, seller_id, name, description, price, currency, file_id, status FROM products WHERE id = ?', (product_id,))
+        product = cursor.fetchone()
+        return product
 
 def get_user_products(user_id: int):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, seller_id, name, description, price, currency, file_id, status FROM products WHERE seller_id = ? ORDER BY created_at DESC', (user_id,))
-    products = cursor.fetchall()
-    conn.close()
-    return products
-
-# NEU: Funktionen für das interne Währungssystem
-def get_user_internal_balance(user_id: int) -> float:
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT internal_balance FROM users WHERE id = ?', (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-    # Wenn der Nutzer noch nicht in der DB ist, oder internal_balance NULL ist, initialisiere mit 0.0 oder DEFAULT
-    if result is None:
-        add_user_to_db(user_id) # Stelle sicher, dass der User existiert und balance initialisiert ist
-        return INITIAL_INTERNAL_BALANCE
-    return result[0] if result[0] is not None else 0.0
-
-def update_user_internal_balance(user_id: int, amount: float) -> bool:
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    try:
-        # Füge den Betrag hinzu (kann auch negativ sein für Abzug)
-        cursor.execute('UPDATE users SET internal_balance = internal_balance + ? WHERE id = ?', (amount, user_id))
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, seller_id, name, description, price, currency, file_id, status FROM products WHERE seller_id = ? ORDER BY created_at DESC', (user_id,))
+        products = cursor.fetchall()
+        return products
+
+def delete_product(product_id: int, seller_id: int) -> bool:
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE products SET status = "deleted" WHERE id = ? AND seller_id = ?', (product_id, seller_id))
+        rows_affected = cursor.rowcount
         conn.commit()
-        return True
-    except sqlite3.Error as e:
-        logger.error(f"Error updating internal balance for user {user_id}: {e}")
-        return False
-    finally:
-        conn.close()
+        return rows_affected > 0
 
-def process_transaction(product_id: int, buyer_id: int, seller_id: int, price: float, fee_percentage: float) -> bool:
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+# NEU: Funktionen für das interne Währungssystem
+# Alle Beträge sind ganze Mikro-SCAMCOIN (int), Umrechnung für die Anzeige mit money.from_micros.
+# Jede Änderung an internal_balance wird im selben Schritt als Buchung ins Journal geschrieben
+# (ledger.py), wallet_transactions ist nur noch der Verlauf für die Anzeige.
+
+def _log_scamcoin(cursor, entries):
+    # Verlaufseinträge (user_id, amount, transaction_type, description) in der laufenden Transaktion
+    cursor.executemany('''
+        INSERT INTO wallet_transactions (user_id, currency, amount, transaction_type, description)
+        VALUES (?, 'SCAMCOIN', ?, ?, ?)
+    ''', entries)
+
+def get_user_internal_balance(user_id: int) -> int:
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT internal_balance FROM users WHERE id = ?', (user_id,))
+        result = cursor.fetchone()
+        # Wenn der Nutzer noch nicht in der DB ist, lege ihn mit Startguthaben an
+        if result is None:
+            add_user_to_db(user_id) # Stelle sicher, dass der User existiert und balance initialisiert ist
+            return INITIAL_INTERNAL_BALANCE
+        return result[0]
+
+def update_user_internal_balance(user_id: int, amount: int, transaction_type: str = 'adjustment', description: str = None,
+                                 idempotency_key: str = None) -> bool:
+    """Bucht amount (Mikro, negativ für Abzug) gegen das externe Konto, samt Verlaufseintrag.
+
+    Ein Abzug scheitert, wenn das Guthaben dafür nicht reicht. Mit idempotency_key wird das
+    Ergebnis in derselben Transaktion vermerkt, ein Fehlschlag gibt den Schlüssel wieder frei.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute('UPDATE users SET internal_balance = internal_balance + ? WHERE id = ? AND internal_balance + ? >= 0',
+                           (amount, user_id, amount))
+            if cursor.rowcount == 0:
+                conn.rollback()
+                release_idempotency_key(idempotency_key)
+                return False
+            post_entries(cursor, transaction_type, [(user_account(user_id), amount), (EXTERNAL_ACCOUNT, -amount)], description)
+            _log_scamcoin(cursor, [(user_id, amount, transaction_type, description)])
+            complete_idempotency_key(cursor, idempotency_key)
+            conn.commit()
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error updating internal balance for user {user_id}: {e}")
+            conn.rollback()
+            release_idempotency_key(idempotency_key)
+            return False
+
+def process_transaction(product_id: int, buyer_id: int, seller_id: int, price: int, fee_percentage: float,
+                        idempotency_key: str = None) -> bool:
+    with connection() as conn:
+        cursor = conn.cursor()
     
-    try:
-        # Start transaction (ACID properties)
-        cursor.execute("BEGIN TRANSACTION")
-
-        # 1. Käufer belasten
-        total_paid = price * (1 + fee_percentage)
-        
-        # Prüfe zuerst, ob der Käufer genug Guthaben hat
-        cursor.execute('SELECT internal_balance FROM users WHERE id = ?', (buyer_id,))
-        buyer_current_balance = cursor.fetchone()
-        if buyer_current_balance is None or buyer_current_balance[0] < total_paid:
-            raise ValueError("Insufficient funds for buyer or buyer not found.")
-
-        cursor.execute('UPDATE users SET internal_balance = internal_balance - ? WHERE id = ?',
-                       (total_paid, buyer_id))
-        
-
-        # 2. Verkäufer gutschreiben (abzüglich Gebühr)
-        seller_receives = price * (1 - fee_percentage)
-        cursor.execute('UPDATE users SET internal_balance = internal_balance + ? WHERE id = ?',
-                       (seller_receives, seller_id))
-
-        # 3. Bot-Owner Gebühr gutschreiben
-        fee_amount = price * fee_percentage
-        cursor.execute('UPDATE users SET internal_balance = internal_balance + ? WHERE id = ?',
-                       (fee_amount, BOT_OWNER_ID)) # Deine ADMIN_USER_ID
-
-        # 4. Produkt als verkauft markieren
-        cursor.execute('UPDATE products SET status = "sold" WHERE id = ? AND status = "active"', (product_id,))
-        if cursor.rowcount == 0:
-            raise ValueError("Product not found or already sold.") # Product might have been sold concurrently
-
-        # 5. Transaktion loggen
-        cursor.execute('''
-            INSERT INTO transactions (product_id, buyer_id, seller_id, amount, fee_amount, total_paid)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (product_id, buyer_id, seller_id, price, fee_amount, total_paid))
-
-        conn.commit()
-        return True
-    except ValueError as ve:
-        logger.warning(f"Transaction failed (ValueError): {ve}")
-        conn.rollback()
-        return False
-    except sqlite3.Error as e:
-        logger.error(f"Database error during transaction: {e}")
-        conn.rollback() # Rollback in case of any other DB error
+        try:
+            # Start transaction (ACID properties). IMMEDIATE holt die Schreibsperre sofort,
+            # sonst scheitert das spätere Upgrade von Lese- auf Schreibsperre bei parallelen Käufen
+            cursor.execute("BEGIN IMMEDIATE")
+
+            # 1. Käufer belasten, die Guthabenprüfung steckt im UPDATE
+            fee_amount = apply_rate(price, fee_percentage)
+            total_paid = price + fee_amount
+            cursor.execute('UPDATE users SET internal_balance = internal_balance - ? WHERE id = ? AND internal_balance >= ?',
+                           (total_paid, buyer_id, total_paid))
+            if cursor.rowcount == 0:
+                raise ValueError("Insufficient funds for buyer or buyer not found.")
+
+            # 2. Verkäufer gutschreiben (abzüglich derselben Gebühr)
+            seller_fee_amount = fee_amount
+            seller_receives = price - seller_fee_amount
+            cursor.execute('UPDATE users SET internal_balance = internal_balance + ? WHERE id = ?',
+                           (seller_receives, seller_id))
+
+            # 3. Produkt als verkauft markieren
+            cursor.execute('UPDATE products SET status = "sold" WHERE id = ? AND status = "active"', (product_id,))
+            if cursor.rowcount == 0:
+                raise ValueError("Product not found or already sold.") # Product might have been sold concurrently
+
+            # 4. Transaktion loggen
+            cursor.execute('''
+                INSERT INTO transactions (product_id, buyer_id, seller_id, amount, fee_amount, seller_fee_amount, total_paid)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (product_id, buyer_id, seller_id, price, fee_amount, seller_fee_amount, total_paid))
+
+            # 5. Bot-Owner Gebühr nur ins Gebühren-Journal schreiben. Die Gutschrift auf das
+            # Owner-Konto macht settle_fees gesammelt, so sperrt kein Kauf die Owner-Zeile.
+            # Die Plattform behält die Gebühr von Käufer und Verkäufer, damit die Buchung aufgeht.
+            platform_take = fee_amount + seller_fee_amount
+            cursor.execute('INSERT INTO fee_ledger (transaction_id, amount) VALUES (?, ?)', (cursor.lastrowid, platform_take))
+            post_entries(cursor, 'purchase', [(user_account(buyer_id), -total_paid),
+                                              (user_account(seller_id), seller_receives),
+                                              (FEES_ACCOUNT, platform_take)], f"product:{product_id}")
+            complete_idempotency_key(cursor, idempotency_key)
+            _log_scamcoin(cursor, [(buyer_id, -total_paid, 'purchase', f"Kauf von Produkt {product_id}"),
+                                   (seller_id, seller_receives, 'sale', f"Verkauf von Produkt {product_id}")])
+
+            conn.commit()
+            return True
+        except ValueError as ve:
+            logger.warning(f"Transaction failed (ValueError): {ve}")
+            conn.rollback()
+            release_idempotency_key(idempotency_key)
+            return False
+        except sqlite3.Error as e:
+            logger.error(f"Database error during transaction: {e}")
+            conn.rollback() # Rollback in case of any other DB error
+            release_idempotency_key(idempotency_key)
+            return False
+
+
+def _apply_transfer(cursor, sender_id: int, receiver_id: int, amount: int) -> bool:
+    # Läuft innerhalb einer offenen Transaktion. Die Bedingung im UPDATE ist die
+    # eigentliche Guthabenprüfung, ein vorheriges SELECT wäre ein TOCTOU-Fenster.
+    if amount <= 0 or sender_id == receiver_id:
         return False
-    finally:
-        conn.close()
-
+    cursor.execute('UPDATE users SET internal_balance = internal_balance - ? WHERE id = ? AND internal_balance >= ?',
+                   (amount, sender_id, amount))
+    if cursor.rowcount == 0:
+        return False # Sender unbekannt oder Guthaben nicht ausreichend
+    cursor.execute('UPDATE users SET internal_balance = internal_balance + ? WHERE id = ?', (amount, receiver_id))
+    if cursor.rowcount == 0:
+        raise ValueError(f"Receiver {receiver_id} not found.")
+    post_entries(cursor, 'transfer', [(user_account(sender_id), -amount), (user_account(receiver_id), amount)])
+    _log_scamcoin(cursor, [(sender_id, -amount, 'transfer', f"Überweisung an Nutzer {receiver_id}"),
+                           (receiver_id, amount, 'transfer', f"Empfang von Nutzer {sender_id}")])
+    return True
+
+def transfer_funds(sender_id: int, receiver_id: int, amount: int, idempotency_key: str = None) -> bool:
+    """Interne Überweisung: Abbuchung, Gutschrift und beide Verlaufseinträge in einer Transaktion."""
+    success = transfer_batch([(sender_id, receiver_id, amount)], idempotency_key)[0]
+    if not success:
+        release_idempotency_key(idempotency_key)
+    return success
+
+def transfer_batch(transfers: list, idempotency_key: str = None) -> list:
+    """Führt mehrere Überweisungen (sender_id, receiver_id, amount) in einer BEGIN IMMEDIATE-Transaktion aus.
+
+    Jede Überweisung läuft in einem eigenen SAVEPOINT, eine fehlgeschlagene
+    Überweisung (Guthaben, unbekannter Empfänger) lässt die übrigen unberührt.
+    Gibt pro Überweisung True/False in der Reihenfolge der Eingabe zurück.
+    idempotency_key wird zusammen mit den Überweisungen festgeschrieben.
+    """
+    results = [False] * len(transfers)
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for index, (sender_id, receiver_id, amount) in enumerate(transfers):
+                cursor.execute("SAVEPOINT transfer")
+                try:
+                    results[index] = _apply_transfer(cursor, sender_id, receiver_id, amount)
+                except ValueError as ve:
+                    logger.warning(f"Transfer failed (ValueError): {ve}")
+                    cursor.execute("ROLLBACK TO transfer")
+                cursor.execute("RELEASE transfer")
+            if any(results):
+                complete_idempotency_key(cursor, idempotency_key)
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Database error during transfer batch: {e}")
+            conn.rollback()
+            return [False] * len(transfers)
+    return results
+
+def get_pending_fees() -> tuple[int, int]:
+    """Summe und Anzahl der Gebühren, die noch nicht dem Owner gutgeschrieben sind."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COALESCE(SUM(amount), 0), COUNT(*) FROM fee_ledger
+            WHERE id > (SELECT COALESCE(MAX(last_fee_id), 0) FROM fee_settlements)
+        ''')
+        total, count = cursor.fetchone()
+        return total, count
+
+def settle_fees() -> int:
+    """Schreibt alle offenen Gebühren aus dem fee_ledger in einem Schritt dem Owner-Konto gut.
+
+    Das Journal bleibt append-only: abgerechnet ist alles bis last_fee_id der letzten Abrechnung.
+    Gibt den gutgeschriebenen Betrag zurück.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute('SELECT COALESCE(MAX(last_fee_id), 0) FROM fee_settlements')
+            settled_up_to = cursor.fetchone()[0]
+            cursor.execute('SELECT COALESCE(SUM(amount), 0), MAX(id) FROM fee_ledger WHERE id > ?', (settled_up_to,))
+            amount, last_fee_id = cursor.fetchone()
+            if last_fee_id is None:
+                conn.rollback()
+                return 0
+            cursor.execute('UPDATE users SET internal_balance = internal_balance + ? WHERE id = ?',
+                           (amount, BOT_OWNER_ID))
+            post_entries(cursor, 'fee_settlement', [(FEES_ACCOUNT, -amount), (user_account(BOT_OWNER_ID), amount)],
+                         f"fee_ledger:{last_fee_id}")
+            _log_scamcoin(cursor, [(BOT_OWNER_ID, amount, 'fee_settlement', f"Gebühren bis Eintrag {last_fee_id}")])
+            cursor.execute('INSERT INTO fee_settlements (last_fee_id, amount) VALUES (?, ?)', (last_fee_id, amount))
+            conn.commit()
+            return amount
+        except sqlite3.Error as e:
+            logger.error(f"Database error during fee settlement: {e}")
+            conn.rollback()
+            return 0
+
+def reconcile_balances() -> dict:
+    """Vergleicht die Summe aller Guthaben mit der Summe der Nutzerkonten im Journal.
+
+    Die Summen berechnet eine einzige Abfrage. Nur wenn sie abweichen, werden die
+    einzelnen Konten verglichen. Gibt die Gesamtsummen und die Liste der abweichenden
+    Konten (user_id, balance, ledger) zurück.
+    """
+    with connection() as conn:
+        # snapshot_balances schreibt alle Konten auf einmal fort, Einträge bis zum
+        # höchsten Snapshot-Wasserstand stecken also schon in den Snapshots
+        balance_total, ledger_total, accounts, balanced = conn.execute('''
+            SELECT b.total, l.total, b.accounts, b.total = l.total
+            FROM (SELECT COALESCE(SUM(internal_balance), 0) AS total, COUNT(*) AS accounts FROM users) b,
+                 (SELECT (SELECT COALESCE(SUM(balance), 0) FROM balance_snapshots WHERE account LIKE 'user:%')
+                       + (SELECT COALESCE(SUM(e.amount), 0) FROM ledger_entries e
+                          LEFT JOIN balance_snapshots s ON s.account = e.account
+                          WHERE e.id > (SELECT COALESCE(MAX(last_entry_id), 0) FROM balance_snapshots)
+                            AND e.id > COALESCE(s.last_entry_id, 0) AND e.account LIKE 'user:%') AS total) l
+        ''').fetchone()
+        mismatches = []
+        if not balanced:
+            mismatches = conn.execute('''
+                SELECT u.id, u.internal_balance, COALESCE(s.balance, 0) + COALESCE(SUM(e.amount), 0) AS ledger_sum
+                FROM users u
+                LEFT JOIN balance_snapshots s ON s.account = 'user:' || u.id
+                LEFT JOIN ledger_entries e ON e.account = 'user:' || u.id AND e.id > COALESCE(s.last_entry_id, 0)
+                GROUP BY u.id
+                HAVING u.internal_balance <> ledger_sum
+            ''').fetchall()
+    return {
+        'balance_total': balance_total,
+        'ledger_total': ledger_total,
+        'accounts': accounts,
+        'mismatches': mismatches,
+    }
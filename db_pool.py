@@ -0,0 +1,202 @@
+import sqlite3
+import queue
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# GEMEINSAMER SQLITE-CONNECTION-POOL
+# =================================================================================
+# Alle Module (database.py, profile.py, notes_storage.py, ...) holen ihre
+# Verbindungen hier, statt für jeden Aufruf sqlite3.connect()/close() auszuführen.
+
+DB_NAME = 'scamlingbot.db'
+POOL_MAX_SIZE = 8 # Maximale Anzahl gleichzeitig offener Verbindungen
+POOL_TIMEOUT_SECONDS = 10.0 # Wartezeit, bis eine freie Verbindung verfügbar sein muss
+BUSY_TIMEOUT_MS = 5000
+
+# PRAGMAs, die für jede neue Verbindung einmalig gesetzt werden
+DEFAULT_PRAGMAS = {
+    'foreign_keys': 'ON',
+    'busy_timeout': BUSY_TIMEOUT_MS,
+}
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Keine freie Verbindung innerhalb des Timeouts verfügbar."""
+
+
+class ConnectionPool:
+    """Begrenzter Pool langlebiger SQLite-Verbindungen.
+
+    Eine Verbindung gehört immer genau einem Thread, solange sie ausgeliehen ist.
+    Verschachtelte Aufrufe im selben Thread (z.B. get_user_internal_balance ->
+    add_user_to_db) bekommen dieselbe Verbindung zurück, statt eine zweite
+    aus dem Pool zu ziehen.
+    """
+
+    def __init__(self, db_path: str = DB_NAME, max_size: int = POOL_MAX_SIZE,
+                 timeout: float = POOL_TIMEOUT_SECONDS, pragmas: dict = None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._all = []
+        self._closed = False
+        self.stats = {'created': 0, 'checkouts': 0, 'reentrant': 0, 'waits': 0, 'timeouts': 0}
+
+    def _create_connection(self) -> sqlite3.Connection:
+        # check_same_thread=False: die Verbindung wandert zwischen Threads, wird
+        # aber durch den Checkout immer nur von einem Thread gleichzeitig benutzt.
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        self.stats['created'] += 1
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed.")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.max_size:
+                conn = self._create_connection()
+                self._all.append(conn)
+                return conn
+        self.stats['waits'] += 1
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            self.stats['timeouts'] += 1
+            raise PoolTimeout(f"No database connection available after {self.timeout}s (pool size {self.max_size}).")
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            # Nicht abgeschlossene Transaktionen dürfen nicht in den nächsten Checkout durchsickern
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            return
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        """Leiht eine Verbindung für den aktuellen Thread aus."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self.stats['reentrant'] += 1
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self.stats['checkouts'] += 1
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        """Führt den Block in einer Transaktion aus (COMMIT bei Erfolg, sonst ROLLBACK)."""
+        with self.connection() as conn:
+            if conn.in_transaction:
+                # Bereits in einer äußeren Transaktion desselben Threads
+                yield conn
+                return
+            conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    def size(self) -> int:
+        return len(self._all)
+
+    def idle(self) -> int:
+        return self._idle.qsize()
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._all.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_NAME)
+    return _pool
+
+
+def configure_pool(db_path: str = None, max_size: int = None, timeout: float = None, pragmas: dict = None) -> ConnectionPool:
+    """Ersetzt den globalen Pool (z.B. beim Start oder in Tests) und schließt den alten."""
+    global _pool, DB_NAME
+    with _pool_lock:
+        old = _pool
+        if db_path:
+            DB_NAME = db_path
+        _pool = ConnectionPool(
+            DB_NAME,
+            max_size=max_size or (old.max_size if old else POOL_MAX_SIZE),
+            timeout=timeout or (old.timeout if old else POOL_TIMEOUT_SECONDS),
+            pragmas=pragmas if pragmas is not None else (old.pragmas if old else None),
+        )
+    if old is not None:
+        old.close()
+    logger.info(f"SQLite-Pool konfiguriert: {DB_NAME} (max {_pool.max_size} Verbindungen)")
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextmanager
+def connection():
+    with get_pool().connection() as conn:
+        yield conn
+
+
+@contextmanager
+def transaction(immediate: bool = False):
+    with get_pool().transaction(immediate=immediate) as conn:
+        yield conn
+
+
+def get_pool_stats() -> dict:
+    pool = get_pool()
+    return dict(pool.stats, size=pool.size(), idle=pool.idle(), max_size=pool.max_size)
@@ -0,0 +1,102 @@
+import os
+import datetime
+
+# =================================================================================
+# ADAPTIVES ABRUFINTERVALL PRO FEED
+# =================================================================================
+# Jeder Feed wird in seinem eigenen Takt abgerufen. Aus den Veröffentlichungs-
+# zeiten neuer Artikel wird der mittlere Abstand zwischen zwei Artikeln gelernt
+# (gleitender Mittelwert). Abgerufen wird doppelt so oft, wie der Feed
+# veröffentlicht, begrenzt durch NEWS_MIN_POLL_SECONDS und NEWS_MAX_POLL_SECONDS.
+# Ein Feed, der länger als üblich schweigt, wird entsprechend seltener gefragt.
+# Nach Fehlern verdoppelt sich die Wartezeit mit jedem weiteren Fehler in Folge.
+# Der News-Job läuft alle NEWS_SCHEDULER_TICK_SECONDS und ruft nur fällige Feeds ab.
+
+NEWS_SCHEDULER_TICK_SECONDS = int(os.environ.get("NEWS_SCHEDULER_TICK_SECONDS", 60))
+NEWS_MIN_POLL_SECONDS = int(os.environ.get("NEWS_MIN_POLL_SECONDS", 5 * 60))
+NEWS_MAX_POLL_SECONDS = int(os.environ.get("NEWS_MAX_POLL_SECONDS", 6 * 60 * 60))
+NEWS_DEFAULT_POLL_SECONDS = 30 * 60 # Solange der Takt eines Feeds unbekannt ist
+NEWS_MAX_BACKOFF_SECONDS = int(os.environ.get("NEWS_MAX_BACKOFF_SECONDS", 24 * 60 * 60))
+NEWS_POLLS_PER_PUBLISH = 2 # Abrufe pro mittlerem Veröffentlichungsabstand
+NEWS_CADENCE_SMOOTHING = 0.3 # Gewicht einer neuen Beobachtung im gleitenden Mittel
+
+
+def utc_now() -> datetime.datetime:
+    """Naive UTC-Zeit, wie CURRENT_TIMESTAMP in SQLite und die Feed-Zeitstempel."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def format_timestamp(dt: datetime.datetime | None) -> str | None:
+    # Gleiches Format wie CURRENT_TIMESTAMP, damit SQLite die Werte als Text vergleichen kann
+    return dt.isoformat(sep=' ', timespec='seconds') if dt else None
+
+
+def parse_timestamp(text: str | None) -> datetime.datetime | None:
+    return datetime.datetime.fromisoformat(text) if text else None
+
+
+def learn_publish_interval(avg_seconds: float | None, last_item_at: datetime.datetime | None, published) -> tuple:
+    """Aktualisiert den mittleren Veröffentlichungsabstand mit den Zeitpunkten eines Abrufs.
+
+    Gibt (neuer Mittelwert, Zeitpunkt des neuesten Artikels) zurück.
+    """
+    times = sorted(t for t in published if t is not None and (last_item_at is None or t > last_item_at))
+    if not times:
+        return avg_seconds, last_item_at
+    if last_item_at is not None:
+        observed = (times[-1] - last_item_at).total_seconds() / len(times)
+    elif len(times) > 1:
+        observed = (times[-1] - times[0]).total_seconds() / (len(times) - 1)
+    else:
+        return avg_seconds, times[-1] # Ein einzelner Artikel sagt noch nichts über den Takt
+    if avg_seconds is None:
+        return observed, times[-1]
+    return avg_seconds + NEWS_CADENCE_SMOOTHING * (observed - avg_seconds), times[-1]
+
+
+def poll_interval(avg_seconds: float | None, last_item_at: datetime.datetime | None, now: datetime.datetime) -> int:
+    """Abrufintervall aus dem gelernten Takt, in Sekunden."""
+    if avg_seconds is None:
+        return NEWS_DEFAULT_POLL_SECONDS
+    expected = avg_seconds
+    if last_item_at is not None:
+        # Schweigt der Feed länger als üblich, wird der Abstand seit dem letzten Artikel zum Maßstab
+        expected = max(expected, (now - last_item_at).total_seconds())
+    return int(min(NEWS_MAX_POLL_SECONDS, max(NEWS_MIN_POLL_SECONDS, expected / NEWS_POLLS_PER_PUBLISH)))
+
+
+def backoff_delay(interval: int, error_streak: int) -> int:
+    """Wartezeit nach error_streak Fehlern in Folge: das Intervall, mit jedem Fehler verdoppelt."""
+    if error_streak <= 0:
+        return interval
+    return min(NEWS_MAX_BACKOFF_SECONDS, interval * 2 ** min(error_streak, 16))
+
+
+def plan_next_poll(state: dict | None, ok: bool, published, now: datetime.datetime) -> dict:
+    """Neuer Zeitplan eines Feeds nach einem Abruf.
+
+    state ist der gespeicherte Zustand aus get_news_feed_states (oder None),
+    published die Veröffentlichungszeiten der neuen Einträge.
+    """
+    state = state or {}
+    avg_seconds = state.get('avg_publish_seconds')
+    last_item_at = parse_timestamp(state.get('last_item_at'))
+    if ok:
+        avg_seconds, last_item_at = learn_publish_interval(avg_seconds, last_item_at, published)
+        interval = poll_interval(avg_seconds, last_item_at, now)
+        delay = interval
+    else:
+        interval = state.get('poll_interval_seconds') or NEWS_DEFAULT_POLL_SECONDS
+        delay = backoff_delay(interval, (state.get('error_streak') or 0) + 1)
+    return {
+        'avg_publish_seconds': avg_seconds,
+        'last_item_at': format_timestamp(last_item_at),
+        'poll_interval_seconds': interval,
+        'next_poll_at': format_timestamp(now + datetime.timedelta(seconds=delay)),
+    }
+
+
+def due_feeds(urls, states: dict, now: datetime.datetime) -> list:
+    """Die Feeds, deren nächster Abruf fällig ist. Neue Feeds sind sofort fällig."""
+    now_text = format_timestamp(now)
+    return [url for url in urls if not (states.get(url) or {}).get('next_poll_at') or states[url]['next_poll_at'] <= now_text]
@@ -0,0 +1,138 @@
+import os
+import heapq
+import datetime
+import itertools
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+
+from feedparser import FeedParserDict
+
+# =================================================================================
+# STREAMENDES FEED-PARSEN MIT KONSTANTEM SPEICHER
+# =================================================================================
+# RSS 2.0 und Atom werden direkt aus dem HTTP-Bytestrom geparst. Jedes Item
+# wird ausgewertet, sobald es vollständig ist, und danach aus dem Baum entfernt.
+# Behalten werden nur die neuesten NEWS_STREAM_MAX_CANDIDATES Items, in einem
+# Heap. Feeds sind fast immer neueste zuerst sortiert. Nach einigen Items in
+# Folge, die älter als der letzte Check sind, wird das Lesen abgebrochen.
+# Der Rest des Feeds wird gar nicht erst heruntergeladen.
+
+NEWS_STREAM_MAX_CANDIDATES = int(os.environ.get("NEWS_STREAM_MAX_CANDIDATES", 50))
+NEWS_STREAM_OLD_ITEMS_BEFORE_STOP = 3 # Toleranz für leicht unsortierte Feeds
+
+
+def _local(tag: str) -> str:
+    # "{http://www.w3.org/2005/Atom}entry" -> "entry"
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def parse_feed_date(text: str | None) -> datetime.datetime | None:
+    """RFC 822 (RSS) oder ISO 8601 (Atom) als naive UTC-Zeit, wie feedparser sie liefert."""
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        parsed = parsedate_to_datetime(text)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _entry_from_element(elem):
+    # (Eintrag im Format von feedparser, Zeitpunkt oder None)
+    fields = {}
+    for child in elem:
+        name = _local(child.tag)
+        if name == 'link' and child.get('href'):
+            # Atom: <link rel="alternate" href="..."/>, der erste alternate-Link gewinnt
+            if child.get('rel', 'alternate') == 'alternate':
+                fields.setdefault('link', child.get('href').strip())
+        elif name in ('title', 'link', 'guid', 'id', 'pubDate', 'published', 'updated') and child.text:
+            fields.setdefault(name, child.text.strip())
+    entry = FeedParserDict()
+    if 'title' in fields:
+        entry['title'] = fields['title']
+    if 'link' in fields:
+        entry['link'] = fields['link']
+    item_id = fields.get('guid') or fields.get('id')
+    if item_id:
+        entry['id'] = item_id
+    published = parse_feed_date(fields.get('pubDate') or fields.get('published') or fields.get('updated'))
+    if published is not None:
+        entry['published'] = published.isoformat()
+        entry['published_parsed'] = published.timetuple()
+    return entry, published
+
+
+class FeedStreamParser:
+    """Inkrementeller RSS/Atom-Parser: feed(bytes) beliebig oft, danach entries()."""
+
+    def __init__(self, since: datetime.datetime = None, limit: int = NEWS_STREAM_MAX_CANDIDATES,
+                 old_items_before_stop: int = NEWS_STREAM_OLD_ITEMS_BEFORE_STOP):
+        self.since = since
+        self.limit = limit
+        self.old_items_before_stop = old_items_before_stop
+        self._parser = ET.XMLPullParser(events=('start', 'end'))
+        self._stack = [] # Offene Elemente, damit fertige Items aus ihrem Elternelement entfernt werden können
+        self._heap = [] # (Zeitpunkt, seq, Eintrag), ältester oben
+        self._seq = itertools.count()
+        self._old_in_row = 0
+        self.title = None
+        self.items_seen = 0
+        self.done = False # Genug gelesen, der Rest ist älter als since
+
+    def feed(self, chunk: bytes):
+        if self.done:
+            return
+        self._parser.feed(chunk)
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                self._stack.append(elem)
+                continue
+            self._stack.pop()
+            name = _local(elem.tag)
+            if name in ('item', 'entry'):
+                self._handle(*_entry_from_element(elem))
+                if self._stack:
+                    self._stack[-1].remove(elem)
+                if self.done:
+                    return
+            elif name == 'title' and self.title is None and self._stack and _local(self._stack[-1].tag) in ('channel', 'feed'):
+                self.title = (elem.text or '').strip() or None
+
+    def close(self):
+        """Prüft, ob das Dokument vollständig war. Nach einem Abbruch (done) gibt es nichts zu prüfen."""
+        if not self.done:
+            self._parser.close()
+
+    def _handle(self, entry: FeedParserDict, published: datetime.datetime | None):
+        self.items_seen += 1
+        if self.since is not None and published is not None and published <= self.since:
+            self._old_in_row += 1
+            if self._old_in_row >= self.old_items_before_stop:
+                self.done = True
+            return
+        self._old_in_row = 0
+        heapq.heappush(self._heap, (published or datetime.datetime.min, next(self._seq), entry))
+        if len(self._heap) > self.limit:
+            heapq.heappop(self._heap) # Ältesten Kandidaten verwerfen
+
+    def entries(self) -> list:
+        """Die behaltenen Einträge, ältester zuerst."""
+        return [entry for _, _, entry in sorted(self._heap)]
+
+
+async def stream_feed(response, since: datetime.datetime = None, limit: int = NEWS_STREAM_MAX_CANDIDATES) -> FeedStreamParser:
+    """Parst den Body einer httpx-Streaming-Response, liest nur so weit wie nötig."""
+    parser = FeedStreamParser(since, limit)
+    async for chunk in response.aiter_bytes():
+        parser.feed(chunk)
+        if parser.done:
+            break
+    parser.close()
+    return parser
@@ -0,0 +1,153 @@
+import os
+import time
+import asyncio
+import logging
+import contextlib
+import importlib.util
+from urllib.parse import urlsplit
+
+import httpx
+
+from metrics import percentile, sample_window
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# GEMEINSAMER HTTP-CLIENT FÜR ALLE AUSGEHENDEN ANFRAGEN
+# =================================================================================
+# Ein AsyncClient für die ganze Anwendung: Verbindungen (TLS, DNS) werden über
+# Keep-Alive wiederverwendet, statt pro Aufruf neu aufgebaut. Gestartet wird er
+# im post_init der Application, geschlossen im post_shutdown. Zusätzlich begrenzt
+# eine Semaphore pro Host, wie viele Anfragen gleichzeitig an denselben Dienst gehen.
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY_SECONDS", 30))
+HTTP_PER_HOST_LIMIT = int(os.environ.get("HTTP_PER_HOST_LIMIT", 10)) # Gleichzeitige Anfragen pro Host
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_TIMEOUT_SECONDS", 15))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("HTTP_CONNECT_TIMEOUT_SECONDS", 5))
+# HTTP/2 braucht das optionale Paket h2 (httpx[http2]), ohne bleibt es bei HTTP/1.1
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+
+class HttpClientManager:
+    """Hält den gemeinsamen httpx.AsyncClient und begrenzt gleichzeitige Anfragen pro Host."""
+
+    def __init__(self, per_host_limit: int = HTTP_PER_HOST_LIMIT):
+        self.per_host_limit = per_host_limit
+        self._client = None
+        self._host_slots = {}
+        self._per_host = {}
+        self._latency_ms = sample_window()
+        self.requests = 0
+        self.failed = 0
+
+    def _build_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+            follow_redirects=True,
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Ohne post_init (Skripte, Tests) wird der Client beim ersten Zugriff angelegt
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    async def start(self):
+        self.client
+        logger.info(f"HTTP-Client gestartet (HTTP/2: {'an' if HTTP2_ENABLED else 'aus'}, max. {HTTP_MAX_CONNECTIONS} Verbindungen).")
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._host_slots.clear()
+
+    def _slots_for(self, host: str) -> asyncio.Semaphore:
+        slots = self._host_slots.get(host)
+        if slots is None:
+            slots = self._host_slots[host] = asyncio.Semaphore(self.per_host_limit)
+        return slots
+
+    @contextlib.asynccontextmanager
+    async def _tracked(self, url: str):
+        # Limit pro Host und Messwerte, gemeinsam für request() und stream()
+        host = urlsplit(str(url)).netloc
+        entry = self._per_host.setdefault(host, {'requests': 0, 'failed': 0, 'in_flight': 0, 'waiting': 0})
+        entry['waiting'] += 1
+        async with self._slots_for(host):
+            entry['waiting'] -= 1
+            entry['in_flight'] += 1
+            started_at = time.perf_counter()
+            try:
+                yield
+            except httpx.HTTPError:
+                self.failed += 1
+                entry['failed'] += 1
+                raise
+            finally:
+                entry['in_flight'] -= 1
+                entry['requests'] += 1
+                self.requests += 1
+                self._latency_ms.append((time.perf_counter() - started_at) * 1000)
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Wie httpx.AsyncClient.request, aber über den gemeinsamen Pool und mit Limit pro Host."""
+        async with self._tracked(url):
+            return await self.client.request(method, url, **kwargs)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs):
+        """Wie httpx.AsyncClient.stream: der Body wird erst beim Lesen (aiter_bytes) übertragen.
+
+        Der Slot des Hosts bleibt belegt, bis der Block verlassen wird.
+        """
+        async with self._tracked(url):
+            async with self.client.stream(method, url, **kwargs) as response:
+                yield response
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def stats(self) -> dict:
+        connections = []
+        if self._client is not None:
+            # httpcore legt die offenen Verbindungen am Pool des Transports ab
+            pool = getattr(self._client._transport, '_pool', None)
+            connections = list(getattr(pool, 'connections', []))
+        latency = list(self._latency_ms)
+        return {
+            'http2': HTTP2_ENABLED,
+            'requests': self.requests,
+            'failed': self.failed,
+            'connections': len(connections),
+            'idle_connections': sum(1 for c in connections if c.is_idle()),
+            'latency_ms_p50': percentile(latency, 50),
+            'latency_ms_p99': percentile(latency, 99),
+            'per_host': {host: dict(entry) for host, entry in self._per_host.items()},
+        }
+
+
+# Gemeinsame Instanz für alle Module
+http = HttpClientManager()
+
+
+async def start_http_client(application):
+    """post_init-Callback der Application."""
+    await http.start()
+
+
+async def close_http_client(application):
+    """post_shutdown-Callback der Application."""
+    await http.close()
@@ -0,0 +1,70 @@
+import os
+import time
+import logging
+from db_pool import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# IDEMPOTENZ-SCHLÜSSEL FÜR GELDBEWEGUNGEN
+# =================================================================================
+# Telegram stellt Updates erneut zu, Nutzer tippen Buttons doppelt. Ein Handler,
+# der Geld bewegt, beansprucht vorher den Schlüssel seines Updates. Nur der erste
+# Aufruf bekommt ihn, Wiederholungen sehen das gespeicherte Ergebnis und machen
+# weder Datenbankarbeit noch schicken sie Nachrichten.
+
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60))
+
+PENDING = 'pending' # Beansprucht, Ergebnis steht noch aus
+SUCCEEDED = 'succeeded'
+
+
+def idempotency_key(update, action: str) -> str:
+    """Schlüssel eines Updates: gleiche Nachricht + gleicher Button bzw. gleiche Nachricht = gleicher Schlüssel.
+
+    Doppelt getippte Buttons haben verschiedene Callback-IDs, aber dieselbe Nachricht und dieselben Daten.
+    """
+    query = update.callback_query
+    if query is not None and query.message is not None:
+        return f"{action}:cb:{query.message.chat.id}:{query.message.message_id}:{query.data}"
+    if query is not None:
+        return f"{action}:cb:{query.id}" # Inline-Nachrichten haben keine message_id
+    message = update.effective_message
+    return f"{action}:msg:{message.chat.id}:{message.message_id}"
+
+
+def claim_idempotency_key(key: str) -> str | None:
+    """Beansprucht key. Gibt None zurück, wenn der Aufrufer die Arbeit machen soll, sonst das gespeicherte Ergebnis."""
+    now = int(time.time())
+    with transaction(immediate=True) as conn:
+        conn.execute('DELETE FROM idempotency_keys WHERE key = ? AND expires_at <= ?', (key, now))
+        cursor = conn.execute('INSERT INTO idempotency_keys (key, outcome, expires_at) VALUES (?, ?, ?) ON CONFLICT (key) DO NOTHING',
+                              (key, PENDING, now + IDEMPOTENCY_TTL_SECONDS))
+        if cursor.rowcount == 1:
+            return None
+        return conn.execute('SELECT outcome FROM idempotency_keys WHERE key = ?', (key,)).fetchone()[0]
+
+
+def complete_idempotency_key(cursor, key: str | None, outcome: str = SUCCEEDED):
+    # Läuft in der Transaktion der Geldbewegung, Ergebnis und Buchung werden gemeinsam festgeschrieben
+    if key is not None:
+        cursor.execute('UPDATE idempotency_keys SET outcome = ? WHERE key = ?', (outcome, key))
+
+
+def release_idempotency_key(key: str | None):
+    """Gibt einen Schlüssel nach einem Fehlschlag frei, damit der Nutzer es erneut versuchen kann.
+
+    Fehlgeschlagene Geldbewegungen schreiben nichts, eine Wiederholung ist daher unschädlich.
+    """
+    if key is None:
+        return
+    with connection() as conn:
+        conn.execute('DELETE FROM idempotency_keys WHERE key = ? AND outcome = ?', (key, PENDING))
+        conn.commit()
+
+
+def purge_expired_idempotency_keys() -> int:
+    with connection() as conn:
+        cursor = conn.execute('DELETE FROM idempotency_keys WHERE expires_at <= ?', (int(time.time()),))
+        conn.commit()
+        return cursor.rowcount
@@ -0,0 +1,173 @@
+import os
+import uuid
+import socket
+import asyncio
+import logging
+import functools
+import contextlib
+
+from async_db import db
+from db_pool import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# JOB-CHECKPOINTS UND LEASES
+# =================================================================================
+# Jeder geplante Job hat eine Zeile in job_checkpoints mit seinem Cursor
+# (Fortschritt, z.B. Zeitpunkt des letzten News-Checks), dem letzten Lauf und
+# einer Lease. Wer einen Job ausführen will, übernimmt zuerst atomar die Lease.
+# Laufen mehrere Bot-Instanzen auf derselben Datenbank, führt so immer nur eine
+# den Job aus. Während des Laufs wird die Lease regelmäßig verlängert. Stürzt
+# ein Prozess ab, läuft sie nach JOB_LEASE_SECONDS aus. Den Cursor darf nur
+# der Halter der Lease schreiben. Geht die Lease verloren, wird der laufende
+# Job abgebrochen, damit nie zwei Prozesse denselben Job gleichzeitig ausführen.
+
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", 5 * 60))
+# Eindeutig pro Prozess, auch wenn Container alle mit PID 1 laufen
+JOB_OWNER = os.environ.get("JOB_OWNER") or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+JOB_SKIPPED = object() # Rückgabewert von exclusive-Jobs, die nicht (zu Ende) gelaufen sind
+
+
+class LeaseLost(Exception):
+    """Die Lease eines laufenden Jobs wurde von einem anderen Prozess übernommen."""
+
+
+def acquire_job_lease(job: str, owner: str, lease_seconds: int = JOB_LEASE_SECONDS, min_interval_seconds: int = 0) -> bool:
+    """Übernimmt die Lease, wenn sie frei oder abgelaufen ist.
+
+    Mit min_interval_seconds nur, wenn der letzte Start mindestens so lange her ist,
+    damit mehrere Instanzen einen periodischen Job nicht mehrfach ausführen.
+    """
+    with transaction(immediate=True) as conn:
+        conn.execute('INSERT OR IGNORE INTO job_checkpoints (job) VALUES (?)', (job,))
+        cursor = conn.execute('''
+            UPDATE job_checkpoints
+            SET lease_owner = ?, lease_expires_at = datetime('now', ?), last_started_at = CURRENT_TIMESTAMP
+            WHERE job = ?
+              AND (lease_owner IS NULL OR lease_expires_at <= CURRENT_TIMESTAMP)
+              AND (last_started_at IS NULL OR last_started_at <= datetime('now', ?))
+        ''', (owner, f'+{lease_seconds} seconds', job, f'-{min_interval_seconds} seconds'))
+        return cursor.rowcount == 1
+
+
+def renew_job_lease(job: str, owner: str, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+    """Verlängert die eigene Lease. False, wenn sie inzwischen ein anderer Prozess hält."""
+    with connection() as conn:
+        cursor = conn.execute("UPDATE job_checkpoints SET lease_expires_at = datetime('now', ?) WHERE job = ? AND lease_owner = ?",
+                              (f'+{lease_seconds} seconds', job, owner))
+        conn.commit()
+        return cursor.rowcount == 1
+
+
+def release_job_lease(job: str, owner: str, status: str = 'ok'):
+    """Gibt die eigene Lease frei und vermerkt das Ende des Laufs."""
+    with connection() as conn:
+        conn.execute('''
+            UPDATE job_checkpoints
+            SET lease_owner = NULL, lease_expires_at = NULL, last_run_at = CURRENT_TIMESTAMP, last_status = ?
+            WHERE job = ? AND lease_owner = ?
+        ''', (status, job, owner))
+        conn.commit()
+
+
+def get_job_cursor(job: str) -> str | None:
+    with connection() as conn:
+        row = conn.execute('SELECT cursor FROM job_checkpoints WHERE job = ?', (job,)).fetchone()
+        return row[0] if row else None
+
+
+def save_job_cursor(job: str, cursor: str, owner: str) -> bool:
+    """Schreibt den Cursor, nur solange owner die Lease hält. Eine einzelne UPDATE-Anweisung, also atomar."""
+    with connection() as conn:
+        result = conn.execute('UPDATE job_checkpoints SET cursor = ? WHERE job = ? AND lease_owner = ?', (cursor, job, owner))
+        conn.commit()
+        return result.rowcount == 1
+
+
+def get_job_checkpoints() -> list:
+    """Alle Jobs für den Admin-Status."""
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT job, last_run_at, last_status, lease_owner, lease_expires_at
+            FROM job_checkpoints ORDER BY job
+        ''').fetchall()
+    return [{'job': job, 'last_run_at': last_run_at, 'last_status': last_status,
+             'lease_owner': lease_owner, 'lease_expires_at': lease_expires_at}
+            for job, last_run_at, last_status, lease_owner, lease_expires_at in rows]
+
+
+class JobCheckpoints:
+    """Leases und Cursor der geplanten Jobs für diesen Prozess."""
+
+    def __init__(self, owner: str = JOB_OWNER, lease_seconds: int = JOB_LEASE_SECONDS):
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.skipped = 0 # Läufe, die ausgelassen wurden, weil ein anderer Lauf die Lease hielt
+
+    @contextlib.asynccontextmanager
+    async def lease(self, job: str, min_interval_seconds: int = 0):
+        """async with jobs.lease('name') as held: ... held ist False, wenn ein anderer Lauf den Job hält.
+
+        Geht die Lease während des Laufs verloren, wird der Block abgebrochen und LeaseLost ausgelöst.
+        """
+        if not await db.run(acquire_job_lease, job, self.owner, self.lease_seconds, min_interval_seconds):
+            self.skipped += 1
+            yield False
+            return
+        task = asyncio.current_task()
+        lost = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(job, task, lost))
+        status = 'error'
+        try:
+            yield True
+            status = 'ok'
+        except asyncio.CancelledError:
+            if not lost.is_set():
+                raise
+            task.uncancel() # Abbruch durch den Heartbeat, nicht von außen
+            raise LeaseLost(job) from None
+        finally:
+            heartbeat.cancel()
+            await db.run(release_job_lease, job, self.owner, status)
+
+    async def _heartbeat(self, job: str, task: asyncio.Task, lost: asyncio.Event):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await db.run(renew_job_lease, job, self.owner, self.lease_seconds):
+                logger.warning(f"Lease für Job '{job}' verloren, ein anderer Prozess hat übernommen. Breche ab.")
+                lost.set()
+                task.cancel()
+                return
+
+    def exclusive(self, job: str, min_interval_seconds: int = 0):
+        """Decorator für Job-Callbacks: der Lauf entfällt, wenn ein anderer Prozess den Job hält.
+
+        Dann, oder wenn die Lease unterwegs verloren geht, ist der Rückgabewert JOB_SKIPPED.
+        """
+        def decorator(callback):
+            @functools.wraps(callback)
+            async def wrapper(*args, **kwargs):
+                try:
+                    async with self.lease(job, min_interval_seconds) as held:
+                        if not held:
+                            logger.info(f"Job '{job}' übersprungen, er läuft bereits oder lief gerade erst.")
+                            return JOB_SKIPPED
+                        return await callback(*args, **kwargs)
+                except LeaseLost:
+                    return JOB_SKIPPED
+            return wrapper
+        return decorator
+
+    async def get_cursor(self, job: str) -> str | None:
+        return await db.run(get_job_cursor, job)
+
+    async def save_cursor(self, job: str, cursor: str) -> bool:
+        saved = await db.run(save_job_cursor, job, cursor, self.owner)
+        if not saved:
+            logger.warning(f"Cursor für Job '{job}' nicht gespeichert, die Lease gehört nicht mehr diesem Prozess.")
+        return saved
+
+
+# Gemeinsame Instanz für alle Module
+job_checkpoints = JobCheckpoints()
@@ -1,121 +1,239 @@
+import threading
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
-from localization import T # Stellen Sie sicher, dass T importiert ist
+from localization import LOCALIZATION_DATA, resolve_language, translate
 
 # =================================================================================
 # 4. KEYBOARD-GENERATOREN
 # =================================================================================
+# Statische Keyboards hängen nur von der Sprache ab. Sie werden pro Sprache einmal
+# gebaut (beim Start über warm_up_keyboards() oder beim ersten Aufruf) und danach
+# als geteiltes, unveränderliches InlineKeyboardMarkup zurückgegeben.
 
-async def get_main_menu_keyboard(context):
-    keyboard = [
-        [InlineKeyboardButton(await T("menu_earn_money", context), callback_data='menu_geld_verdienen')],
-        [InlineKeyboardButton(await T("menu_ai_chat", context), callback_data='menu_ai_chat')],
-        [InlineKeyboardButton(await T("menu_tools", context), callback_data='menu_tools')],
-        [InlineKeyboardButton(await T("menu_dashboard", context), callback_data='menu_personal_area')],
+class KeyboardRegistry:
+    """Registry für vorberechnete Keyboards, gecacht pro (Name, Sprache)."""
+
+    def __init__(self):
+        self._builders = {}
+        self._templates = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.hits = 0
+
+    def register(self, name: str):
+        """Registriert einen Builder builder(lang) -> InlineKeyboardMarkup."""
+        def decorator(builder):
+            self._builders[name] = builder
+            return builder
+        return decorator
+
+    def register_template(self, name: str):
+        """Registriert ein parametrisiertes Keyboard: builder(lang) -> render(**params)."""
+        def decorator(builder):
+            self._templates[name] = builder
+            return builder
+        return decorator
+
+    def _cached(self, kind: str, name: str, lang: str, builder):
+        key = (kind, name, lang)
+        value = self._cache.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                value = builder(lang)
+                self._cache[key] = value
+                self.builds += 1
+        return value
+
+    def get(self, name: str, lang: str = None) -> InlineKeyboardMarkup:
+        return self._cached('static', name, lang, self._builders[name])
+
+    def render(self, name: str, lang: str, **params) -> InlineKeyboardMarkup:
+        return self._cached('template', name, lang, self._templates[name])(**params)
+
+    def warm_up(self, languages=None):
+        """Baut alle registrierten Keyboards für alle Sprachen vorab."""
+        languages = list(languages or LOCALIZATION_DATA.keys())
+        for name, builder in self._builders.items():
+            if getattr(builder, 'localized', True):
+                for lang in languages:
+                    self.get(name, lang)
+            else:
+                self.get(name)
+        for name in self._templates:
+            for lang in languages:
+                self._cached('template', name, lang, self._templates[name])
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        return {'cached': len(self._cache), 'builds': self.builds, 'hits': self.hits}
+
+KEYBOARDS = KeyboardRegistry()
+
+def _not_localized(builder):
+    # Keyboards mit festen (deutschen) Texten werden nur einmal, unabhängig von der Sprache gebaut
+    builder.localized = False
+    return builder
+
+def warm_up_keyboards():
+    KEYBOARDS.warm_up()
+
+@KEYBOARDS.register('main_menu')
+def _build_main_menu(lang):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(translate("menu_earn_money", lang), callback_data='menu_geld_verdienen')],
+        [InlineKeyboardButton(translate("menu_ai_chat", lang), callback_data='menu_ai_chat')],
+        [InlineKeyboardButton(translate("menu_tools", lang), callback_data='menu_tools')],
+        [InlineKeyboardButton(translate("menu_dashboard", lang), callback_data='menu_personal_area')],
         # NEU: Marktplatz im Hauptmenü
-        [InlineKeyboardButton(await T("menu_marketplace", context), callback_data='menu_marketplace')], 
-        [InlineKeyboardButton(await T("menu_help", context), callback_data='menu_help'),
-         InlineKeyboardButton(await T("menu_language", context), callback_data='menu_language')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+        [InlineKeyboardButton(translate("menu_marketplace", lang), callback_data='menu_marketplace')],
+        [InlineKeyboardButton(translate("menu_help", lang), callback_data='menu_help'),
+         InlineKeyboardButton(translate("menu_language", lang), callback_data='menu_language')]
+    ])
+
+async def get_main_menu_keyboard(context):
+    return KEYBOARDS.get('main_menu', resolve_language(context))
+
+@KEYBOARDS.register('geld_verdienen_menu')
+def _build_geld_verdienen_menu(lang):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(translate("sub_geld_crypto_swap", lang), callback_data='sub_geld_krypto_swap_menu')],
+        [InlineKeyboardButton(translate("sub_geld_sell_pictures", lang), callback_data='sub_geld_bilder_menu')],
+        [InlineKeyboardButton(translate("sub_geld_affiliate_links", lang), callback_data='sub_geld_affiliate_menu')],
+        [InlineKeyboardButton(translate("back_to_main", lang), callback_data='back_to_main_menu')]
+    ])
 
 async def get_geld_verdienen_menu_keyboard(context):
-    keyboard = [
-        [InlineKeyboardButton(await T("sub_geld_crypto_swap", context), callback_data='sub_geld_krypto_swap_menu')],
-        [InlineKeyboardButton(await T("sub_geld_sell_pictures", context), callback_data='sub_geld_bilder_menu')],
-        [InlineKeyboardButton(await T("sub_geld_affiliate_links", context), callback_data='sub_geld_affiliate_menu')],
-        [InlineKeyboardButton(await T("back_to_main", context), callback_data='back_to_main_menu')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return KEYBOARDS.get('geld_verdienen_menu', resolve_language(context))
 
-def get_krypto_swap_menu_keyboard():
-    keyboard = [
+@KEYBOARDS.register('krypto_swap_menu')
+@_not_localized
+def _build_krypto_swap_menu(lang=None):
+    return InlineKeyboardMarkup([
         [InlineKeyboardButton("💰 Krypto Kurse", callback_data='krypto_kurse')],
         [InlineKeyboardButton("🔄 XRPL DEX Swap Info", callback_data='xrpl_dex_swap_info')],
         [InlineKeyboardButton("⬅️ Zurück", callback_data='sub_geld_verdienen_menu')] # Anpassen, falls zurück zum Geld verdienen Menü
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    ])
 
-def get_bilder_verkaufen_menu_keyboard():
-    keyboard = [
+def get_krypto_swap_menu_keyboard():
+    return KEYBOARDS.get('krypto_swap_menu')
+
+@KEYBOARDS.register('bilder_verkaufen_menu')
+@_not_localized
+def _build_bilder_verkaufen_menu(lang=None):
+    return InlineKeyboardMarkup([
         [InlineKeyboardButton("⬆️ Bild hochladen", callback_data='bilder_upload_start')],
         [InlineKeyboardButton("📊 Meine Verkäufe", callback_data='marketplace_my_products')],
         [InlineKeyboardButton("⬅️ Zurück", callback_data='menu_geld_verdienen')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    ])
 
-def get_affiliate_links_menu_keyboard():
-    keyboard = [
+def get_bilder_verkaufen_menu_keyboard():
+    return KEYBOARDS.get('bilder_verkaufen_menu')
+
+@KEYBOARDS.register('affiliate_links_menu')
+@_not_localized
+def _build_affiliate_links_menu(lang=None):
+    return InlineKeyboardMarkup([
         [InlineKeyboardButton("🔗 Link generieren", callback_data='affiliate_generate_start')],
         [InlineKeyboardButton("📈 Meine Statistiken", callback_data='affiliate_stats')],
         [InlineKeyboardButton("⬅️ Zurück", callback_data='menu_geld_verdienen')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    ])
+
+def get_affiliate_links_menu_keyboard():
+    return KEYBOARDS.get('affiliate_links_menu')
+
+@KEYBOARDS.register('tools_menu')
+def _build_tools_menu(lang):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(translate("tool_weather", lang), callback_data='tool_weather_start')],
+        [InlineKeyboardButton(translate("tool_calculator", lang), callback_data='tool_calculator_start')],
+        [InlineKeyboardButton(translate("tool_crypto_game", lang), callback_data='tool_game_start')],
+        [InlineKeyboardButton(translate("tool_time", lang), callback_data='tool_time')],
+        [InlineKeyboardButton(translate("back_to_main", lang), callback_data='back_to_main_menu')]
+    ])
 
 async def get_tools_menu_keyboard(context):
-    keyboard = [
-        [InlineKeyboardButton(await T("tool_weather", context), callback_data='tool_weather_start')],
-        [InlineKeyboardButton(await T("tool_calculator", context), callback_data='tool_calculator_start')],
-        [InlineKeyboardButton(await T("tool_crypto_game", context), callback_data='tool_game_start')],
-        [InlineKeyboardButton(await T("tool_time", context), callback_data='tool_time')],
-        [InlineKeyboardButton(await T("back_to_main", context), callback_data='back_to_main_menu')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return KEYBOARDS.get('tools_menu', resolve_language(context))
+
+@KEYBOARDS.register('personal_area_menu')
+def _build_personal_area_menu(lang):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(translate("personal_area_my_wallets", lang), callback_data='personal_area_my_wallets')],
+        [InlineKeyboardButton(translate("personal_area_my_pools", lang), callback_data='personal_area_my_pools')],
+        [InlineKeyboardButton(translate("personal_area_xrpl_info", lang), callback_data='personal_area_xrpl_info_start')],
+        [InlineKeyboardButton(translate("back_to_main", lang), callback_data='back_to_main_menu')]
+    ])
 
 async def get_personal_area_menu_keyboard(context):
-    keyboard = [
-        [InlineKeyboardButton(await T("personal_area_my_wallets", context), callback_data='personal_area_my_wallets')],
-        [InlineKeyboardButton(await T("personal_area_my_pools", context), callback_data='personal_area_my_pools')],
-        [InlineKeyboardButton(await T("personal_area_xrpl_info", context), callback_data='personal_area_xrpl_info_start')],
-        [InlineKeyboardButton(await T("back_to_main", context), callback_data='back_to_main_menu')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return KEYBOARDS.get('personal_area_menu', resolve_language(context))
 
-async def get_my_wallets_menu_keyboard(context):
-    keyboard = [
-        [InlineKeyboardButton(await T("wallet_add", context), callback_data='personal_area_add_wallet_start')],
-        [InlineKeyboardButton(await T("wallet_remove", context), callback_data='personal_area_remove_wallet_start')],
-        [InlineKeyboardButton(await T("wallet_check_balances", context), callback_data='personal_area_check_balances')],
+@KEYBOARDS.register('my_wallets_menu')
+def _build_my_wallets_menu(lang):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(translate("wallet_add", lang), callback_data='personal_area_add_wallet_start')],
+        [InlineKeyboardButton(translate("wallet_remove", lang), callback_data='personal_area_remove_wallet_start')],
+        [InlineKeyboardButton(translate("wallet_check_balances", lang), callback_data='personal_area_check_balances')],
         # NEU: Buttons für interne Wallet-Aktionen
-        [InlineKeyboardButton(await T("internal_wallet_deposit", context), callback_data='personal_area_internal_deposit')],
-        [InlineKeyboardButton(await T("internal_wallet_withdraw", context), callback_data='personal_area_internal_withdraw')],
+        [InlineKeyboardButton(translate("internal_wallet_deposit", lang), callback_data='personal_area_internal_deposit')],
+        [InlineKeyboardButton(translate("internal_wallet_withdraw", lang), callback_data='personal_area_internal_withdraw')],
         [InlineKeyboardButton("Transaktionsverlauf", callback_data='personal_area_wallet_transaction_history')],
-        [InlineKeyboardButton(await T("back_to_dashboard", context), callback_data='menu_personal_area')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+        [InlineKeyboardButton(translate("back_to_dashboard", lang), callback_data='menu_personal_area')]
+    ])
+
+async def get_my_wallets_menu_keyboard(context):
+    return KEYBOARDS.get('my_wallets_menu', resolve_language(context))
+
+@KEYBOARDS.register('my_pools_menu')
+def _build_my_pools_menu(lang):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(translate("pool_add", lang), callback_data='personal_area_add_pool_start')],
+        [InlineKeyboardButton(translate("pool_remove", lang), callback_data='personal_area_remove_pool_start')],
+        [InlineKeyboardButton(translate("pool_check_all", lang), callback_data='personal_area_check_all_pools')],
+        [InlineKeyboardButton(translate("pool_general_stats", lang), callback_data='personal_area_general_pool_stats_start')], # Allgemein
+        [InlineKeyboardButton(translate("back_to_dashboard", lang), callback_data='menu_personal_area')]
+    ])
 
 async def get_my_pools_menu_keyboard(context):
-    keyboard = [
-        [InlineKeyboardButton(await T("pool_add", context), callback_data='personal_area_add_pool_start')],
-        [InlineKeyboardButton(await T("pool_remove", context), callback_data='personal_area_remove_pool_start')],
-        [InlineKeyboardButton(await T("pool_check_all", context), callback_data='personal_area_check_all_pools')],
-        [InlineKeyboardButton(await T("pool_general_stats", context), callback_data='personal_area_general_pool_stats_start')], # Allgemein
-        [InlineKeyboardButton(await T("back_to_dashboard", context), callback_data='menu_personal_area')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return KEYBOARDS.get('my_pools_menu', resolve_language(context))
 
-def get_admin_menu_keyboard():
-    keyboard = [
+@KEYBOARDS.register('admin_menu')
+@_not_localized
+def _build_admin_menu(lang=None):
+    return InlineKeyboardMarkup([
         [InlineKeyboardButton("📊 Bot Status", callback_data='admin_bot_status')],
         [InlineKeyboardButton("📢 Broadcast senden", callback_data='admin_broadcast_start')],
         [InlineKeyboardButton("✉️ Feedback lesen", callback_data='admin_read_feedback')],
         [InlineKeyboardButton("📰 News manuell prüfen", callback_data='admin_check_news_feed_manual')],
         [InlineKeyboardButton("⬅️ Zurück zum Hauptmenü", callback_data='back_to_main_menu')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    ])
+
+def get_admin_menu_keyboard():
+    return KEYBOARDS.get('admin_menu')
 
 # NEU: Marktplatz-Keyboards
 
+@KEYBOARDS.register('marketplace_menu')
+def _build_marketplace_menu(lang):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(translate("marketplace_view_products", lang), callback_data='marketplace_view_products')],
+        [InlineKeyboardButton(translate("marketplace_add_product", lang), callback_data='marketplace_add_product_start')],
+        [InlineKeyboardButton(translate("marketplace_my_products", lang), callback_data='marketplace_my_products')], # Eigene Produkte verwalten
+        [InlineKeyboardButton(translate("back_to_main", lang), callback_data='back_to_main_menu')]
+    ])
+
 async def get_marketplace_menu_keyboard(context):
-    keyboard = [
-        [InlineKeyboardButton(await T("marketplace_view_products", context), callback_data='marketplace_view_products')],
-        [InlineKeyboardButton(await T("marketplace_add_product", context), callback_data='marketplace_add_product_start')],
-        [InlineKeyboardButton(await T("marketplace_my_products", context), callback_data='marketplace_my_products')], # Eigene Produkte verwalten
-        [InlineKeyboardButton(await T("back_to_main", context), callback_data='back_to_main_menu')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return KEYBOARDS.get('marketplace_menu', resolve_language(context))
 
-async def get_marketplace_category_keyboard():
-    keyboard = [
+@KEYBOARDS.register('marketplace_category')
+@_not_localized
+def _build_marketplace_category(lang=None):
+    return InlineKeyboardMarkup([
         [InlineKeyboardButton("General", callback_data='category_General')],
         [InlineKeyboardButton("E-Books", callback_data='category_EBooks')],
         [InlineKeyboardButton("Software", callback_data='category_Software')],
@@ -123,11 +241,15 @@ async def get_marketplace_category_keyboard():
         [InlineKeyboardButton("Music", callback_data='category_Music')],
         [InlineKeyboardButton("Other", callback_data='category_Other')],
         [InlineKeyboardButton("Cancel", callback_data='cancel_action')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    ])
 
-async def get_marketplace_filter_keyboard():
-    keyboard = [
+async def get_marketplace_category_keyboard():
+    return KEYBOARDS.get('marketplace_category')
+
+@KEYBOARDS.register('marketplace_filter')
+@_not_localized
+def _build_marketplace_filter(lang=None):
+    return InlineKeyboardMarkup([
         [InlineKeyboardButton("All", callback_data='filter_category_All')],
         [InlineKeyboardButton("General", callback_data='filter_category_General')],
         [InlineKeyboardButton("E-Books", callback_data='filter_category_EBooks')],
@@ -136,20 +258,35 @@ async def get_marketplace_filter_keyboard():
         [InlineKeyboardButton("Music", callback_data='filter_category_Music')],
         [InlineKeyboardButton("Other", callback_data='filter_category_Other')],
         [InlineKeyboardButton("Back", callback_data='marketplace_menu')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    ])
 
-# Dieses Keyboard könnte verwendet werden, um ein spezifisches Produkt anzuzeigen
-# Wird aber dynamisch im Handler generiert.
-async def get_product_keyboard(context, product_id, is_seller=False, price=0.0, currency="SCAMCOIN"):
-    if is_seller:
-        return InlineKeyboardMarkup([
-            [InlineKeyboardButton(await T("marketplace_your_product", context), callback_data='ignore')], # Placeholder
-            [InlineKeyboardButton(await T("back_to_products", context), callback_data='marketplace_view_products')]
-        ])
-    else:
+async def get_marketplace_filter_keyboard():
+    return KEYBOARDS.get('marketplace_filter')
+
+# Produkt-Keyboards: Die Verkäufer-Variante ist statisch, die Käufer-Variante ein
+# Template, in das nur noch Produkt-ID, Preis und Währung eingesetzt werden.
+
+@KEYBOARDS.register('product_seller')
+def _build_product_seller(lang):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(translate("marketplace_your_product", lang), callback_data='ignore')], # Placeholder
+        [InlineKeyboardButton(translate("back_to_products", lang), callback_data='marketplace_view_products')]
+    ])
+
+@KEYBOARDS.register_template('product_buyer')
+def _build_product_buyer_template(lang):
+    buy_label = translate("marketplace_buy_button", lang) # Rohes Template mit {price} und {currency}
+    back_row = [InlineKeyboardButton(translate("back_to_products", lang), callback_data='marketplace_view_products')]
+
+    def render(product_id, price, currency):
         return InlineKeyboardMarkup([
-            [InlineKeyboardButton(await T("marketplace_buy_button", context, price=price, currency=currency), callback_data=f"buy_product_confirm_{product_id}")],
-            [InlineKeyboardButton(await T("back_to_products", context), callback_data='marketplace_view_products')]
+            [InlineKeyboardButton(buy_label.format(price=price, currency=currency), callback_data=f"buy_product_confirm_{product_id}")],
+            back_row
         ])
+    return render
 
+async def get_product_keyboard(context, product_id, is_seller=False, price=0.0, currency="SCAMCOIN"):
+    lang = resolve_language(context)
+    if is_seller:
+        return KEYBOARDS.get('product_seller', lang)
+    return KEYBOARDS.render('product_buyer', lang, product_id=product_id, price=price, currency=currency)
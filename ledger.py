@@ -0,0 +1,70 @@
+import logging
+from db_pool import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# DOPPELTE BUCHFÜHRUNG FÜR SCAMCOIN
+# =================================================================================
+# Jede Bewegung von SCAMCOIN ist eine Buchung in ledger_transactions mit
+# mindestens zwei Zeilen in ledger_entries, die sich zu null summieren. Das
+# Journal ist die Quelle der Wahrheit, users.internal_balance wird in derselben
+# Transaktion fortgeschrieben und lässt sich jederzeit aus Snapshot + neueren
+# Einträgen nachrechnen. Beträge in Mikro-SCAMCOIN (siehe money.py).
+
+FEES_ACCOUNT = 'system:fees' # Gebühren bis zur Abrechnung an den Owner
+EXTERNAL_ACCOUNT = 'system:external' # Ein- und Auszahlungen, Korrekturen
+BONUS_ACCOUNT = 'system:bonus' # Startguthaben neuer Nutzer
+OPENING_ACCOUNT = 'system:opening' # Eröffnungsbuchung der Migration
+
+
+def user_account(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def post_entries(cursor, kind: str, legs: list, reference: str = None) -> int:
+    """Schreibt eine ausgeglichene Buchung in der laufenden Transaktion des Aufrufers.
+
+    legs ist eine Liste von (account, amount). Wirft ValueError, wenn die Summe nicht null ist.
+    """
+    legs = [(account, amount) for account, amount in legs if amount != 0]
+    if sum(amount for _, amount in legs) != 0:
+        raise ValueError(f"Unausgeglichene Buchung {kind}: {legs}")
+    cursor.execute('INSERT INTO ledger_transactions (kind, reference) VALUES (?, ?)', (kind, reference))
+    ledger_transaction_id = cursor.lastrowid
+    cursor.executemany('INSERT INTO ledger_entries (ledger_transaction_id, account, amount) VALUES (?, ?, ?)',
+                       [(ledger_transaction_id, account, amount) for account, amount in legs])
+    return ledger_transaction_id
+
+
+def account_balance(account: str) -> int:
+    """Saldo eines Kontos aus dem letzten Snapshot plus den Einträgen danach."""
+    with connection() as conn:
+        return conn.execute('''
+            SELECT COALESCE(s.balance, 0) + COALESCE((SELECT SUM(e.amount) FROM ledger_entries e
+                                                     WHERE e.account = :account AND e.id > COALESCE(s.last_entry_id, 0)), 0)
+            FROM (SELECT :account AS account) a
+            LEFT JOIN balance_snapshots s ON s.account = a.account
+        ''', {'account': account}).fetchone()[0]
+
+
+def snapshot_balances() -> int:
+    """Schreibt die Snapshots aller Konten mit neuen Einträgen fort, gibt die Anzahl der Konten zurück.
+
+    Liest pro Konto nur die Einträge seit dessen letztem Snapshot.
+    """
+    with transaction(immediate=True) as conn:
+        cursor = conn.execute('''
+            INSERT INTO balance_snapshots (account, last_entry_id, balance, taken_at)
+            SELECT e.account, MAX(e.id), COALESCE(s.balance, 0) + SUM(e.amount), CURRENT_TIMESTAMP
+            FROM ledger_entries e
+            LEFT JOIN balance_snapshots s ON s.account = e.account
+            WHERE e.id > COALESCE(s.last_entry_id, 0)
+            GROUP BY e.account
+            ON CONFLICT (account) DO UPDATE SET
+                last_entry_id = excluded.last_entry_id,
+                balance = excluded.balance,
+                taken_at = excluded.taken_at
+        ''')
+        return cursor.rowcount
+
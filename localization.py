@@ -2,6 +2,14 @@
 # 2. LOKALISIERUNG & TEXTE
 # =================================================================================
 
+import time
+import logging
+import threading
+from string import Formatter
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
 LOCALIZATION_DATA = {
     "en": {
         "welcome": "Welcome {name}! How can I help you today?",
@@ -213,26 +221,196 @@ LOCALIZATION_DATA = {
     }
 }
 
-async def T(key: str, context: object, **kwargs) -> str:
-    user_id = context.effective_user.id if hasattr(context, 'effective_user') else None
-    
-    # Versuche, die Sprache aus user_data zu holen, da sie dort für die aktuelle Session gespeichert wird
-    lang = context.user_data.get('lang')
-    
-    # Wenn nicht in user_data, versuche aus der Datenbank zu laden
-    if not lang and user_id:
+# =================================================================================
+# KOMPILIERTER KATALOG
+# =================================================================================
+# LOCALIZATION_DATA wird beim Import einmal in eine flache Tabelle (Sprache, Key)
+# übersetzt. Der Fallback auf Englisch ist dabei schon aufgelöst, und die Platzhalter
+# jedes Templates sind vorab bekannt: Texte ohne Platzhalter werden nie formatiert.
+
+CATALOG_FALLBACK_LANGUAGE = 'en'
+
+class CatalogEntry:
+    __slots__ = ('text', 'fields', 'format')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.fields = frozenset(name for _, name, _, _ in _FORMATTER.parse(text) if name is not None)
+        # None = nichts zu ersetzen, der Text wird unverändert geliefert. Ein eigener,
+        # vorab zerlegter Renderer war im Benchmark nicht schneller als str.format.
+        self.format = text.format if self.fields else None
+
+class CompiledCatalog:
+    """Flacher, vorberechneter Lokalisierungskatalog mit O(1)-Lookup."""
+
+    def __init__(self, data: dict, fallback: str = CATALOG_FALLBACK_LANGUAGE):
+        self.fallback = fallback
+        self._tables = {}
+        keys = set()
+        for texts in data.values():
+            keys.update(texts)
+        for lang, texts in data.items():
+            table = {}
+            for key in keys:
+                text = texts.get(key, data[fallback].get(key))
+                if text is not None:
+                    table[key] = CatalogEntry(text)
+            self._tables[lang] = table
+        self._default = self._tables[fallback]
+        self.issues = self._validate(data)
+
+    def _validate(self, data: dict) -> list:
+        """Prüft, dass jeder Key in allen Sprachen existiert und dieselben Platzhalter nutzt."""
+        issues = []
+        reference = data[self.fallback]
+        for lang, texts in data.items():
+            if lang == self.fallback:
+                continue
+            for key in reference.keys() - texts.keys():
+                issues.append(f"{lang}: Key '{key}' fehlt (Fallback auf {self.fallback})")
+            for key in texts.keys() - reference.keys():
+                issues.append(f"{lang}: Key '{key}' fehlt in {self.fallback}")
+            for key in texts.keys() & reference.keys():
+                expected = self._default[key].fields
+                actual = self._tables[lang][key].fields
+                if expected != actual:
+                    issues.append(f"{lang}: Platzhalter für '{key}' weichen ab: {sorted(actual)} statt {sorted(expected)}")
+        return issues
+
+    def entry(self, lang: str, key: str):
+        return self._tables.get(lang, self._default).get(key)
+
+    def get(self, lang: str, key: str) -> str:
+        """Liefert das rohe Template (ohne Platzhalter-Ersetzung)."""
+        entry = self._tables.get(lang, self._default).get(key)
+        return entry.text if entry is not None else f"UNKNOWN_TEXT_KEY_{key}"
+
+    def render(self, lang: str, key: str, **kwargs) -> str:
+        entry = self._tables.get(lang, self._default).get(key)
+        if entry is None:
+            return f"UNKNOWN_TEXT_KEY_{key}"
+        # Ersetze Platzhalter
+        if kwargs and entry.format is not None:
+            return entry.format(**kwargs)
+        return entry.text
+
+_FORMATTER = Formatter()
+
+def compile_catalog() -> CompiledCatalog:
+    """(Neu-)Kompiliert den Katalog, z.B. nachdem LOCALIZATION_DATA erweitert wurde."""
+    global CATALOG
+    CATALOG = CompiledCatalog(LOCALIZATION_DATA)
+    for issue in CATALOG.issues:
+        logger.warning(f"Lokalisierung: {issue}")
+    return CATALOG
+
+CATALOG = compile_catalog()
+
+# =================================================================================
+# SPRACH-CACHE PRO NUTZER
+# =================================================================================
+# T() liest die Sprache nur aus user_data. Ist sie dort noch nicht gesetzt (z.B.
+# nach einem Neustart), lädt load_user_language sie vor jedem Update einmal über
+# diesen Cache, statt dass jeder T()-Aufruf eine eigene Datenbankabfrage auslöst.
+
+LANGUAGE_CACHE_MAX_SIZE = 10000 # Anzahl der Nutzer im LRU-Cache
+LANGUAGE_CACHE_TTL_SECONDS = 600 # Nach 10 Minuten wird die Sprache neu aus der DB gelesen
+
+class LanguageCache:
+    """LRU-Cache mit TTL für die Sprache je Nutzer-ID, inkl. Hit/Miss-Zähler."""
+
+    def __init__(self, max_size: int = LANGUAGE_CACHE_MAX_SIZE, ttl: float = LANGUAGE_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, user_id: int, lang: str):
+        with self._lock:
+            self._entries[user_id] = (lang, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+LANGUAGE_CACHE = LanguageCache()
+
+def get_user_language(user_id: int) -> str:
+    """Liefert die Sprache eines Nutzers, aus dem Cache oder (einmalig) aus der Datenbank."""
+    lang = LANGUAGE_CACHE.get(user_id)
+    if lang is None:
         from database import get_user_language_from_db # Importiere hier, um Zirkelabhängigkeit zu vermeiden
         lang = get_user_language_from_db(user_id)
+        LANGUAGE_CACHE.set(user_id, lang)
+    return lang
+
+def invalidate_user_language(user_id: int):
+    """Entfernt die gecachte Sprache, z.B. nachdem set_user_language sie geändert hat."""
+    LANGUAGE_CACHE.invalidate(user_id)
+
+def get_language_cache_stats() -> dict:
+    return LANGUAGE_CACHE.stats()
+
+async def load_user_language(update: object, context: object):
+    """Lädt die gespeicherte Sprache des Absenders nach user_data, bevor ein Handler läuft.
+
+    Wird in main.py als TypeHandler in Gruppe -1 registriert. Die Nutzer-ID kommt aus
+    dem Update, die Datenbankabfrage läuft auf den DB-Workern und nur bei einem Cache-Miss.
+    """
+    user = getattr(update, 'effective_user', None)
+    if user is None or context.user_data is None or context.user_data.get('lang'):
+        return
+    lang = LANGUAGE_CACHE.get(user.id)
+    if lang is None:
+        from async_db import db # Importiere hier, um Zirkelabhängigkeit zu vermeiden
+        from database import get_user_language_from_db
+        lang = await db.run(get_user_language_from_db, user.id)
+        LANGUAGE_CACHE.set(user.id, lang)
+    if lang:
+        context.user_data['lang'] = lang
+
+def resolve_language(context: object) -> str:
+    """Ermittelt die Sprache für den Kontext aus user_data, sonst Englisch. Fragt nie die DB ab."""
+    lang = context.user_data.get('lang')
 
     # Fallback auf Englisch, falls keine Sprache gefunden wird
     if lang not in LOCALIZATION_DATA:
         lang = 'en'
+    return lang
 
-    text = LOCALIZATION_DATA[lang].get(key, LOCALIZATION_DATA['en'].get(key, f"UNKNOWN_TEXT_KEY_{key}"))
-
-    # Ersetze Platzhalter
-    if kwargs:
-        text = text.format(**kwargs)
-    
-    return text
+def translate(key: str, lang: str, **kwargs) -> str:
+    """Synchrones Gegenstück zu T() für eine bereits bekannte Sprache."""
+    return CATALOG.render(lang, key, **kwargs)
 
+async def T(key: str, context: object, **kwargs) -> str:
+    return translate(key, resolve_language(context), **kwargs)
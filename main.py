@@ -23,7 +23,9 @@ from telegram.ext import (
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
     ConversationHandler,
+    TypeHandler,
     ContextTypes,
     filters,
 )
@@ -31,19 +33,27 @@ from telegram.constants import ParseMode
 from telegram.error import TelegramError
 
 # Imports der modularen Dateien
-from localization import T # Korrektur: get_lang entfernt
+from localization import T, get_user_language, load_user_language # Korrektur: get_lang entfernt
 from database import (
-    init_db, add_user_to_db, set_user_language, get_user_language_from_db,
+    init_db, add_user_to_db, set_user_language,
     add_feedback, get_feedback, get_user_stats, get_all_user_ids,
     add_user_wallet, get_user_wallets, remove_user_wallet,
     add_user_pool, get_user_pools, remove_user_pool,
     mark_news_item_as_sent, check_if_news_item_sent,
     # NEU: Marktplatz-Funktionen aus der Datenbank
     add_product, get_all_active_products, get_product_by_id,
-    process_transaction, get_user_products,
+    process_transaction, get_user_products, delete_product,
     # NEU: Wallet-Balance für internes System
     get_user_internal_balance, update_user_internal_balance
 )
+from async_db import db
+from storage_config import configure_storage, schedule_storage_jobs
+from money import apply_rate, format_amount, from_micros, parse_amount
+from idempotency import idempotency_key, claim_idempotency_key, release_idempotency_key
+from http_client import start_http_client, close_http_client
+from outbox import outbox, start_outbox, stop_outbox, OutboxRateLimiter, TRANSACTIONAL
+from wallet_balances import stream_wallet_balances
+from rate_limit import ThrottledEditor
 from keyboards import (
     get_main_menu_keyboard, get_geld_verdienen_menu_keyboard,
     get_krypto_swap_menu_keyboard, get_bilder_verkaufen_menu_keyboard,
@@ -51,18 +61,20 @@ from keyboards import (
     get_personal_area_menu_keyboard, get_my_wallets_menu_keyboard,
     get_my_pools_menu_keyboard, get_admin_menu_keyboard,
     # NEU: Marktplatz-Keyboards
-    get_marketplace_menu_keyboard
+    get_marketplace_menu_keyboard, warm_up_keyboards
 )
 from news_service import (
-    check_and_post_news, NEWS_CHECK_INTERVAL_SECONDS,
+    check_and_post_news, post_xrdoge_price, NEWS_CHECK_INTERVAL_SECONDS,
     NEWS_FEED_URL, NEWS_MAX_TO_POST_PER_CHECK
 )
+from feed_scheduler import NEWS_SCHEDULER_TICK_SECONDS
+from job_checkpoints import job_checkpoints, JOB_SKIPPED
 
 # Import der API-Service-Funktionen
 from services import (
     fetch_ethermine_stats, get_exchange_rate,
     fetch_crypto_prices_coingecko, get_single_crypto_price,
-    get_weather_info, fetch_wallet_balance_blockchair,
+    get_weather_info,
     fetch_xrpl_account_info,
     fetch_publicpool_btc_stats,
     fetch_viabtc_btc_stats,
@@ -153,7 +165,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     try:
         add_user_to_db(user.id, user.username, user.first_name, user.last_name) 
-        lang = get_user_language_from_db(user.id)
+        lang = get_user_language(user.id)
         context.user_data['lang'] = lang
         await update.message.reply_text(
             await T("welcome", context, name=user.first_name),
@@ -231,7 +243,7 @@ async def feedback_message_handler(update: Update, context: ContextTypes.DEFAULT
         await update.message.reply_text(await T("feedback_thanks", context))
         admin_notification = await T("admin_feedback_notification", context, user=user.full_name, text=feedback_text)
         try:
-            await context.bot.send_message(chat_id=ADMIN_USER_ID, text=admin_notification, parse_mode=ParseMode.MARKDOWN)
+            await outbox.send_message(ADMIN_USER_ID, admin_notification, TRANSACTIONAL, parse_mode=ParseMode.MARKDOWN)
         except Exception as e:
             logger.error(f"Could not send feedback notification to admin: {e}")
     except Exception as e:
@@ -482,16 +494,16 @@ async def view_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
     p_id, seller_id, name, description, price, currency, file_path, status = product
     
     # Gebühr berechnen und anzeigen
-    fee_amount = price * MARKETPLACE_FEE_PERCENTAGE
+    fee_amount = apply_rate(price, MARKETPLACE_FEE_PERCENTAGE)
     total_price = price + fee_amount
     
     product_text = (
         f"**{name}**\n\n"
         f"**{await T("marketplace_description", context)}:** {description}\n"
-        f"**{await T("marketplace_price", context)}:** {price:.2f} {currency}\n"
+        f"**{await T("marketplace_price", context)}:** {format_amount(price)} {currency}\n"
         f"**Category:** {product[7] if len(product) > 7 else 'General'}\n"
-        f"**{await T("marketplace_fee", context)}:** {fee_amount:.2f} {currency} (1%)\n"
-        f"**{await T("marketplace_total_price", context)}:** {total_price:.2f} {currency}\n\n"
+        f"**{await T("marketplace_fee", context)}:** {format_amount(fee_amount)} {currency} (1%)\n"
+        f"**{await T("marketplace_total_price", context)}:** {format_amount(total_price)} {currency}\n\n"
         f"**{await T("marketplace_seller", context)}:** <a href='tg://user?id={seller_id}'>Nutzer {seller_id}</a>\n" # Link zum Verkäuferprofil
     )
 
@@ -503,7 +515,7 @@ async def view_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ])
     else:
         keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton(await T("marketplace_buy_button", context, price=total_price, currency=currency), callback_data=f"buy_product_confirm_{p_id}")],
+            [InlineKeyboardButton(await T("marketplace_buy_button", context, price=from_micros(total_price), currency=currency), callback_data=f"buy_product_confirm_{p_id}")],
             [InlineKeyboardButton(await T("back_to_products", context), callback_data='list_products')]
         ])
     
@@ -530,11 +542,11 @@ async def confirm_buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     buyer_id = query.from_user.id
     buyer_balance = get_user_internal_balance(buyer_id)
-    fee_amount = price * MARKETPLACE_FEE_PERCENTAGE
+    fee_amount = apply_rate(price, MARKETPLACE_FEE_PERCENTAGE)
     total_price = price + fee_amount
     
     if buyer_balance < total_price:
-        await query.edit_message_text(await T("marketplace_insufficient_funds", context, balance=buyer_balance, needed=total_price), reply_markup=await get_marketplace_menu_keyboard(context))
+        await query.edit_message_text(await T("marketplace_insufficient_funds", context, balance=from_micros(buyer_balance), needed=from_micros(total_price)), reply_markup=await get_marketplace_menu_keyboard(context))
         return ConversationHandler.END
 
     # Transaktion durchführen und Balances aktualisieren
@@ -552,9 +564,9 @@ async def confirm_buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Annahme: file_path ist ein String, der direkt gesendet werden kann (z.B. eine Telegram file_id)
             # Oder du musst die Datei aus dem Dateisystem laden und senden
             await context.bot.send_document(chat_id=buyer_id, document=file_path, caption=await T("marketplace_your_purchase", context, name=name))
-            await query.edit_message_text(await T("marketplace_purchase_success", context, name=name, price=total_price, currency=currency), reply_markup=await get_marketplace_menu_keyboard(context))
+            await query.edit_message_text(await T("marketplace_purchase_success", context, name=name, price=from_micros(total_price), currency=currency), reply_markup=await get_marketplace_menu_keyboard(context))
             # Benachrichtige den Verkäufer
-            await context.bot.send_message(chat_id=seller_id, text=await T("marketplace_seller_notification", context, name=name, price=price * (1 - MARKETPLACE_FEE_PERCENTAGE), currency=currency), parse_mode=ParseMode.MARKDOWN)
+            await context.bot.send_message(chat_id=seller_id, text=await T("marketplace_seller_notification", context, name=name, price=from_micros(price - fee_amount), currency=currency), parse_mode=ParseMode.MARKDOWN)
         except Exception as e:
             logger.error(f"Error sending product file to user {buyer_id}: {e}")
             await query.edit_message_text(await T("marketplace_purchase_success_no_delivery", context, name=name), reply_markup=await get_marketplace_menu_keyboard(context))
@@ -598,7 +610,7 @@ async def add_product_description(update: Update, context: ContextTypes.DEFAULT_
 
 async def add_product_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        price = float(update.message.text.replace(',', '.'))
+        price = parse_amount(update.message.text)
         if price <= 0:
             raise ValueError
         context.user_data['marketplace_product_price'] = price
@@ -634,7 +646,7 @@ async def add_product_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"**{await T("marketplace_preview_title", context)}**\n\n"
         f"**{await T("marketplace_product_name", context)}:** {name}\n"
         f"**{await T("marketplace_description", context)}:** {description}\n"
-        f"**{await T("marketplace_price", context)}:** {price:.2f} {currency}\n"
+        f"**{await T("marketplace_price", context)}:** {format_amount(price)} {currency}\n"
         f"**{await T("marketplace_file", context)}:** {file_name}\n"
         f"**Category:** {category}\n\n"
         f"{await T("marketplace_confirm_add_prompt", context)}"
@@ -681,7 +693,7 @@ async def my_selling_products(update: Update, context: ContextTypes.DEFAULT_TYPE
     text = await T("marketplace_your_products_title", context) + "\n\n"
     keyboard_buttons = []
     for p_id, seller_id, name, description, price, currency, file_path, status in user_products:
-        text += f"▪️ **{name}** ({price:.2f} {currency}) - Status: {status}\n"
+        text += f"▪️ **{name}** ({format_amount(price)} {currency}) - Status: {status}\n"
         keyboard_buttons.append([InlineKeyboardButton(f"Löschen {name}", callback_data=f"delete_product_{p_id}")])
     
     keyboard_buttons.append([InlineKeyboardButton(await T("back_to_main", context), callback_data="marketplace_menu")])
@@ -701,19 +713,11 @@ async def delete_product_handler(update: Update, context: ContextTypes.DEFAULT_T
         return ConversationHandler.END
 
     # Mark product as deleted
-    conn = None
     try:
-        import sqlite3
-        conn = sqlite3.connect('scamlingbot.db')
-        cursor = conn.cursor()
-        cursor.execute('UPDATE products SET status = "deleted" WHERE id = ?', (product_id,))
-        conn.commit()
+        delete_product(product_id, user_id)
     except Exception as e:
         await query.edit_message_text(f"❌ Fehler beim Löschen des Produkts: {e}", reply_markup=await get_marketplace_menu_keyboard(context))
         return ConversationHandler.END
-    finally:
-        if conn:
-            conn.close()
 
     await query.edit_message_text("✅ Produkt wurde gelöscht.", reply_markup=await get_marketplace_menu_keyboard(context))
     return ConversationHandler.END
@@ -733,9 +737,13 @@ async def internal_wallet_deposit_start(update: Update, context: ContextTypes.DE
 
 async def internal_wallet_deposit_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        amount = float(update.message.text.replace(',', '.'))
+        amount = parse_amount(update.message.text)
         if amount <= 0:
             raise ValueError
+        # Erneut zugestellte Nachricht: die Einzahlung ist schon gebucht oder läuft gerade
+        key = idempotency_key(update, 'deposit')
+        if await db.run(claim_idempotency_key, key) is not None:
+            return ConversationHandler.END
         
         user_id = update.effective_user.id
         # Simulation der Krypto-Einzahlung (in services.py)
@@ -743,11 +751,11 @@ async def internal_wallet_deposit_amount(update: Update, context: ContextTypes.D
         # und dann die interne Balance aktualisieren.
         deposit_successful = await simulate_crypto_deposit(user_id, amount) 
         
-        if deposit_successful:
-            update_user_internal_balance(user_id, amount)
-            current_balance = get_user_internal_balance(user_id)
-            await update.message.reply_text(await T("internal_wallet_deposit_success", context, amount=amount, balance=current_balance), reply_markup=await get_personal_area_menu_keyboard(context))
+        if deposit_successful and await db.run(update_user_internal_balance, user_id, amount, 'deposit', "Einzahlung", idempotency_key=key):
+            current_balance = await db.run(get_user_internal_balance, user_id)
+            await update.message.reply_text(await T("internal_wallet_deposit_success", context, amount=from_micros(amount), balance=from_micros(current_balance)), reply_markup=await get_personal_area_menu_keyboard(context))
         else:
+            await db.run(release_idempotency_key, key)
             await update.message.reply_text(await T("internal_wallet_deposit_failed", context), reply_markup=await get_personal_area_menu_keyboard(context))
     except ValueError:
         await update.message.reply_text(await T("internal_wallet_invalid_amount", context))
@@ -758,16 +766,21 @@ async def internal_wallet_withdraw_start(update: Update, context: ContextTypes.D
     query = update.callback_query
     await query.answer()
     current_balance = get_user_internal_balance(query.from_user.id)
-    await query.edit_message_text(await T("internal_wallet_withdraw_prompt", context, balance=current_balance))
+    await query.edit_message_text(await T("internal_wallet_withdraw_prompt", context, balance=from_micros(current_balance)))
     return States.INTERNAL_WALLET_WITHDRAW_AMOUNT
 
 async def internal_wallet_withdraw_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        amount = float(update.message.text.replace(',', '.'))
+        amount = parse_amount(update.message.text)
+        # Erneut zugestellte Nachricht: die Auszahlung ist schon gebucht oder läuft gerade
+        key = idempotency_key(update, 'withdrawal')
+        if await db.run(claim_idempotency_key, key) is not None:
+            return ConversationHandler.END
         user_id = update.effective_user.id
-        current_balance = get_user_internal_balance(user_id)
+        current_balance = await db.run(get_user_internal_balance, user_id)
 
         if amount <= 0 or amount > current_balance:
+            await db.run(release_idempotency_key, key)
             await update.message.reply_text(await T("internal_wallet_invalid_withdraw_amount", context))
             return States.INTERNAL_WALLET_WITHDRAW_AMOUNT # Bleibe im Zustand
         
@@ -776,11 +789,12 @@ async def internal_wallet_withdraw_amount(update: Update, context: ContextTypes.
         # simulate_crypto_withdrawal würde die eigentliche Krypto-Transaktion initiieren.
         withdrawal_successful = await simulate_crypto_withdrawal(user_id, amount)
 
-        if withdrawal_successful:
-            update_user_internal_balance(user_id, -amount)
-            current_balance_after_withdraw = get_user_internal_balance(user_id)
-            await update.message.reply_text(await T("internal_wallet_withdraw_success", context, amount=amount, balance=current_balance_after_withdraw), reply_markup=await get_personal_area_menu_keyboard(context))
+        # Der Abzug ist selbst gegen Überziehung abgesichert, falls parallel etwas gebucht wurde
+        if withdrawal_successful and await db.run(update_user_internal_balance, user_id, -amount, 'withdrawal', "Auszahlung", idempotency_key=key):
+            current_balance_after_withdraw = await db.run(get_user_internal_balance, user_id)
+            await update.message.reply_text(await T("internal_wallet_withdraw_success", context, amount=from_micros(amount), balance=from_micros(current_balance_after_withdraw)), reply_markup=await get_personal_area_menu_keyboard(context))
         else:
+            await db.run(release_idempotency_key, key)
             await update.message.reply_text(await T("internal_wallet_withdraw_failed", context), reply_markup=await get_personal_area_menu_keyboard(context))
 
     except ValueError:
@@ -796,7 +810,7 @@ async def my_wallets_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     internal_balance = get_user_internal_balance(query.from_user.id) # Hole interne Balance
     
     text = await T("my_wallets_title", context) + "\n\n"
-    text += f"▪️ **{await T("internal_balance_label", context)}:** `{internal_balance:.2f} SCAMCOIN`\n" # Zeige interne Balance
+    text += f"▪️ **{await T("internal_balance_label", context)}:** `{format_amount(internal_balance)} SCAMCOIN`\n" # Zeige interne Balance
     
     if wallets:
         text += "\n" + await T("external_wallets_label", context) + "\n"
@@ -850,17 +864,26 @@ async def remove_wallet_select_handler(update: Update, context: ContextTypes.DEF
 async def check_balances(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.edit_message_text(" Lade Guthaben...", reply_markup=await get_my_wallets_menu_keyboard(context)) # Kontext an Keyboard übergeben
-    wallets = get_user_wallets(query.from_user.id)
+    wallets = await db.get_user_wallets(query.from_user.id)
     if not wallets:
         await query.edit_message_text("Keine Wallets hinterlegt.", reply_markup=await get_my_wallets_menu_keyboard(context)) # Kontext an Keyboard übergeben
         return
 
-    report = "**Guthaben-Übersicht (Externe Wallets):**\n\n"
-    for _, currency, address in wallets:
-        # Hier verwenden wir die neue Funktion aus services.py
-        balance_text = await fetch_wallet_balance_blockchair(currency, address)
-        report += f"▪️ **{currency}** `{address[:8]}...`:\n  {balance_text}\n"
-    await query.edit_message_text(report, parse_mode=ParseMode.MARKDOWN, reply_markup=await get_my_wallets_menu_keyboard(context)) # Kontext an Keyboard übergeben
+    # Alle Wallets gleichzeitig abfragen, jedes Ergebnis erscheint sofort (gedrosselt) in der Nachricht
+    keyboard = await get_my_wallets_menu_keyboard(context) # Kontext an Keyboard übergeben
+    balances = ["⏳ wird geladen..."] * len(wallets)
+
+    def render() -> str:
+        report = "**Guthaben-Übersicht (Externe Wallets):**\n\n"
+        for (_, currency, address), balance_text in zip(wallets, balances):
+            report += f"▪️ **{currency}** `{address[:8]}...`:\n  {balance_text}\n"
+        return report
+
+    editor = ThrottledEditor(lambda text: query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=keyboard))
+    async for index, balance_text in stream_wallet_balances(wallets):
+        balances[index] = balance_text
+        await editor.update(render())
+    await editor.update(render(), final=True)
 
 async def my_pools_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -1059,7 +1082,10 @@ async def admin_read_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 async def admin_check_news_manual(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.edit_message_text(" Starte manuelle News-Prüfung...", reply_markup=get_admin_menu_keyboard())
-    await check_and_post_news(context)
+    # Alle Feeds, unabhängig vom Zeitplan
+    if await check_and_post_news(context, force=True) is JOB_SKIPPED:
+        await update.callback_query.edit_message_text("News-Prüfung übersprungen: sie läuft gerade bereits.", reply_markup=get_admin_menu_keyboard())
+        return
     await update.callback_query.edit_message_text("Manuelle News-Prüfung abgeschlossen.", reply_markup=get_admin_menu_keyboard())
 
 async def broadcast_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1272,6 +1298,14 @@ async def show_wip(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # 7. HAUPTFUNKTION ZUM STARTEN DES BOTS
 # =================================================================================
 
+async def post_init(application: Application):
+    await start_http_client(application)
+    await start_outbox(application)
+
+async def post_shutdown(application: Application):
+    await stop_outbox(application)
+    await close_http_client(application)
+
 def main():
     """
     Startet den Bot und registriert jeden Handler explizit, um die
@@ -1281,8 +1315,13 @@ def main():
         logger.critical("BOT_TOKEN ist nicht gesetzt. Der Bot kann nicht starten.")
         return
 
+    configure_storage() # WAL-Modus und PRAGMAs für alle Pool-Verbindungen
     init_db() # Stellt sicher, dass alle Tabellen (auch neue) initialisiert werden
-    application = Application.builder().token(BOT_TOKEN).build()
+    warm_up_keyboards() # Baut die statischen Keyboards für alle Sprachen vorab
+    # Der gemeinsame HTTP-Client und die Sende-Queue leben so lange wie die Application
+    # Handler-Antworten laufen als interaktiv durch die Sende-Queue, siehe outbox.py
+    application = (Application.builder().token(BOT_TOKEN).rate_limiter(OutboxRateLimiter(outbox))
+                   .post_init(post_init).post_shutdown(post_shutdown).build())
 
     # Import handlers from modular files
     from admin import (
@@ -1293,13 +1332,18 @@ def main():
     from wallet import (
         my_wallets_menu, add_wallet_start, add_wallet_currency_handler,
         add_wallet_address_handler, remove_wallet_start, remove_wallet_select_handler,
-        wallet_transaction_history
+        wallet_transaction_history, internal_transfer_start, internal_transfer_receiver_handler,
+        internal_transfer_amount_handler, reconcile_balances_job, RECONCILIATION_INTERVAL_SECONDS,
+        snapshot_balances_job, LEDGER_SNAPSHOT_INTERVAL_SECONDS, purge_idempotency_keys_job
     )
+    from broadcast import resume_broadcasts_job
     from marketplace import (
-        marketplace_menu_view, marketplace_filter_category_handler, list_products,
+        marketplace_menu_view, marketplace_filter_category_handler, list_products, list_products_page,
         view_product, confirm_buy, add_product_start, add_product_name,
         add_product_description, add_product_price, add_product_file,
-        add_product_confirm, my_selling_products, delete_product_handler
+        add_product_confirm, my_selling_products, delete_product_handler,
+        search_command, search_page, inline_search, settle_fees_job,
+        FEE_SETTLEMENT_INTERVAL_SECONDS
     )
     from tools import (
         weather_start, weather_location_handler,
@@ -1385,6 +1429,8 @@ def main():
         },
         fallbacks=[CommandHandler('cancel', cancel_command)]
     )
+    # Vor allen anderen Handlern: gespeicherte Sprache des Absenders nach user_data laden
+    application.add_handler(TypeHandler(Update, load_user_language), group=-1)
     application.add_handler(CommandHandler('analytics_dashboard', analytics_dashboard_handler))
     application.add_handler(CommandHandler('referral_leaderboard', referral_leaderboard_handler))
 
@@ -1526,6 +1572,10 @@ def main():
     # NEU: Marktplatz-Menüpunkte und Aktionen
     application.add_handler(CallbackQueryHandler(marketplace_menu_view, pattern='^menu_marketplace$')) # Haupteinstieg
     application.add_handler(CallbackQueryHandler(list_products, pattern='^marketplace_view_products$'))
+    application.add_handler(CallbackQueryHandler(list_products_page, pattern=r'^marketplace_page_(next|prev)_\d+$'))
+    application.add_handler(CommandHandler("search", search_command)) # Volltextsuche im Marktplatz
+    application.add_handler(CallbackQueryHandler(search_page, pattern=r'^marketplace_search_\d+$'))
+    application.add_handler(InlineQueryHandler(inline_search))
     application.add_handler(CallbackQueryHandler(my_selling_products, pattern='^marketplace_my_products$')) # Eigene Produkte anzeigen
     application.add_handler(CallbackQueryHandler(marketplace_menu_view, pattern='^marketplace_menu$')) # Rückkehr zum Marktplatz-Menü
 
@@ -1535,9 +1585,24 @@ def main():
     application.add_error_handler(error_handler)
 
     # --- Jobs & Start ---
-    application.job_queue.run_repeating(check_and_post_news, interval=NEWS_CHECK_INTERVAL_SECONDS)
+    application.job_queue.run_repeating(check_and_post_news, interval=NEWS_SCHEDULER_TICK_SECONDS) # Nur fällige Feeds, siehe feed_scheduler.py
+    application.job_queue.run_repeating(post_xrdoge_price, interval=NEWS_CHECK_INTERVAL_SECONDS)
     # Schedule daily summary at 8 AM every day
-    application.job_queue.run_daily(send_daily_summary, time=datetime.time(hour=8, minute=0, second=0))
+    # Alle Jobs laufen unter einer Lease (job_checkpoints.py), bei mehreren Instanzen führt nur eine sie aus.
+    # Das Mindestintervall verhindert, dass eine zweite Instanz denselben Lauf direkt danach wiederholt.
+    exclusive = job_checkpoints.exclusive
+    application.job_queue.run_daily(exclusive('daily_summary', min_interval_seconds=12 * 60 * 60)(send_daily_summary),
+                                    time=datetime.time(hour=8, minute=0, second=0))
+    schedule_storage_jobs(application.job_queue) # WAL-Checkpoint und PRAGMA optimize
+    application.job_queue.run_repeating(exclusive('fee_settlement', min_interval_seconds=FEE_SETTLEMENT_INTERVAL_SECONDS // 2)(settle_fees_job),
+                                        interval=FEE_SETTLEMENT_INTERVAL_SECONDS) # Gebühren-Journal -> Owner-Konto
+    application.job_queue.run_repeating(exclusive('balance_reconciliation', min_interval_seconds=RECONCILIATION_INTERVAL_SECONDS // 2)(reconcile_balances_job),
+                                        interval=RECONCILIATION_INTERVAL_SECONDS, first=60) # Guthaben gegen Journal abgleichen
+    application.job_queue.run_repeating(exclusive('ledger_snapshot', min_interval_seconds=LEDGER_SNAPSHOT_INTERVAL_SECONDS // 2)(snapshot_balances_job),
+                                        interval=LEDGER_SNAPSHOT_INTERVAL_SECONDS, first=LEDGER_SNAPSHOT_INTERVAL_SECONDS)
+    application.job_queue.run_repeating(exclusive('idempotency_purge', min_interval_seconds=30 * 60)(purge_idempotency_keys_job),
+                                        interval=60 * 60, first=60 * 60) # Abgelaufene Idempotenz-Schlüssel
+    application.job_queue.run_once(exclusive('broadcast_resume')(resume_broadcasts_job), when=10) # Unterbrochene Broadcasts fortsetzen
     logger.info("Bot startet Polling...")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
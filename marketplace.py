@@ -1,14 +1,14 @@
-import sqlite3
+import os
 import urllib.parse
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, CallbackQueryHandler, CommandHandler, filters
 from telegram.constants import ParseMode
 
-from database import (
-    add_product, get_all_active_products, get_product_by_id,
-    process_transaction, get_user_products
-)
+from async_db import db
+from money import apply_rate, format_amount, from_micros, parse_amount
+from idempotency import idempotency_key, claim_idempotency_key, release_idempotency_key
+from outbox import outbox, TRANSACTIONAL
 from keyboards import (
     get_marketplace_menu_keyboard, get_affiliate_links_menu_keyboard,
     get_bilder_verkaufen_menu_keyboard
@@ -16,6 +16,11 @@ from keyboards import (
 
 logger = logging.getLogger(__name__)
 
+MARKETPLACE_PAGE_SIZE = int(os.environ.get("MARKETPLACE_PAGE_SIZE", 10)) # Produkte pro Seite in der Marktplatz-Liste
+INLINE_SEARCH_PAGE_SIZE = 20 # Treffer pro Antwort im Inline-Modus (Telegram erlaubt max. 50)
+INLINE_SEARCH_CACHE_SECONDS = 30 # Wie lange Telegram Inline-Ergebnisse zwischenspeichert
+FEE_SETTLEMENT_INTERVAL_SECONDS = int(os.environ.get("FEE_SETTLEMENT_INTERVAL_SECONDS", 60)) # Wie oft Gebühren dem Owner gutgeschrieben werden
+
 # Conversation states should be imported from main.py or defined here if needed
 # For simplicity, assume they are imported from main.py
 from main import States
@@ -53,18 +58,7 @@ async def list_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         query = update.callback_query
         await query.answer()
-        category = context.user_data.get('marketplace_filter_category')
-        products = get_all_active_products(category)
-        if not products:
-            await query.edit_message_text("Keine Produkte gefunden.", reply_markup=await get_marketplace_menu_keyboard(context))
-            return
-        text = "Verfügbare Produkte:\n\n"
-        keyboard_buttons = []
-        for p_id, seller_id, name, description, price, currency, file_path, status in products:
-            text += f"▪️ {name} ({price:.2f} {currency})\n"
-            keyboard_buttons.append([InlineKeyboardButton(name, callback_data=f"view_product_{p_id}")])
-        keyboard_buttons.append([InlineKeyboardButton("Zurück", callback_data="marketplace_menu")])
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard_buttons))
+        await _render_products_page(query, context)
     except Exception as e:
         logger.error(f"Error in list_products: {e}")
         if update.callback_query:
@@ -75,7 +69,7 @@ async def view_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
         product_id = int(query.data.split('_')[-1])
-        product = get_product_by_id(product_id)
+        product = await db.get_product_by_id(product_id)
 
         if not product:
             await query.edit_message_text("Produkt nicht gefunden oder nicht verfügbar.", reply_markup=await get_marketplace_menu_keyboard(context))
@@ -83,15 +77,15 @@ async def view_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         p_id, seller_id, name, description, price, currency, file_path, status = product
 
-        fee_amount = price * 0.01
+        fee_amount = apply_rate(price, 0.01)
         total_price = price + fee_amount
 
         product_text = (
             f"**{name}**\n\n"
             f"Beschreibung: {description}\n"
-            f"Preis: {price:.2f} {currency}\n"
-            f"Gebühr: {fee_amount:.2f} {currency} (1%)\n"
-            f"Gesamtpreis: {total_price:.2f} {currency}\n\n"
+            f"Preis: {format_amount(price)} {currency}\n"
+            f"Gebühr: {format_amount(fee_amount)} {currency} (1%)\n"
+            f"Gesamtpreis: {format_amount(total_price)} {currency}\n\n"
             f"Verkäufer: Nutzer {seller_id}\n"
         )
 
@@ -102,7 +96,7 @@ async def view_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
             ])
         else:
             keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton(f"Kaufen für {total_price:.2f} {currency}", callback_data=f"buy_product_confirm_{p_id}")],
+                [InlineKeyboardButton(f"Kaufen für {format_amount(total_price)} {currency}", callback_data=f"buy_product_confirm_{p_id}")],
                 [InlineKeyboardButton("Zurück", callback_data='marketplace_view_products')]
             ])
 
@@ -114,50 +108,59 @@ async def view_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.callback_query.edit_message_text("Ein Fehler ist aufgetreten.", reply_markup=await get_marketplace_menu_keyboard(context))
 
 async def confirm_buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    key = None
     try:
         query = update.callback_query
         await query.answer()
+        # Doppelt getippt oder erneut zugestellt: das Ergebnis steht schon fest, nichts erneut senden
+        key = idempotency_key(update, 'buy')
+        if await db.run(claim_idempotency_key, key) is not None:
+            return ConversationHandler.END
         product_id = int(query.data.split('_')[-1])
 
-        product = get_product_by_id(product_id)
+        product = await db.get_product_by_id(product_id)
         if not product:
+            await db.run(release_idempotency_key, key)
             await query.edit_message_text("Produkt nicht gefunden oder nicht verfügbar.", reply_markup=await get_marketplace_menu_keyboard(context))
             return ConversationHandler.END
 
         p_id, seller_id, name, description, price, currency, file_path, status = product
 
         if query.from_user.id == seller_id:
+            await db.run(release_idempotency_key, key)
             await query.edit_message_text("Du kannst dein eigenes Produkt nicht kaufen.", reply_markup=await get_marketplace_menu_keyboard(context))
             return ConversationHandler.END
 
         buyer_id = query.from_user.id
-        buyer_balance = get_user_internal_balance(buyer_id)
-        fee_amount = price * 0.01
+        buyer_balance = await db.get_user_internal_balance(buyer_id)
+        fee_amount = apply_rate(price, 0.01)
         total_price = price + fee_amount
 
         if buyer_balance < total_price:
-            await query.edit_message_text(f"Unzureichendes Guthaben! Dein Guthaben: {buyer_balance:.2f} SCAMCOIN. Benötigt: {total_price:.2f} SCAMCOIN.", reply_markup=await get_marketplace_menu_keyboard(context))
+            await db.run(release_idempotency_key, key)
+            await query.edit_message_text(f"Unzureichendes Guthaben! Dein Guthaben: {format_amount(buyer_balance)} SCAMCOIN. Benötigt: {format_amount(total_price)} SCAMCOIN.", reply_markup=await get_marketplace_menu_keyboard(context))
             return ConversationHandler.END
 
-        success = process_transaction(
+        success = await db.process_transaction(
             product_id=p_id,
             buyer_id=buyer_id,
             seller_id=seller_id,
             price=price,
-            fee_percentage=0.01
+            fee_percentage=0.01,
+            idempotency_key=key
         )
 
         if success:
             try:
-                await context.bot.send_document(chat_id=buyer_id, document=file_path, caption=f"Dein Kauf: {name}")
-                await query.edit_message_text(f"✅ Du hast '{name}' erfolgreich gekauft für {total_price:.2f} {currency}.", reply_markup=await get_marketplace_menu_keyboard(context))
+                await outbox.send('send_document', buyer_id, TRANSACTIONAL, document=file_path, caption=f"Dein Kauf: {name}")
+                await query.edit_message_text(f"✅ Du hast '{name}' erfolgreich gekauft für {format_amount(total_price)} {currency}.", reply_markup=await get_marketplace_menu_keyboard(context))
                 # Notify seller about the sale
-                await context.bot.send_message(chat_id=seller_id, text=f"🎉 Dein Produkt '{name}' wurde verkauft! Du hast {price * 0.99:.2f} {currency} erhalten.")
+                await outbox.send_message(seller_id, f"🎉 Dein Produkt '{name}' wurde verkauft! Du hast {format_amount(price - fee_amount)} {currency} erhalten.", TRANSACTIONAL)
                 # Log affiliate sale if affiliate referrer exists
                 affiliate_referrer = context.user_data.get('affiliate_referrer')
                 if affiliate_referrer:
                     from affiliate_tracking import log_affiliate_sale
-                    log_affiliate_sale(affiliate_referrer, name, price)
+                    await db.run(log_affiliate_sale, affiliate_referrer, name, float(from_micros(price)))
             except Exception as e:
                 logger.error(f"Fehler beim Senden der Datei an Nutzer {buyer_id}: {e}")
                 await query.edit_message_text(f"✅ Du hast '{name}' gekauft, aber es gab ein Problem bei der Zustellung der Datei.", reply_markup=await get_marketplace_menu_keyboard(context))
@@ -167,6 +170,7 @@ async def confirm_buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     except Exception as e:
         logger.error(f"Error in confirm_buy: {e}")
+        await db.run(release_idempotency_key, key) # Nach erfolgreichem Kauf ist der Schlüssel abgeschlossen und bleibt
         if update.callback_query:
             await update.callback_query.edit_message_text("Ein Fehler ist aufgetreten.", reply_markup=await get_marketplace_menu_keyboard(context))
 
@@ -190,29 +194,55 @@ async def list_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         query = update.callback_query
         await query.answer()
-        category = context.user_data.get('marketplace_filter_category')
-        products = get_all_active_products(category)
-        if not products:
-            await query.edit_message_text("Keine Produkte gefunden.", reply_markup=await get_marketplace_menu_keyboard(context))
-            return
-        text = "Verfügbare Produkte:\n\n"
-        keyboard_buttons = []
-        for p_id, seller_id, name, description, price, currency, file_path, status in products:
-            text += f"▪️ {name} ({price:.2f} {currency})\n"
-            keyboard_buttons.append([InlineKeyboardButton(name, callback_data=f"view_product_{p_id}")])
-        keyboard_buttons.append([InlineKeyboardButton("Zurück", callback_data="marketplace_menu")])
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard_buttons))
+        await _render_products_page(query, context)
     except Exception as e:
         logger.error(f"Error in list_products: {e}")
         if update.callback_query:
             await update.callback_query.edit_message_text("Ein Fehler ist aufgetreten.", reply_markup=await get_marketplace_menu_keyboard(context))
 
+async def _render_products_page(query, context: ContextTypes.DEFAULT_TYPE, after_id: int = None, before_id: int = None):
+    category = context.user_data.get('marketplace_filter_category')
+    products, has_prev, has_next = await db.get_active_products_page(
+        category, page_size=MARKETPLACE_PAGE_SIZE, after_id=after_id, before_id=before_id)
+    if not products:
+        await query.edit_message_text("Keine Produkte gefunden.", reply_markup=await get_marketplace_menu_keyboard(context))
+        return
+    text = "Verfügbare Produkte:\n\n"
+    keyboard_buttons = []
+    for p_id, seller_id, name, description, price, currency, file_path, status in products:
+        text += f"▪️ {name} ({format_amount(price)} {currency})\n"
+        keyboard_buttons.append([InlineKeyboardButton(name, callback_data=f"view_product_{p_id}")])
+    # Der Cursor ist die ID des ersten bzw. letzten Produkts der Seite (callback_data max. 64 Bytes)
+    navigation = []
+    if has_prev:
+        navigation.append(InlineKeyboardButton("⬅️ Zurück", callback_data=f"marketplace_page_prev_{products[0][0]}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton("Weiter ➡️", callback_data=f"marketplace_page_next_{products[-1][0]}"))
+    if navigation:
+        keyboard_buttons.append(navigation)
+    keyboard_buttons.append([InlineKeyboardButton("Zurück", callback_data="marketplace_menu")])
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard_buttons))
+
+async def list_products_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        query = update.callback_query
+        await query.answer()
+        _, _, direction, product_id = query.data.split('_')
+        if direction == 'next':
+            await _render_products_page(query, context, after_id=int(product_id))
+        else:
+            await _render_products_page(query, context, before_id=int(product_id))
+    except Exception as e:
+        logger.error(f"Error in list_products_page: {e}")
+        if update.callback_query:
+            await update.callback_query.edit_message_text("Ein Fehler ist aufgetreten.", reply_markup=await get_marketplace_menu_keyboard(context))
+
 async def view_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         query = update.callback_query
         await query.answer()
         product_id = int(query.data.split('_')[-1])
-        product = get_product_by_id(product_id)
+        product = await db.get_product_by_id(product_id)
 
         if not product:
             await query.edit_message_text("Produkt nicht gefunden oder nicht verfügbar.", reply_markup=await get_marketplace_menu_keyboard(context))
@@ -220,15 +250,15 @@ async def view_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         p_id, seller_id, name, description, price, currency, file_path, status = product
 
-        fee_amount = price * 0.01
+        fee_amount = apply_rate(price, 0.01)
         total_price = price + fee_amount
 
         product_text = (
             f"**{name}**\n\n"
             f"Beschreibung: {description}\n"
-            f"Preis: {price:.2f} {currency}\n"
-            f"Gebühr: {fee_amount:.2f} {currency} (1%)\n"
-            f"Gesamtpreis: {total_price:.2f} {currency}\n\n"
+            f"Preis: {format_amount(price)} {currency}\n"
+            f"Gebühr: {format_amount(fee_amount)} {currency} (1%)\n"
+            f"Gesamtpreis: {format_amount(total_price)} {currency}\n\n"
             f"Verkäufer: Nutzer {seller_id}\n"
         )
 
@@ -239,7 +269,7 @@ async def view_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
             ])
         else:
             keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton(f"Kaufen für {total_price:.2f} {currency}", callback_data=f"buy_product_confirm_{p_id}")],
+                [InlineKeyboardButton(f"Kaufen für {format_amount(total_price)} {currency}", callback_data=f"buy_product_confirm_{p_id}")],
                 [InlineKeyboardButton("Zurück", callback_data='marketplace_view_products')]
             ])
 
@@ -251,50 +281,59 @@ async def view_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.callback_query.edit_message_text("Ein Fehler ist aufgetreten.", reply_markup=await get_marketplace_menu_keyboard(context))
 
 async def confirm_buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    key = None
     try:
         query = update.callback_query
         await query.answer()
+        # Doppelt getippt oder erneut zugestellt: das Ergebnis steht schon fest, nichts erneut senden
+        key = idempotency_key(update, 'buy')
+        if await db.run(claim_idempotency_key, key) is not None:
+            return ConversationHandler.END
         product_id = int(query.data.split('_')[-1])
 
-        product = get_product_by_id(product_id)
+        product = await db.get_product_by_id(product_id)
         if not product:
+            await db.run(release_idempotency_key, key)
             await query.edit_message_text("Produkt nicht gefunden oder nicht verfügbar.", reply_markup=await get_marketplace_menu_keyboard(context))
             return ConversationHandler.END
 
         p_id, seller_id, name, description, price, currency, file_path, status = product
 
         if query.from_user.id == seller_id:
+            await db.run(release_idempotency_key, key)
             await query.edit_message_text("Du kannst dein eigenes Produkt nicht kaufen.", reply_markup=await get_marketplace_menu_keyboard(context))
             return ConversationHandler.END
 
         buyer_id = query.from_user.id
-        buyer_balance = get_user_internal_balance(buyer_id)
-        fee_amount = price * 0.01
+        buyer_balance = await db.get_user_internal_balance(buyer_id)
+        fee_amount = apply_rate(price, 0.01)
         total_price = price + fee_amount
 
         if buyer_balance < total_price:
-            await query.edit_message_text(f"Unzureichendes Guthaben! Dein Guthaben: {buyer_balance:.2f} SCAMCOIN. Benötigt: {total_price:.2f} SCAMCOIN.", reply_markup=await get_marketplace_menu_keyboard(context))
+            await db.run(release_idempotency_key, key)
+            await query.edit_message_text(f"Unzureichendes Guthaben! Dein Guthaben: {format_amount(buyer_balance)} SCAMCOIN. Benötigt: {format_amount(total_price)} SCAMCOIN.", reply_markup=await get_marketplace_menu_keyboard(context))
             return ConversationHandler.END
 
-        success = process_transaction(
+        success = await db.process_transaction(
             product_id=p_id,
             buyer_id=buyer_id,
             seller_id=seller_id,
             price=price,
-            fee_percentage=0.01
+            fee_percentage=0.01,
+            idempotency_key=key
         )
 
         if success:
             try:
-                await context.bot.send_document(chat_id=buyer_id, document=file_path, caption=f"Dein Kauf: {name}")
-                await query.edit_message_text(f"✅ Du hast '{name}' erfolgreich gekauft für {total_price:.2f} {currency}.", reply_markup=await get_marketplace_menu_keyboard(context))
+                await outbox.send('send_document', buyer_id, TRANSACTIONAL, document=file_path, caption=f"Dein Kauf: {name}")
+                await query.edit_message_text(f"✅ Du hast '{name}' erfolgreich gekauft für {format_amount(total_price)} {currency}.", reply_markup=await get_marketplace_menu_keyboard(context))
                 # Notify seller about the sale
-                await context.bot.send_message(chat_id=seller_id, text=f"🎉 Dein Produkt '{name}' wurde verkauft! Du hast {price * 0.99:.2f} {currency} erhalten.")
+                await outbox.send_message(seller_id, f"🎉 Dein Produkt '{name}' wurde verkauft! Du hast {format_amount(price - fee_amount)} {currency} erhalten.", TRANSACTIONAL)
                 # Log affiliate sale if affiliate referrer exists
                 affiliate_referrer = context.user_data.get('affiliate_referrer')
                 if affiliate_referrer:
                     from affiliate_tracking import log_affiliate_sale
-                    log_affiliate_sale(affiliate_referrer, name, price)
+                    await db.run(log_affiliate_sale, affiliate_referrer, name, float(from_micros(price)))
             except Exception as e:
                 logger.error(f"Fehler beim Senden der Datei an Nutzer {buyer_id}: {e}")
                 await query.edit_message_text(f"✅ Du hast '{name}' gekauft, aber es gab ein Problem bei der Zustellung der Datei.", reply_markup=await get_marketplace_menu_keyboard(context))
@@ -304,6 +343,7 @@ async def confirm_buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     except Exception as e:
         logger.error(f"Error in confirm_buy: {e}")
+        await db.run(release_idempotency_key, key) # Nach erfolgreichem Kauf ist der Schlüssel abgeschlossen und bleibt
         if update.callback_query:
             await update.callback_query.edit_message_text("Ein Fehler ist aufgetreten.", reply_markup=await get_marketplace_menu_keyboard(context))
         return ConversationHandler.END
@@ -341,7 +381,7 @@ async def add_product_description(update: Update, context: ContextTypes.DEFAULT_
 
 async def add_product_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        price = float(update.message.text.replace(',', '.'))
+        price = parse_amount(update.message.text)
         if price <= 0:
             raise ValueError
         context.user_data['marketplace_product_price'] = price
@@ -375,7 +415,7 @@ async def add_product_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"**Produktvorschau:**\n\n"
         f"Name: {name}\n"
         f"Beschreibung: {description}\n"
-        f"Preis: {price:.2f} {currency}\n"
+        f"Preis: {format_amount(price)} {currency}\n"
         f"Datei: {file_name}\n"
         f"Kategorie: {category}\n\n"
         f"Möchtest du dieses Produkt einstellen?"
@@ -400,7 +440,7 @@ async def add_product_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE
         file_id = context.user_data.pop('marketplace_product_file_id')
         category = context.user_data.pop('marketplace_product_category', 'General')
 
-        product_id = add_product(user_id, name, description, price, currency, file_id, category)
+        product_id = await db.add_product(user_id, name, description, price, currency, file_id, category)
         if product_id:
             await query.edit_message_text(f"✅ Produkt '{name}' wurde erfolgreich eingestellt!", reply_markup=await get_marketplace_menu_keyboard(context))
         else:
@@ -410,10 +450,82 @@ async def add_product_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     return ConversationHandler.END
 
+async def _render_search_page(update: Update, context: ContextTypes.DEFAULT_TYPE, offset: int = 0):
+    text_query = context.user_data.get('marketplace_search_query', '')
+    products, has_next = await db.search_products(text_query, page_size=MARKETPLACE_PAGE_SIZE, offset=offset)
+    if not products:
+        text = f"Keine Produkte für \"{text_query}\" gefunden."
+        keyboard = [[InlineKeyboardButton("Zurück", callback_data="marketplace_menu")]]
+    else:
+        text = f"Suchergebnisse für \"{text_query}\":\n\n"
+        keyboard = []
+        for p_id, seller_id, name, description, price, currency, file_path, status in products:
+            text += f"▪️ {name} ({format_amount(price)} {currency})\n"
+            keyboard.append([InlineKeyboardButton(name, callback_data=f"view_product_{p_id}")])
+        # Der Suchbegriff liegt in user_data, im callback_data steht nur der Offset
+        navigation = []
+        if offset > 0:
+            navigation.append(InlineKeyboardButton("⬅️ Zurück", callback_data=f"marketplace_search_{max(0, offset - MARKETPLACE_PAGE_SIZE)}"))
+        if has_next:
+            navigation.append(InlineKeyboardButton("Weiter ➡️", callback_data=f"marketplace_search_{offset + MARKETPLACE_PAGE_SIZE}"))
+        if navigation:
+            keyboard.append(navigation)
+        keyboard.append([InlineKeyboardButton("Zurück", callback_data="marketplace_menu")])
+    if update.callback_query:
+        await update.callback_query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+    else:
+        await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        if not context.args:
+            await update.message.reply_text("Bitte gib einen Suchbegriff an, z.B. /search bitcoin guide")
+            return
+        context.user_data['marketplace_search_query'] = ' '.join(context.args)[:100]
+        await _render_search_page(update, context)
+    except Exception as e:
+        logger.error(f"Error in search_command: {e}")
+        await update.message.reply_text("Ein Fehler ist aufgetreten.")
+
+async def search_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        query = update.callback_query
+        await query.answer()
+        await _render_search_page(update, context, offset=int(query.data.split('_')[-1]))
+    except Exception as e:
+        logger.error(f"Error in search_page: {e}")
+        if update.callback_query:
+            await update.callback_query.edit_message_text("Ein Fehler ist aufgetreten.", reply_markup=await get_marketplace_menu_keyboard(context))
+
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Inline-Modus (@bot suchbegriff). Muss bei BotFather mit /setinline aktiviert sein."""
+    inline_query = update.inline_query
+    text_query = inline_query.query.strip()[:100]
+    if not text_query:
+        await inline_query.answer([], cache_time=INLINE_SEARCH_CACHE_SECONDS)
+        return
+    try:
+        offset = int(inline_query.offset or 0)
+        products, has_next = await db.search_products(text_query, page_size=INLINE_SEARCH_PAGE_SIZE, offset=offset)
+        results = [
+            InlineQueryResultArticle(
+                id=str(p_id),
+                title=name,
+                description=f"{format_amount(price)} {currency} · {(description or '')[:80]}",
+                input_message_content=InputTextMessageContent(f"{name}\n{format_amount(price)} {currency}\n\n{description or ''}"),
+            )
+            for p_id, seller_id, name, description, price, currency, file_path, status in products
+        ]
+        # next_offset leer lassen, wenn es keine weiteren Treffer gibt
+        await inline_query.answer(results, cache_time=INLINE_SEARCH_CACHE_SECONDS,
+                                  next_offset=str(offset + INLINE_SEARCH_PAGE_SIZE) if has_next else '')
+    except Exception as e:
+        logger.error(f"Error in inline_search: {e}")
+
 async def my_selling_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    user_products = get_user_products(query.from_user.id)
+    user_products = await db.get_user_products(query.from_user.id)
 
     if not user_products:
         await query.edit_message_text("Du hast aktuell keine Produkte zum Verkauf gelistet.", reply_markup=await get_marketplace_menu_keyboard(context))
@@ -422,7 +534,7 @@ async def my_selling_products(update: Update, context: ContextTypes.DEFAULT_TYPE
     text = "Deine Produkte zum Verkauf:\n\n"
     keyboard_buttons = []
     for p_id, seller_id, name, description, price, currency, file_path, status in user_products:
-        text += f"▪️ {name} ({price:.2f} {currency}) - Status: {status}\n"
+        text += f"▪️ {name} ({format_amount(price)} {currency}) - Status: {status}\n"
         keyboard_buttons.append([InlineKeyboardButton(f"Löschen {name}", callback_data=f"delete_product_{p_id}")])
 
     keyboard_buttons.append([InlineKeyboardButton("Zurück", callback_data="marketplace_menu")])
@@ -435,21 +547,25 @@ async def delete_product_handler(update: Update, context: ContextTypes.DEFAULT_T
     product_id = int(query.data.replace("delete_product_", ""))
     user_id = query.from_user.id
 
-    product = get_product_by_id(product_id)
+    product = await db.get_product_by_id(product_id)
     if not product or product[1] != user_id:
         await query.edit_message_text("Produkt nicht gefunden oder du bist nicht der Verkäufer.", reply_markup=await get_marketplace_menu_keyboard(context))
         return ConversationHandler.END
 
     try:
-        conn = sqlite3.connect('scamlingbot.db')
-        cursor = conn.cursor()
-        cursor.execute('UPDATE products SET status = "deleted" WHERE id = ?', (product_id,))
-        conn.commit()
+        await db.delete_product(product_id, user_id)
     except Exception as e:
         await query.edit_message_text(f"Fehler beim Löschen des Produkts: {e}", reply_markup=await get_marketplace_menu_keyboard(context))
         return ConversationHandler.END
-    finally:
-        conn.close()
 
     await query.edit_message_text("Produkt wurde gelöscht.", reply_markup=await get_marketplace_menu_keyboard(context))
     return ConversationHandler.END
+
+async def settle_fees_job(context: ContextTypes.DEFAULT_TYPE):
+    """Job für die job_queue: bucht die gesammelten Marktplatz-Gebühren auf das Owner-Konto."""
+    try:
+        amount = await db.settle_fees()
+        if amount:
+            logger.info(f"Gebühren abgerechnet: {format_amount(amount)} SCAMCOIN an den Bot-Owner.")
+    except Exception as e:
+        logger.error(f"Error in settle_fees_job: {e}")
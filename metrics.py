@@ -0,0 +1,23 @@
+from collections import deque
+
+# =================================================================================
+# GEMEINSAME LAUFZEIT-METRIKEN
+# =================================================================================
+# Die Dienste (DB-Fassade, HTTP-Client, Sende-Queue) behalten jeweils die letzten
+# METRICS_WINDOW Messwerte und melden daraus Perzentile für den Admin-Status.
+
+METRICS_WINDOW = 1000 # Anzahl der Messwerte für die Perzentile
+
+
+def sample_window(size: int = METRICS_WINDOW) -> deque:
+    """Ringpuffer für die letzten size Messwerte."""
+    return deque(maxlen=size)
+
+
+def percentile(samples, pct: float) -> float:
+    """Perzentil pct (0-100) der Messwerte, 0.0 ohne Messwerte."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,552 @@
+import re
+import logging
+import datetime
+
+from db_pool import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# SCHEMA-MIGRATIONEN
+# =================================================================================
+# Jede Migration hat eine fortlaufende Versionsnummer und wird genau einmal
+# ausgeführt. Die angewendeten Versionen stehen in der Tabelle schema_migrations.
+# Neue Schemaänderungen immer als neue Migration am Ende anhängen, bestehende
+# Migrationen nie nachträglich ändern.
+
+MIGRATIONS = []
+
+
+def migration(version: int, name: str, foreign_keys: bool = True):
+    """Registriert eine Migration. Die Funktion bekommt die Verbindung innerhalb der Transaktion.
+
+    foreign_keys=False schaltet die Fremdschlüsselprüfung für die Migration ab,
+    nötig für den Neuaufbau von Tabellen, auf die andere Tabellen verweisen.
+    """
+    def decorator(fn):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"Migration {version} ({name}) ist nicht aufsteigend nummeriert")
+        MIGRATIONS.append((version, name, fn, foreign_keys))
+        return fn
+    return decorator
+
+
+def _execute_all(conn, statements):
+    for statement in statements:
+        conn.execute(statement)
+
+
+@migration(1, 'baseline_tables')
+def _baseline_tables(conn):
+    # Entspricht den bisherigen CREATE TABLE IF NOT EXISTS-Aufrufen aus init_db,
+    # init_notes_table, init_affiliate_tables und init_wallet_history_table.
+    # Bestehende Datenbanken bleiben dadurch unverändert.
+    _execute_all(conn, [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            language TEXT DEFAULT 'en',
+            registered_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            internal_balance REAL DEFAULT 0.0 -- Für internes Währungssystem
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            username TEXT,
+            feedback_text TEXT,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS wallets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            currency TEXT NOT NULL,
+            address TEXT NOT NULL,
+            UNIQUE(user_id, currency, address)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS pools (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            pool_type TEXT NOT NULL,
+            pool_address TEXT NOT NULL,
+            UNIQUE(user_id, pool_type, pool_address)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS news (
+            link TEXT PRIMARY KEY,
+            title TEXT,
+            published TEXT,
+            sent_to_telegram INTEGER DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            seller_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT,
+            price REAL NOT NULL,
+            currency TEXT NOT NULL, -- Z.B. 'SCAMCOIN' für internes System
+            category TEXT DEFAULT 'General',
+            file_id TEXT, -- Telegram file_id des hochgeladenen Gutes
+            status TEXT DEFAULT 'active', -- 'active', 'sold', 'deleted'
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (seller_id) REFERENCES users(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            buyer_id INTEGER NOT NULL,
+            seller_id INTEGER NOT NULL,
+            amount REAL NOT NULL, -- Preis des Produkts (ohne Gebühr)
+            fee_amount REAL NOT NULL, -- Gebühr für den Bot
+            total_paid REAL NOT NULL, -- Gesamtbetrag, den der Käufer zahlt
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'completed', -- 'completed', 'failed', 'refunded'
+            FOREIGN KEY (product_id) REFERENCES products(id),
+            FOREIGN KEY (buyer_id) REFERENCES users(id),
+            FOREIGN KEY (seller_id) REFERENCES users(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            note TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS affiliate_clicks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            product_name TEXT,
+            click_time TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS affiliate_sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            product_name TEXT,
+            sale_amount REAL,
+            sale_time TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS wallet_transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            currency TEXT NOT NULL,
+            amount REAL NOT NULL,
+            transaction_type TEXT NOT NULL, -- e.g., 'deposit', 'withdrawal', 'purchase', 'sale'
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+            description TEXT
+        )
+        ''',
+    ])
+
+
+@migration(2, 'secondary_indexes')
+def _secondary_indexes(conn):
+    # wallets und pools brauchen keinen eigenen Index: die UNIQUE-Constraints
+    # beginnen mit user_id und decken die Abfragen bereits ab.
+    _execute_all(conn, [
+        # Marktplatz: aktive Produkte nach Datum, optional nach Kategorie, eigene Produkte
+        'CREATE INDEX IF NOT EXISTS idx_products_status_created ON products (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_products_status_category_created ON products (status, category, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_products_seller_created ON products (seller_id, created_at)',
+        # Admin: letztes Feedback
+        'CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp)',
+        # Affiliate-Statistik und Leaderboard (sale_amount macht den Index covering für SUM)
+        'CREATE INDEX IF NOT EXISTS idx_affiliate_clicks_user ON affiliate_clicks (user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_affiliate_sales_user_amount ON affiliate_sales (user_id, sale_amount)',
+        # Notizen und Wallet-Verlauf, jeweils nach Datum sortiert
+        'CREATE INDEX IF NOT EXISTS idx_user_notes_user_created ON user_notes (user_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_wallet_transactions_user_time ON wallet_transactions (user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_wallet_transactions_user_currency_time ON wallet_transactions (user_id, currency, timestamp)',
+    ])
+
+
+@migration(3, 'products_fts')
+def _products_fts(conn):
+    # Volltextindex über Name, Beschreibung und Kategorie. External-Content-Tabelle:
+    # der Text liegt nur in products, die Trigger halten den Index synchron.
+    _execute_all(conn, [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, description, category,
+            content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, description, category)
+            VALUES (new.id, new.name, new.description, new.category);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description, category)
+            VALUES ('delete', old.id, old.name, old.description, old.category);
+        END
+        ''',
+        # Nur bei Änderungen an indizierten Spalten, Statuswechsel (verkauft/gelöscht) kosten nichts
+        '''
+        CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, description, category ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description, category)
+            VALUES ('delete', old.id, old.name, old.description, old.category);
+            INSERT INTO products_fts (rowid, name, description, category)
+            VALUES (new.id, new.name, new.description, new.category);
+        END
+        ''',
+        # Treffer im Namen zählen mehr als in Beschreibung und Kategorie
+        "INSERT INTO products_fts (products_fts, rank) VALUES ('rank', 'bm25(10.0, 2.0, 1.0)')",
+        # Bestehende Produkte einmalig indizieren
+        "INSERT INTO products_fts (products_fts) VALUES ('rebuild')",
+    ])
+
+
+@migration(4, 'fee_ledger')
+def _fee_ledger(conn):
+    # Append-only Journal der Marktplatz-Gebühren. Käufe schreiben nur hier hinein,
+    # settle_fees bucht die Summe periodisch auf das Owner-Konto und merkt sich
+    # in fee_settlements, bis zu welchem Eintrag abgerechnet wurde. Da nie Zeilen
+    # gelöscht werden, steigen die IDs auch ohne AUTOINCREMENT monoton.
+    _execute_all(conn, [
+        '''
+        CREATE TABLE IF NOT EXISTS fee_ledger (
+            id INTEGER PRIMARY KEY, -- Ohne AUTOINCREMENT, sonst wird sqlite_sequence zur heißen Zeile
+            transaction_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (transaction_id) REFERENCES transactions(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS fee_settlements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            last_fee_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            settled_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ])
+
+
+def _convert_columns_to_micros(conn, table: str, columns: list):
+    # SQLite kann den Typ einer Spalte nicht ändern, und eine REAL-Spalte würde
+    # Ganzzahlen wieder als float speichern. ALTER TABLE ... DROP COLUMN gibt es erst
+    # ab SQLite 3.35, deshalb der Neuaufbau nach https://sqlite.org/lang_altertable.html:
+    # neue Tabelle mit INTEGER-Spalten anlegen, Zeilen umgerechnet kopieren, alte Tabelle
+    # löschen, neue umbenennen, Indizes und Trigger neu anlegen. Die Spaltenreihenfolge bleibt erhalten.
+    create_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    dependents = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = ? AND sql IS NOT NULL", (table,))]
+    new_table = f'{table}__micros'
+    create_sql, found = re.subn(rf'^CREATE TABLE "?{table}"?', f'CREATE TABLE {new_table}', create_sql)
+    if not found:
+        raise ValueError(f"Unerwartete Definition der Tabelle {table}: {create_sql}")
+    for column in columns:
+        create_sql, found = re.subn(rf'\b{column}\s+REAL(\s+NOT NULL)?(\s+DEFAULT\s+[0-9.]+)?',
+                                    f'{column} INTEGER NOT NULL DEFAULT 0', create_sql)
+        if found != 1:
+            raise ValueError(f"Spalte {table}.{column} nicht als REAL definiert")
+    names = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    values = [f'COALESCE(CAST(ROUND({name} * 1000000) AS INTEGER), 0)' if name in columns else name for name in names]
+    conn.execute(create_sql)
+    conn.execute(f'INSERT INTO {new_table} ({", ".join(names)}) SELECT {", ".join(values)} FROM {table}')
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {new_table} RENAME TO {table}')
+    _execute_all(conn, dependents)
+
+
+@migration(5, 'integer_micro_amounts', foreign_keys=False)
+def _integer_micro_amounts(conn):
+    # Alle SCAMCOIN-Beträge als ganze Mikro-Einheiten (siehe money.py)
+    for table, columns in [
+        ('users', ['internal_balance']),
+        ('products', ['price']),
+        ('transactions', ['amount', 'fee_amount', 'total_paid']),
+        ('fee_ledger', ['amount']),
+        ('fee_settlements', ['amount']),
+        ('wallet_transactions', ['amount']),
+    ]:
+        _convert_columns_to_micros(conn, table, columns)
+    # Bisher wurden Guthaben auch ohne Verlaufseintrag geändert (Startguthaben,
+    # Einzahlungen, Käufe). Ein Eröffnungssaldo pro Nutzer gleicht den Verlauf an
+    # das aktuelle Guthaben an, ab jetzt muss reconcile_balances immer aufgehen.
+    conn.execute('''
+        INSERT INTO wallet_transactions (user_id, currency, amount, transaction_type, description)
+        SELECT u.id, 'SCAMCOIN', u.internal_balance - COALESCE(h.total, 0), 'opening_balance',
+               'Eröffnungssaldo bei Umstellung auf Mikro-Einheiten'
+        FROM users u
+        LEFT JOIN (SELECT user_id, SUM(amount) AS total FROM wallet_transactions
+                   WHERE currency = 'SCAMCOIN' GROUP BY user_id) h ON h.user_id = u.id
+        WHERE u.internal_balance != COALESCE(h.total, 0)
+    ''')
+
+
+@migration(6, 'double_entry_journal')
+def _double_entry_journal(conn):
+    # Doppelte Buchführung für SCAMCOIN (siehe ledger.py). Jede Buchung besteht aus
+    # mindestens zwei Zeilen in ledger_entries, die sich zu null summieren.
+    # users.internal_balance ist nur noch die fortgeschriebene Projektion davon,
+    # balance_snapshots begrenzen das Nachrechnen auf die Einträge seit dem letzten Snapshot.
+    _execute_all(conn, [
+        '''
+        CREATE TABLE IF NOT EXISTS ledger_transactions (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            reference TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS ledger_entries (
+            id INTEGER PRIMARY KEY, -- Append-only, die IDs steigen monoton und dienen den Snapshots als Wasserstand
+            ledger_transaction_id INTEGER NOT NULL,
+            account TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            FOREIGN KEY (ledger_transaction_id) REFERENCES ledger_transactions(id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_ledger_entries_account ON ledger_entries (account, id)',
+        'CREATE INDEX IF NOT EXISTS idx_ledger_entries_transaction ON ledger_entries (ledger_transaction_id)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS ledger_entries_no_update BEFORE UPDATE ON ledger_entries BEGIN
+            SELECT RAISE(ABORT, 'ledger_entries ist append-only');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS ledger_entries_no_delete BEFORE DELETE ON ledger_entries BEGIN
+            SELECT RAISE(ABORT, 'ledger_entries ist append-only');
+        END
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS balance_snapshots (
+            account TEXT PRIMARY KEY,
+            last_entry_id INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            taken_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ])
+    # Eröffnungsbuchung: aktuelle Guthaben und noch nicht abgerechnete Gebühren
+    # gegen das Eröffnungskonto, damit das Journal ab hier mit den Guthaben übereinstimmt
+    cursor = conn.execute("INSERT INTO ledger_transactions (kind, reference) VALUES ('opening_balance', 'migration 6')")
+    opening_id = cursor.lastrowid
+    conn.execute('''
+        INSERT INTO ledger_entries (ledger_transaction_id, account, amount)
+        SELECT ?, 'user:' || id, internal_balance FROM users WHERE internal_balance != 0
+    ''', (opening_id,))
+    conn.execute('''
+        INSERT INTO ledger_entries (ledger_transaction_id, account, amount)
+        SELECT ?, 'system:fees', SUM(amount) FROM fee_ledger
+        WHERE id > (SELECT COALESCE(MAX(last_fee_id), 0) FROM fee_settlements)
+        HAVING SUM(amount) != 0
+    ''', (opening_id,))
+    conn.execute('''
+        INSERT INTO ledger_entries (ledger_transaction_id, account, amount)
+        SELECT ?, 'system:opening', -SUM(amount) FROM ledger_entries WHERE ledger_transaction_id = ?
+        HAVING SUM(amount) != 0
+    ''', (opening_id, opening_id))
+    conn.execute('''
+        INSERT INTO balance_snapshots (account, last_entry_id, balance)
+        SELECT account, MAX(id), SUM(amount) FROM ledger_entries GROUP BY account
+    ''')
+
+
+@migration(7, 'idempotency_keys')
+def _idempotency_keys(conn):
+    # Ergebnis von Geldbewegungen pro Telegram-Update (siehe idempotency.py)
+    _execute_all(conn, [
+        '''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            outcome TEXT NOT NULL,
+            expires_at INTEGER NOT NULL -- Unix-Zeit
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys (expires_at)',
+    ])
+
+
+@migration(8, 'broadcasts')
+def _broadcasts(conn):
+    # Fortschritt von Broadcasts, damit sie einen Neustart überleben (siehe broadcast.py)
+    _execute_all(conn, [
+        '''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running', -- running, done
+            last_user_id INTEGER NOT NULL DEFAULT 0, -- Alle Nutzer bis einschließlich dieser ID sind erledigt
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            admin_chat_id INTEGER,
+            progress_message_id INTEGER,
+            started_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            finished_at TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts (status)',
+    ])
+
+
+@migration(9, 'outbound_messages')
+def _outbound_messages(conn):
+    # Ausgelagerte Bulk-Nachrichten der Sende-Queue (siehe outbox.py), gelöscht nach der Zustellung
+    _execute_all(conn, [
+        '''
+        CREATE TABLE IF NOT EXISTS outbound_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            method TEXT NOT NULL, -- Bot-Methode, z.B. send_message
+            payload TEXT NOT NULL, -- Argumente als JSON
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ])
+
+
+@migration(10, 'news_feeds')
+def _news_feeds(conn):
+    # Validatoren für bedingte Feed-Abrufe (ETag / Last-Modified), siehe news_service.py
+    _execute_all(conn, [
+        '''
+        CREATE TABLE IF NOT EXISTS news_feeds (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            last_status INTEGER, -- HTTP-Status des letzten Abrufs, NULL bei Netzwerkfehler
+            checked_at TEXT,
+            changed_at TEXT -- Letzter Abruf mit neuem Inhalt (200)
+        ) WITHOUT ROWID
+        ''',
+    ])
+
+
+@migration(11, 'news_feed_health')
+def _news_feed_health(conn):
+    # Zustand des adaptiven Feed-Schedulers, siehe feed_scheduler.py
+    _execute_all(conn, [
+        'ALTER TABLE news_feeds ADD COLUMN last_success_at TEXT', # Letzter Abruf mit 200 oder 304
+        'ALTER TABLE news_feeds ADD COLUMN latency_ms INTEGER', # Dauer des letzten Abrufs
+        'ALTER TABLE news_feeds ADD COLUMN error_streak INTEGER NOT NULL DEFAULT 0', # Fehlgeschlagene Abrufe in Folge
+        'ALTER TABLE news_feeds ADD COLUMN avg_publish_seconds REAL', # Gelernter mittlerer Abstand zwischen Artikeln
+        'ALTER TABLE news_feeds ADD COLUMN last_item_at TEXT', # Neuester bekannter Artikel (UTC)
+        'ALTER TABLE news_feeds ADD COLUMN poll_interval_seconds INTEGER',
+        'ALTER TABLE news_feeds ADD COLUMN next_poll_at TEXT', # UTC, im Format von CURRENT_TIMESTAMP
+    ])
+
+
+@migration(12, 'job_checkpoints')
+def _job_checkpoints(conn):
+    # Checkpoints und Leases der geplanten Jobs, siehe job_checkpoints.py
+    _execute_all(conn, [
+        '''
+        CREATE TABLE IF NOT EXISTS job_checkpoints (
+            job TEXT PRIMARY KEY,
+            cursor TEXT, -- Fortschritt des Jobs, Format bestimmt der Job
+            last_started_at TEXT,
+            last_run_at TEXT, -- Ende des letzten Laufs
+            last_status TEXT, -- 'ok' oder 'error'
+            lease_owner TEXT, -- Prozess, der den Job gerade ausführt
+            lease_expires_at TEXT
+        ) WITHOUT ROWID
+        ''',
+    ])
+
+
+@migration(13, 'outbound_message_claims')
+def _outbound_message_claims(conn):
+    # Welche Instanz eine ausgelagerte Nachricht gerade sendet, siehe outbox.claim_spilled_messages
+    _execute_all(conn, [
+        'ALTER TABLE outbound_messages ADD COLUMN claimed_by TEXT',
+        'ALTER TABLE outbound_messages ADD COLUMN claimed_at TEXT',
+        'CREATE INDEX IF NOT EXISTS idx_outbound_messages_claimed_by ON outbound_messages(claimed_by)',
+    ])
+
+
+@migration(14, 'transactions_seller_fee')
+def _transactions_seller_fee(conn):
+    # Neue Käufe berechnen die Gebühr Käufer (fee_amount, steckt in total_paid) und
+    # Verkäufer (seller_fee_amount) je einmal, beide zusammen ergeben den Eintrag im
+    # fee_ledger. Ältere Käufe haben dort nur eine Gebühr oder gar keinen Eintrag
+    # (vor Migration 4). Der Anteil des Verkäufers wird deshalb pro Kauf aus dem
+    # fee_ledger abgeleitet, ohne Eintrag bleibt er 0.
+    _execute_all(conn, [
+        'ALTER TABLE transactions ADD COLUMN seller_fee_amount INTEGER NOT NULL DEFAULT 0',
+        '''
+        UPDATE transactions
+        SET seller_fee_amount = MAX(0, (SELECT SUM(f.amount) FROM fee_ledger f WHERE f.transaction_id = transactions.id) - fee_amount)
+        WHERE id IN (SELECT transaction_id FROM fee_ledger)
+        ''',
+    ])
+
+
+def _ensure_migrations_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+
+def get_schema_version() -> int:
+    with connection() as conn:
+        _ensure_migrations_table(conn)
+        return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_migrations').fetchone()[0]
+
+
+def migrate(target: int = None) -> int:
+    """Wendet alle ausstehenden Migrationen an und gibt die neue Schemaversion zurück.
+
+    Jede Migration läuft in einer eigenen BEGIN IMMEDIATE-Transaktion, sodass
+    mehrere gleichzeitig startende Prozesse sie nicht doppelt ausführen.
+    """
+    current = get_schema_version()
+    for version, name, fn, foreign_keys in MIGRATIONS:
+        if version <= current or (target is not None and version > target):
+            continue
+        with connection() as conn:
+            # Das PRAGMA wirkt nur außerhalb einer Transaktion. transaction() bekommt
+            # im selben Thread dieselbe Verbindung.
+            if not foreign_keys:
+                conn.execute('PRAGMA foreign_keys = OFF')
+            try:
+                with transaction(immediate=True) as conn:
+                    # Erneut prüfen, ein anderer Prozess könnte die Migration inzwischen ausgeführt haben
+                    if conn.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,)).fetchone():
+                        continue
+                    fn(conn)
+                    conn.execute('INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)',
+                                 (version, name, datetime.datetime.now().isoformat(timespec='seconds')))
+            finally:
+                if not foreign_keys:
+                    conn.execute('PRAGMA foreign_keys = ON')
+        # user_version spiegelt die Version für externe Tools (sqlite3-CLI, Backups)
+        with connection() as conn:
+            conn.execute(f'PRAGMA user_version = {version}')
+        logger.info(f"Schema-Migration {version} ({name}) angewendet.")
+        current = version
+    return current
@@ -0,0 +1,44 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# =================================================================================
+# FESTKOMMA-BETRÄGE (MIKRO-SCAMCOIN)
+# =================================================================================
+# Guthaben, Preise und Buchungen werden als ganze Zahlen in Mikro-Einheiten
+# gespeichert und gerechnet (1 SCAMCOIN = 1_000_000 Mikro). Decimal wird nur an
+# den Rändern benutzt: beim Einlesen von Nutzereingaben und bei der Anzeige.
+
+MICROS_PER_UNIT = 1_000_000
+_QUANT = Decimal(MICROS_PER_UNIT)
+
+
+def to_micros(value) -> int:
+    """Wandelt einen Betrag (int, str, Decimal oder float) in Mikro-Einheiten um."""
+    if isinstance(value, float):
+        value = repr(value) # Über die kürzeste Darstellung, 0.1 wird nicht zu 0.1000000000000000055...
+    try:
+        amount = Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"Ungültiger Betrag: {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"Ungültiger Betrag: {value!r}")
+    return int((amount * _QUANT).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_micros(micros: int) -> Decimal:
+    """Mikro-Einheiten als Decimal in ganzen SCAMCOIN, z.B. für f"{betrag:.2f}"."""
+    return Decimal(micros) / _QUANT
+
+
+def parse_amount(text: str) -> int:
+    """Liest eine Nutzereingabe wie "12,5" als Mikro-Einheiten. Wirft ValueError bei ungültiger Eingabe."""
+    return to_micros(text.strip().replace(',', '.'))
+
+
+def apply_rate(micros: int, rate) -> int:
+    """Anteil eines Betrags (z.B. Gebühr von 1 %), kaufmännisch auf ganze Mikro-Einheiten gerundet."""
+    rate = Decimal(repr(rate)) if isinstance(rate, float) else Decimal(rate)
+    return int((Decimal(micros) * rate).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def format_amount(micros: int, places: int = 2) -> str:
+    return f"{from_micros(micros):.{places}f}"
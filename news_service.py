@@ -1,13 +1,23 @@
 import os
+import time
 import asyncio
 import logging
 import datetime
+from urllib.parse import urlsplit
+import xml.etree.ElementTree as ET
 import httpx
-import feedparser
+from async_db import db
+from http_client import http
+from feed_stream import stream_feed
+from feed_scheduler import due_feeds, parse_timestamp, plan_next_poll, utc_now
+from price_service import prices
+from outbox import outbox
+from news_store import news_store
+from job_checkpoints import job_checkpoints
 from typing import Final
 
 # Import der Datenbankfunktionen, die vom News-Service benötigt werden
-from database import mark_news_item_as_sent, check_if_news_item_sent
+from database import get_news_feed_states, save_news_feed_state
 
 # Konfiguration des Loggers für dieses Modul
 logger = logging.getLogger(__name__)
@@ -19,139 +29,246 @@ logger = logging.getLogger(__name__)
 # HINWEIS: NEWS_FEED_URL ist hier als https://u.today/rss belassen, da es bei dir funktioniert.
 # Falls es zu Problemen kommt, solltest du hier auf eine stabile RSS-Feed-Quelle umstellen (z.B. CoinDesk: "https://www.coindesk.com/feed/")
 NEWS_FEED_URL: Final[str] = "https://u.today/rss"
-NEWS_CHECK_INTERVAL_SECONDS: Final[int] = 60 * 30  # Alle 30 Minuten
+# Weitere Feeds kommagetrennt in NEWS_FEED_URLS, sie werden parallel abgerufen und zusammengeführt
+NEWS_FEED_URLS: Final[list] = [url.strip() for url in os.environ.get("NEWS_FEED_URLS", NEWS_FEED_URL).split(",") if url.strip()]
+NEWS_FEED_NAMES: Final[dict] = {NEWS_FEED_URL: "U.Today"} # Anzeigename, sonst der Titel des Feeds
+NEWS_CHECK_INTERVAL_SECONDS: Final[int] = 60 * 30  # XRdoge-Preis alle 30 Minuten, Feeds im eigenen Takt (feed_scheduler.py)
+NEWS_FEED_OVERLAP_SECONDS: Final[int] = 5 * 60 # Überlappung zum letzten Abruf für verspätet erscheinende Artikel
 NEWS_MAX_TO_POST_PER_CHECK: Final[int] = 3
 
 # Die GROUP_CHAT_ID wird direkt aus den Umgebungsvariablen geladen,
 # um news_service.py autark zu machen.
 GROUP_CHAT_ID: Final[int] = int(os.environ.get("GROUP_CHAT_ID", -1000000000000)) # Fallback für den Fall, dass es nicht gesetzt ist
 
-# Dateiname für den letzten News-Check-Zeitpunkt (bleibt lokal für dieses Modul)
-LAST_NEWS_CHECK_TIME_FILE: Final[str] = 'last_news_check.txt' # Hier am besten einen absoluten Pfad oder einen Pfad relativ zum bot-Ordner verwenden
+# Zeitpunkt des letzten News-Checks als Cursor in job_checkpoints (früher eine Textdatei neben dem Modul)
+NEWS_JOB: Final[str] = 'news_check'
+LEGACY_NEWS_CHECK_TIME_FILE: Final[str] = 'last_news_check.txt' # Wird nur noch einmalig übernommen
 
-def get_last_news_check_time() -> datetime.datetime:
-    """Liest den Zeitpunkt des letzten News-Checks aus einer Datei."""
-    # Pfad relativ zum Bot-Ordner
-    file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), LAST_NEWS_CHECK_TIME_FILE)
+async def get_last_news_check_time() -> datetime.datetime:
+    """Liest den Zeitpunkt des letzten News-Checks aus dem Job-Checkpoint."""
+    cursor = await job_checkpoints.get_cursor(NEWS_JOB)
+    if cursor:
+        return datetime.datetime.fromisoformat(cursor)
+    # Bestehende Installationen: den Wert aus der alten Datei übernehmen
+    file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), LEGACY_NEWS_CHECK_TIME_FILE)
     if os.path.exists(file_path):
         with open(file_path, "r") as f:
             try:
                 return datetime.datetime.fromisoformat(f.read().strip())
             except ValueError:
                 logger.warning(f"Ungültiges Datumsformat in {file_path}. Setze auf Minimum.")
-                return datetime.datetime.min
-    logger.info(f"Keine letzte News-Check-Zeit gefunden in {file_path}. Setze auf Minimum.")
+    logger.info("Kein letzter News-Check gespeichert. Setze auf Minimum.")
     return datetime.datetime.min
 
-def set_last_news_check_time(dt: datetime.datetime):
-    """Speichert den Zeitpunkt des letzten News-Checks in einer Datei."""
-    file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), LAST_NEWS_CHECK_TIME_FILE)
-    with open(file_path, "w") as f:
-        f.write(dt.isoformat())
+async def set_last_news_check_time(dt: datetime.datetime):
+    """Speichert den Zeitpunkt des letzten News-Checks, nur solange dieser Prozess den Job hält."""
+    await job_checkpoints.save_cursor(NEWS_JOB, dt.isoformat())
 
-async def fetch_and_parse_news(url: str) -> list:
-    """Holt und parst RSS-Nachrichten."""
+async def fetch_feed(url: str, validators: dict = None, since: datetime.datetime = None) -> dict:
+    """Holt einen Feed mit bedingtem GET (If-None-Match / If-Modified-Since) und parst ihn streamend.
+
+    Mit since wird nach den ersten Einträgen, die nicht neuer sind, aufgehört zu lesen.
+    Bei 304 oder einem Fehler ist 'entries' leer, 'status' ist None bei Netzwerkfehlern.
+    'latency_ms' ist die Dauer des gesamten Abrufs.
+    """
+    validators = validators or {}
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    result = {'url': url, 'status': None, 'entries': [], 'title': None, 'etag': None, 'last_modified': None, 'latency_ms': None}
+    started = time.perf_counter()
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, timeout=15.0)
-            response.raise_for_status()
-            feed = feedparser.parse(response.text)
-            if feed.bozo:
-                logger.error(f"Fehler beim Parsen des RSS-Feeds '{url}': {feed.bozo_exception}")
-                return []
-            return feed.entries
+        async with http.stream("GET", url, headers=headers, timeout=15.0) as response:
+            result['status'] = response.status_code
+            if response.status_code == 304:
+                return result # Unverändert, nichts heruntergeladen
+            if response.is_error:
+                await response.aread() # Für die Fehlermeldung
+                response.raise_for_status()
+            feed = await stream_feed(response, since)
+        result.update(entries=feed.entries(), title=feed.title,
+                      etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'))
+    except ET.ParseError as e:
+        logger.error(f"Fehler beim Parsen des RSS-Feeds '{url}': {e}")
+        result['status'] = None # Validatoren nicht übernehmen, beim nächsten Mal vollständig laden
     except httpx.HTTPStatusError as e:
         logger.error(f"HTTP-Fehler beim Abrufen des RSS-Feeds '{url}': {e.response.status_code} - {e.response.text}")
-        return []
     except httpx.RequestError as e:
         logger.error(f"Netzwerkfehler beim Abrufen des RSS-Feeds '{url}': {e}")
-        return []
     except Exception as e:
         logger.error(f"Unerwarteter Fehler beim Abrufen/Parsen des RSS-Feeds '{url}': {e}")
-        return []
+    finally:
+        result['latency_ms'] = int((time.perf_counter() - started) * 1000)
+    return result
+
+async def fetch_and_parse_news(url: str) -> list:
+    """Holt und parst RSS-Nachrichten (ohne bedingtes GET), höchstens die neuesten NEWS_STREAM_MAX_CANDIDATES."""
+    return (await fetch_feed(url))['entries']
+
+def entry_published(entry) -> datetime.datetime | None:
+    """Veröffentlichungsdatum eines Eintrags, ersatzweise das Aktualisierungsdatum."""
+    if 'published_parsed' in entry and entry.published_parsed:
+        return datetime.datetime(*entry.published_parsed[:6])
+    if 'updated_parsed' in entry and entry.updated_parsed:
+        return datetime.datetime(*entry.updated_parsed[:6])
+    return None
+
+def entry_id(entry) -> str:
+    return entry.id if hasattr(entry, 'id') else entry.link
+
+def merge_feed_entries(results) -> list:
+    """Führt die Einträge mehrerer Feeds zu einem Strom zusammen, ältester zuerst.
+
+    Doppelte Artikel (gleiche ID oder gleicher Link in mehreren Feeds) kommen nur einmal vor.
+    """
+    merged = []
+    seen = set()
+    for result in results:
+        source = NEWS_FEED_NAMES.get(result['url']) or result['title'] or urlsplit(result['url']).netloc
+        for entry in result['entries']:
+            keys = {entry_id(entry), entry.get('link', '').strip()} - {''}
+            if keys & seen:
+                continue
+            seen |= keys
+            merged.append((entry_published(entry) or datetime.datetime.min, source, entry))
+    merged.sort(key=lambda item: item[0])
+    return [(source, entry) for _, source, entry in merged]
+
+def _feed_since(state: dict | None, fallback: datetime.datetime = None) -> datetime.datetime | None:
+    # Jeder Feed liest ab seinem eigenen letzten erfolgreichen Abruf, die News-Deduplizierung fängt die Überlappung ab
+    last_success = parse_timestamp((state or {}).get('last_success_at'))
+    if last_success is None:
+        return fallback
+    return last_success - datetime.timedelta(seconds=NEWS_FEED_OVERLAP_SECONDS)
+
+async def fetch_all_feeds(urls=NEWS_FEED_URLS, since: datetime.datetime = None, states: dict = None) -> list:
+    """Ruft die Feeds parallel ab, das Limit pro Host setzt der gemeinsame HTTP-Client durch.
+
+    since gilt nur für Feeds ohne erfolgreichen Abruf. Gespeichert wird noch nichts,
+    das macht save_feed_states, sobald die neuen Artikel verarbeitet sind.
+    """
+    if states is None:
+        states = await db.run(get_news_feed_states, urls)
+    return await asyncio.gather(*(fetch_feed(url, states.get(url), _feed_since(states.get(url), since)) for url in urls))
+
+async def save_feed_states(results, states: dict = None):
+    """Speichert Validatoren, Gesundheit und nächsten Abrufzeitpunkt der abgerufenen Feeds.
+
+    Erst nach dem Posten aufrufen: mit neuem ETag bzw. last_success_at liefert der
+    nächste Abruf die Artikel nicht mehr (304 oder vor since).
+    """
+    if states is None:
+        states = await db.run(get_news_feed_states, [result['url'] for result in results])
+    now = utc_now()
+    for result in results:
+        ok = result['status'] in (200, 304)
+        schedule = plan_next_poll(states.get(result['url']), ok, [entry_published(entry) for entry in result['entries']], now)
+        await db.run(save_news_feed_state, result['url'], result['status'], result['etag'], result['last_modified'],
+                     result['latency_ms'], schedule)
+
+def format_feed_health(states: dict, urls=NEWS_FEED_URLS) -> str:
+    """Gesundheit der Feeds für das Admin-Menü, eine Zeile pro Feed."""
+    lines = []
+    for url in urls:
+        name = NEWS_FEED_NAMES.get(url) or urlsplit(url).netloc
+        state = states.get(url)
+        if not state:
+            lines.append(f"{name}: noch nicht abgerufen")
+            continue
+        interval = f"alle {(state['poll_interval_seconds'] or 0) // 60} min"
+        if state['error_streak']:
+            error = f"HTTP {state['last_status']}" if state['last_status'] else "Netzwerk/Parser"
+            lines.append(f"⚠️ {name}: {state['error_streak']} Fehler in Folge ({error}), nächster Versuch {state['next_poll_at']}"
+                         f", letzter Erfolg {state['last_success_at'] or 'nie'}")
+        else:
+            lines.append(f"{name}: OK, {state['latency_ms']} ms, {interval}, letzter Erfolg {state['last_success_at']}")
+    return "\n".join(lines)
+
+def _news_rows(articles) -> list:
+    return [(entry_id(entry), entry.get('title'), published.isoformat()) for _, entry, published in articles]
 
 async def fetch_xrdoge_price() -> float:
-    """Fetch the current XRdoge price from CoinGecko API."""
-    url = "https://api.coingecko.com/api/v3/simple/price?ids=xrdoge&vs_currencies=usd"
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, timeout=10.0)
-            response.raise_for_status()
-            data = response.json()
-            price = data.get("xrdoge", {}).get("usd")
-            if price is None:
-                logger.error("XRdoge price not found in API response.")
-                return 0.0
-            return price
-    except Exception as e:
-        logger.error(f"Error fetching XRdoge price: {e}")
-        return 0.0
+    """Aktueller XRdoge-Preis aus dem gemeinsamen Preis-Cache, 0.0 wenn nicht verfügbar."""
+    return await prices.get_price('XRDOGE') or 0.0
 
-async def check_and_post_news(context): # ContextTypes.DEFAULT_TYPE ist hier nicht nötig
-    """Überprüft auf neue Nachrichten und postet sie in die Gruppe."""
-    logger.info("Job 'check_and_post_news' gestartet.")
-    last_check_time = get_last_news_check_time()
+@job_checkpoints.exclusive(NEWS_JOB)
+async def check_and_post_news(context, force: bool = False): # ContextTypes.DEFAULT_TYPE ist hier nicht nötig
+    """Ruft die fälligen Feeds ab (mit force alle) und postet neue Nachrichten in die Gruppe."""
+    states = await db.run(get_news_feed_states, NEWS_FEED_URLS)
+    urls = NEWS_FEED_URLS if force else due_feeds(NEWS_FEED_URLS, states, utc_now())
+    if not urls:
+        return
+    logger.info(f"Job 'check_and_post_news' gestartet, {len(urls)} Feeds fällig.")
+    last_check_time = await get_last_news_check_time()
     current_time = datetime.datetime.now()
 
-    entries = await fetch_and_parse_news(NEWS_FEED_URL)
-    
-    # Sortiere Artikel, um die ältesten zuerst zu verarbeiten (sofern die RSS-Feed-Reihenfolge absteigend ist)
-    entries.sort(key=lambda entry: datetime.datetime(*entry.published_parsed[:6]) if 'published_parsed' in entry and entry.published_parsed else datetime.datetime.min)
-    
-    new_articles_to_post = []
+    # Was nicht neuer als der letzte Abruf des Feeds ist, wird gar nicht erst gelesen
+    results = await fetch_all_feeds(urls, since=last_check_time + datetime.timedelta(seconds=5), states=states)
+    unchanged = sum(1 for result in results if result['status'] == 304)
+    logger.info(f"{len(results)} Feeds abgerufen, {unchanged} unverändert.")
 
-    for entry in entries:
+    candidates = []
+    for source, entry in merge_feed_entries(results):
         try:
-            # Versuche, das Veröffentlichungsdatum zu parsen
-            news_pub_date = None
-            if 'published_parsed' in entry and entry.published_parsed:
-                news_pub_date = datetime.datetime(*entry.published_parsed[:6])
-            elif 'updated_parsed' in entry and entry.updated_parsed:
-                news_pub_date = datetime.datetime(*entry.updated_parsed[:6])
-
-            # Überspringe Artikel ohne gültiges Datum oder Artikel, die älter als der letzte Check sind
-            if not news_pub_date or news_pub_date <= last_check_time + datetime.timedelta(seconds=5): # 5 Sekunden Toleranz
-                continue
+            news_pub_date = entry_published(entry)
 
-            item_id = entry.id if hasattr(entry, 'id') else entry.link
-            if check_if_news_item_sent(item_id): # Prüfe, ob Artikel bereits in DB als gesendet markiert ist
+            # Überspringe Artikel ohne gültiges Datum, ältere hat der Parser schon verworfen
+            if not news_pub_date:
                 continue
-            
-            new_articles_to_post.append(entry)
-
+            candidates.append((source, entry, news_pub_date))
         except Exception as e:
             logger.error(f"Fehler beim Vorsortieren eines News-Eintrags ({entry.get('title', 'N/A')}): {e}")
 
+    # Eine Abfrage für alle Kandidaten statt einer pro Eintrag
+    unsent = await news_store.filter_unsent(entry_id(entry) for _, entry, _ in candidates)
+    new_articles_to_post = [(source, entry, published) for source, entry, published in candidates if entry_id(entry) in unsent]
+
+    posted = True
     if not new_articles_to_post:
         logger.info("Keine neuen News-Artikel gefunden, die gepostet werden müssen.")
     else:
         logger.info(f"Finde {len(new_articles_to_post)} neue Artikel. Poste bis zu {NEWS_MAX_TO_POST_PER_CHECK}.")
-        for entry in new_articles_to_post[:NEWS_MAX_TO_POST_PER_CHECK]:
-            try:
-                item_id = entry.id if hasattr(entry, 'id') else entry.link
+        to_post = new_articles_to_post[:NEWS_MAX_TO_POST_PER_CHECK]
+        try:
+            messages = []
+            for source, entry, _ in to_post:
                 title = getattr(entry, 'title', "Kein Titel verfügbar").strip()
                 link = getattr(entry, 'link', "#").strip()
-                
-                message = f"📰 **Neue News von U.Today**\n\n**{title}**\n\n➡️ [Artikel lesen]({link})"
-                
-                await context.bot.send_message(chat_id=GROUP_CHAT_ID, text=message, parse_mode="Markdown")
-                mark_news_item_as_sent(item_id) # Artikel in DB als gesendet markieren
-                logger.info(f"News gepostet: {title}")
-                await asyncio.sleep(1) # Kurze Pause, um Telegram API Limits nicht zu reißen
-            except Exception as e:
-                logger.error(f"Fehler beim Posten eines News-Eintrags ({entry.get('title', 'N/A')}): {e}", exc_info=True)
-
-    # Post XRdoge price
+                message = f"📰 **Neue News von {source}**\n\n**{title}**\n\n➡️ [Artikel lesen]({link})"
+                messages.append((GROUP_CHAT_ID, 'send_message', {'text': message, 'parse_mode': "Markdown"}))
+            # Bulk über die Sende-Queue, sie hält die Limits für Gruppen ein
+            await outbox.enqueue_bulk_many(messages)
+            # Artikel in einem Batch als gesendet markieren, die übrigen als gesehen
+            await news_store.mark_sent(_news_rows(to_post))
+            await news_store.mark_seen(_news_rows(new_articles_to_post[NEWS_MAX_TO_POST_PER_CHECK:]))
+            logger.info(f"{len(to_post)} News eingereiht: {', '.join(entry.get('title', 'N/A') for _, entry, _ in to_post)}")
+        except Exception as e:
+            logger.error(f"Fehler beim Posten der News-Einträge: {e}", exc_info=True)
+            posted = False
+
+    if not posted:
+        # Feeds mit Artikeln bleiben ungespeichert und liefern sie beim nächsten Lauf erneut,
+        # Fehler und unveränderte Feeds fließen trotzdem in Gesundheit und Zeitplan ein
+        await save_feed_states([result for result in results if not result['entries']], states)
+        logger.warning("News-Check ohne Posten beendet, die Artikel werden beim nächsten Lauf erneut abgerufen.")
+        return
+    await save_feed_states(results, states)
+
+    # Aktualisiere den Zeitpunkt des letzten Checks nur, wenn der aktuelle Check erfolgreich war.
+    # Er dient nur noch als Startpunkt für Feeds, die noch nie erfolgreich abgerufen wurden.
+    await set_last_news_check_time(current_time)
+    logger.info(f"News-Check abgeschlossen. Letzter Check-Zeitpunkt aktualisiert auf: {current_time}.")
+
+@job_checkpoints.exclusive('xrdoge_price', min_interval_seconds=NEWS_CHECK_INTERVAL_SECONDS // 2)
+async def post_xrdoge_price(context):
+    """Postet den aktuellen XRdoge-Preis in die Gruppe, alle NEWS_CHECK_INTERVAL_SECONDS."""
     price = await fetch_xrdoge_price()
     if price > 0:
         price_message = f"🚀 Aktueller XRdoge Preis: ${price:.6f} USD"
         try:
-            await context.bot.send_message(chat_id=GROUP_CHAT_ID, text=price_message)
-            logger.info("XRdoge Preis gepostet.")
+            await outbox.enqueue_bulk('send_message', GROUP_CHAT_ID, text=price_message)
+            logger.info("XRdoge Preis eingereiht.")
         except Exception as e:
             logger.error(f"Fehler beim Posten des XRdoge Preises: {e}")
-
-    # Aktualisiere den Zeitpunkt des letzten Checks nur, wenn der aktuelle Check erfolgreich war.
-    # Wichtig: Wir speichern den Zeitpunkt des Checks, nicht des letzten Artikels, um fehlgeschlagene Abrufe zu handhaben.
-    set_last_news_check_time(current_time)
-    logger.info(f"News-Check abgeschlossen. Letzter Check-Zeitpunkt aktualisiert auf: {current_time}.")
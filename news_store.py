@@ -0,0 +1,78 @@
+import os
+import logging
+from collections import OrderedDict
+
+from async_db import db
+from database import get_sent_news_items, record_news_items
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# NEWS-DEDUPLIZIERUNG: MENGENBASIERT MIT LRU-CACHE
+# =================================================================================
+# Statt einer Abfrage pro Feed-Eintrag prüft der Store alle IDs eines Abrufs mit
+# einer Abfrage und schreibt gesehene bzw. gesendete Artikel in einem Batch.
+# IDs, die schon als gesendet bekannt sind, beantwortet ein LRU-Cache ohne
+# Datenbank. Der Cache ist exakt, anders als ein Bloom-Filter kann er keinen
+# neuen Artikel fälschlich als gesendet melden.
+
+NEWS_SENT_CACHE_SIZE = int(os.environ.get("NEWS_SENT_CACHE_SIZE", 10_000)) # Gemerkte gesendete IDs
+
+
+class NewsStore:
+    """Gesendet-Status von News-Artikeln, mengenbasiert abgefragt und gespeichert."""
+
+    def __init__(self, capacity: int = NEWS_SENT_CACHE_SIZE):
+        self.capacity = capacity
+        self._sent = OrderedDict() # ID -> None, älteste zuerst
+        self.cache_hits = 0
+        self.db_lookups = 0
+        self.db_queries = 0
+
+    def _remember(self, ids):
+        for item_id in ids:
+            self._sent[item_id] = None
+            self._sent.move_to_end(item_id)
+        while len(self._sent) > self.capacity:
+            self._sent.popitem(last=False)
+
+    async def filter_unsent(self, ids) -> set:
+        """Die IDs aus ids, die noch nicht gesendet wurden."""
+        unknown = set()
+        for item_id in set(ids):
+            if item_id in self._sent:
+                self._sent.move_to_end(item_id)
+                self.cache_hits += 1
+            else:
+                unknown.add(item_id)
+        if not unknown:
+            return set()
+        self.db_queries += 1
+        self.db_lookups += len(unknown)
+        sent = await db.run(get_sent_news_items, unknown)
+        self._remember(sent)
+        return unknown - sent
+
+    async def mark_seen(self, items):
+        """items: (id, title, published)-Tupel von Artikeln, die gefunden, aber (noch) nicht gesendet wurden."""
+        if items:
+            await db.run(record_news_items, list(items), False)
+
+    async def mark_sent(self, items):
+        """items: (id, title, published)-Tupel gesendeter Artikel, in einem Batch gespeichert."""
+        if items:
+            items = list(items)
+            await db.run(record_news_items, items, True)
+            self._remember(item[0] for item in items)
+
+    def stats(self) -> dict:
+        return {
+            'cached_ids': len(self._sent),
+            'cache_hits': self.cache_hits,
+            'db_lookups': self.db_lookups,
+            'db_queries': self.db_queries,
+        }
+
+
+# Gemeinsame Instanz für alle Module
+news_store = NewsStore()
@@ -0,0 +1,437 @@
+import os
+import json
+import time
+import heapq
+import asyncio
+import datetime
+import contextvars
+import itertools
+import logging
+from collections import deque
+
+from telegram.error import RetryAfter, Forbidden, BadRequest, TimedOut, NetworkError
+from telegram.ext import BaseRateLimiter
+
+from async_db import db
+from db_pool import connection, transaction
+from job_checkpoints import JOB_OWNER
+from rate_limit import TokenBucket
+from metrics import percentile, sample_window
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# ZENTRALE SENDE-QUEUE FÜR AUSGEHENDE NACHRICHTEN
+# =================================================================================
+# Alle Nachrichten laufen durch einen Dispatcher mit gemeinsamem Token-Bucket.
+# Er nimmt immer den Chat mit der wichtigsten wartenden Nachricht:
+# interaktiv vor transaktional vor Bulk. Pro Chat geht immer nur eine Nachricht
+# gleichzeitig raus, in der Reihenfolge, in der sie eingestellt wurden. Ein
+# Chat übernimmt die beste Priorität seiner wartenden Nachrichten, damit eine
+# Antwort nicht hinter einem Broadcast hängt. Bulk bekommt zusätzlich ein eigenes,
+# kleineres Limit, damit immer Luft für interaktive Antworten bleibt. Bulk ohne
+# Rückgabewert (News, Summaries) wird in SQLite ausgelagert und blockweise
+# nachgeladen, das übersteht auch einen Neustart. Jede Instanz beansprucht die
+# Zeilen, die sie lädt, damit mehrere Instanzen sie nicht doppelt senden.
+# Handler-Antworten (reply_text, edit_message_text, ...) laufen über
+# OutboxRateLimiter als interaktiv durch dieselbe Queue.
+
+INTERACTIVE = 0 # Antworten auf Nutzeraktionen
+TRANSACTIONAL = 1 # Käufe, Verkäufe, Feedback an den Admin
+BULK = 2 # News, Summaries, Broadcasts
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', TRANSACTIONAL: 'transactional', BULK: 'bulk'}
+
+OUTBOX_RATE_PER_SECOND = float(os.environ.get("OUTBOX_RATE_PER_SECOND", 25)) # Etwas unter dem Telegram-Limit von 30/s
+OUTBOX_BURST = int(os.environ.get("OUTBOX_BURST", 5))
+OUTBOX_BULK_RATE_PER_SECOND = float(os.environ.get("OUTBOX_BULK_RATE_PER_SECOND", 20)) # Rest bleibt für interaktive Antworten
+OUTBOX_CONCURRENCY = int(os.environ.get("OUTBOX_CONCURRENCY", 16)) # Gleichzeitige Bot-Aufrufe
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_GROUP_INTERVAL_SECONDS = 3.0 # Gruppen vertragen höchstens 20 Nachrichten pro Minute
+OUTBOX_SPILL_BATCH = 100 # Ausgelagerte Nachrichten, die auf einmal geladen werden
+OUTBOX_IDLE_POLL_SECONDS = 5.0
+OUTBOX_CLAIM_SECONDS = int(os.environ.get("OUTBOX_CLAIM_SECONDS", 15 * 60)) # Danach gilt ein Anspruch als verwaist
+
+# Gesetzt in Zustell-Tasks der Queue, deren Bot-Aufrufe den Rate-Limiter nicht erneut durchlaufen
+_dispatching = contextvars.ContextVar('outbox_dispatching', default=False)
+
+
+def spill_messages(rows) -> int:
+    """Lagert (chat_id, method, kwargs)-Tupel in SQLite aus."""
+    with connection() as conn:
+        conn.executemany('INSERT INTO outbound_messages (chat_id, method, payload) VALUES (?, ?, ?)',
+                         [(chat_id, method, json.dumps(kwargs)) for chat_id, method, kwargs in rows])
+        conn.commit()
+    return len(rows)
+
+
+def claim_spilled_messages(owner: str, limit: int, claim_seconds: int = OUTBOX_CLAIM_SECONDS) -> list:
+    """Beansprucht bis zu limit freie oder verwaiste Nachrichten für owner und gibt sie zurück."""
+    with transaction(immediate=True) as conn:
+        rows = conn.execute('''
+            SELECT id, chat_id, method, payload FROM outbound_messages
+            WHERE claimed_by IS NULL OR claimed_at <= datetime('now', ?)
+            ORDER BY id LIMIT ?
+        ''', (f'-{claim_seconds} seconds', limit)).fetchall()
+        conn.executemany('UPDATE outbound_messages SET claimed_by = ?, claimed_at = CURRENT_TIMESTAMP WHERE id = ?',
+                         [(owner, row[0]) for row in rows])
+    return [(row[0], row[1], row[2], json.loads(row[3])) for row in rows]
+
+
+def refresh_spill_claims(owner: str):
+    """Hält die Ansprüche einer laufenden Instanz frisch, damit sie nicht als verwaist gelten."""
+    with connection() as conn:
+        conn.execute('UPDATE outbound_messages SET claimed_at = CURRENT_TIMESTAMP WHERE claimed_by = ?', (owner,))
+        conn.commit()
+
+
+def release_spill_claims(owner: str):
+    """Gibt nicht zugestellte Nachrichten frei, z.B. beim Stoppen."""
+    with connection() as conn:
+        conn.execute('UPDATE outbound_messages SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?', (owner,))
+        conn.commit()
+
+
+def delete_spilled_message(message_id: int):
+    with connection() as conn:
+        conn.execute('DELETE FROM outbound_messages WHERE id = ?', (message_id,))
+        conn.commit()
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    # retry_after ist je nach PTB-Einstellung int oder timedelta
+    retry_after = error.retry_after
+    if isinstance(retry_after, datetime.timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class _Item:
+    __slots__ = ('chat_id', 'method', 'kwargs', 'priority', 'seq', 'future', 'spill_id', 'attempts', 'enqueued_at')
+
+    def __init__(self, chat_id, method, kwargs, priority, seq, enqueued_at, future=None, spill_id=None):
+        self.chat_id = chat_id
+        self.method = method # Name einer Bot-Methode oder ein fertiger Aufruf ohne Argumente (Rate-Limiter)
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = enqueued_at
+        self.future = future
+        self.spill_id = spill_id
+        self.attempts = 0
+
+
+class OutboundQueue:
+    """Sende-Queue mit Prioritäten, Reihenfolge pro Chat, globalem Ratenlimit und Bulk-Auslagerung in SQLite."""
+
+    def __init__(self, rate: float = OUTBOX_RATE_PER_SECOND, burst: int = OUTBOX_BURST,
+                 bulk_rate: float = OUTBOX_BULK_RATE_PER_SECOND, concurrency: int = OUTBOX_CONCURRENCY,
+                 spill_batch: int = OUTBOX_SPILL_BATCH, owner: str = JOB_OWNER, clock=time.monotonic):
+        self.bucket = TokenBucket(rate, burst)
+        self.bulk_bucket = TokenBucket(bulk_rate, burst)
+        self.concurrency = concurrency
+        self.spill_batch = spill_batch
+        self.owner = owner
+        self._clock = clock
+        self._bot = None
+        self._task = None
+        self._wakeup = None
+        self._slots = None
+        self._seq = itertools.count()
+        self._chats = {} # chat_id -> deque der wartenden Items in Sendereihenfolge
+        self._busy = set() # Chats mit laufendem Versand oder Sperrzeit
+        self._ready = [] # Heap (Priorität, seq, chat_id) der sendebereiten Chats
+        self._chat_keys = {} # chat_id -> gültiger Heap-Eintrag, ältere Einträge sind überholt
+        self._deliveries = set()
+        self._spill_loaded = 0
+        self._spill_dirty = True
+        self._claims_refreshed = 0.0
+        self._wait_ms = {priority: sample_window() for priority in PRIORITY_NAMES}
+        self.queued = {priority: 0 for priority in PRIORITY_NAMES}
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.spilled = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, bot):
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._spill_dirty = True # Reste aus dem letzten Lauf
+        self._task = asyncio.get_running_loop().create_task(self._dispatch())
+        logger.info(f"Sende-Queue gestartet ({self.bucket.rate:.0f}/s, Bulk {self.bulk_bucket.rate:.0f}/s).")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        for delivery in list(self._deliveries):
+            delivery.cancel()
+        await asyncio.gather(*self._deliveries, return_exceptions=True)
+        # Wartende Aufrufer nicht hängen lassen, ausgelagerte Nachrichten bleiben in der DB
+        for items in self._chats.values():
+            for item in items:
+                if item.future is not None and not item.future.done():
+                    item.future.cancel()
+        self._chats.clear()
+        self._busy.clear()
+        self._ready.clear()
+        self._chat_keys.clear()
+        self.queued = {priority: 0 for priority in PRIORITY_NAMES}
+        self._spill_loaded = 0
+        await db.run(release_spill_claims, self.owner) # Sofort für andere Instanzen verfügbar
+
+    async def send(self, method: str, chat_id: int, priority: int = INTERACTIVE, **kwargs):
+        """Stellt einen Bot-Aufruf ein und wartet auf sein Ergebnis, z.B. die gesendete Message.
+
+        Flood-Limits und Netzwerkfehler werden intern wiederholt, Forbidden und BadRequest weitergereicht.
+        """
+        if not self.running:
+            raise RuntimeError("Sende-Queue ist nicht gestartet.")
+        future = asyncio.get_running_loop().create_future()
+        self._push(_Item(chat_id, method, kwargs, priority, next(self._seq), self._clock(), future=future))
+        return await future
+
+    async def send_message(self, chat_id: int, text: str, priority: int = INTERACTIVE, **kwargs):
+        return await self.send('send_message', chat_id, priority, text=text, **kwargs)
+
+    async def submit(self, call, chat_id: int, priority: int = INTERACTIVE):
+        """Wie send, aber für einen fertigen Aufruf call() ohne Argumente (siehe OutboxRateLimiter)."""
+        return await self.send(call, chat_id, priority)
+
+    async def enqueue_bulk(self, method: str, chat_id: int, **kwargs):
+        """Bulk ohne Warten auf die Zustellung. Die Argumente müssen JSON-serialisierbar sein."""
+        await self.enqueue_bulk_many([(chat_id, method, kwargs)])
+
+    async def enqueue_bulk_many(self, rows):
+        await db.run(spill_messages, rows)
+        self.spilled += len(rows)
+        self._spill_dirty = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _push(self, item: _Item, front: bool = False):
+        items = self._chats.get(item.chat_id)
+        if items is None:
+            items = self._chats[item.chat_id] = deque()
+        if front:
+            items.appendleft(item)
+        else:
+            items.append(item)
+        self.queued[item.priority] += 1
+        self._schedule(item.chat_id)
+        self._wakeup.set()
+
+    def _schedule(self, chat_id: int):
+        if chat_id in self._busy or not self._chats.get(chat_id):
+            return
+        items = self._chats[chat_id]
+        # Beste Priorität im Chat, aber der älteste Eintrag geht zuerst raus
+        key = (min(item.priority for item in items), items[0].seq, chat_id)
+        if self._chat_keys.get(chat_id) != key:
+            self._chat_keys[chat_id] = key
+            heapq.heappush(self._ready, key)
+
+    def _peek(self):
+        while self._ready:
+            key = self._ready[0]
+            if self._chat_keys.get(key[2]) == key:
+                return key
+            heapq.heappop(self._ready) # Überholt
+        return None
+
+    def _take(self, chat_id: int) -> _Item:
+        heapq.heappop(self._ready)
+        del self._chat_keys[chat_id]
+        self._busy.add(chat_id)
+        items = self._chats[chat_id]
+        item = items.popleft()
+        if not items:
+            del self._chats[chat_id]
+        self.queued[item.priority] -= 1
+        return item
+
+    def _release(self, chat_id: int, requeue: _Item = None):
+        if self._task is None:
+            return # Gestoppt
+        self._busy.discard(chat_id)
+        if requeue is not None:
+            self._push(requeue, front=True)
+        else:
+            self._schedule(chat_id)
+            self._wakeup.set()
+
+    async def _wait(self, timeout: float):
+        # Kein wait_for: unter 3.11 verschluckt es ein cancel(), wenn das Event gleichzeitig gesetzt wird
+        self._wakeup.clear()
+        timer = asyncio.get_running_loop().call_later(max(timeout, 0.001), self._wakeup.set)
+        try:
+            await self._wakeup.wait()
+        finally:
+            timer.cancel()
+
+    async def _fill_from_spill(self):
+        # Nachladen, wenn die geladenen Bulk-Nachrichten fast abgearbeitet sind
+        if self._spill_loaded and self._clock() - self._claims_refreshed >= OUTBOX_CLAIM_SECONDS / 3:
+            self._claims_refreshed = self._clock()
+            await db.run(refresh_spill_claims, self.owner)
+        if not self._spill_dirty or self._spill_loaded > self.spill_batch // 2:
+            return
+        self._spill_dirty = False
+        self._claims_refreshed = self._clock()
+        rows = await db.run(claim_spilled_messages, self.owner, self.spill_batch)
+        if len(rows) == self.spill_batch:
+            self._spill_dirty = True
+        for spill_id, chat_id, method, kwargs in rows:
+            self._spill_loaded += 1
+            self._push(_Item(chat_id, method, kwargs, BULK, next(self._seq), self._clock(), spill_id=spill_id))
+
+    async def _dispatch(self):
+        while True:
+            try:
+                await self._fill_from_spill()
+                key = self._peek()
+                if key is None:
+                    await self._wait(OUTBOX_IDLE_POLL_SECONDS)
+                    continue
+                if key[0] == BULK and not self.bulk_bucket.try_acquire():
+                    await self._wait(self.bulk_bucket.delay())
+                    continue
+                await self._slots.acquire()
+                await self.bucket.acquire()
+                key = self._peek() # Während des Wartens kann Wichtigeres eingetroffen sein
+                if key is None:
+                    self._slots.release()
+                    continue
+                delivery = asyncio.get_running_loop().create_task(self._deliver(self._take(key[2])))
+                self._deliveries.add(delivery)
+                delivery.add_done_callback(self._deliveries.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Fehler im Dispatcher der Sende-Queue: {e}", exc_info=True)
+                await asyncio.sleep(1)
+
+    async def _deliver(self, item: _Item):
+        _dispatching.set(True) # Eigener Kontext dieses Tasks
+        requeue = None
+        release_after = 0.0
+        try:
+            if item.future is not None and item.future.done():
+                return # Der Aufrufer wartet nicht mehr
+            if item.attempts == 0:
+                self._wait_ms[item.priority].append((self._clock() - item.enqueued_at) * 1000)
+            try:
+                if callable(item.method):
+                    result = await item.method()
+                else:
+                    result = await getattr(self._bot, item.method)(chat_id=item.chat_id, **item.kwargs)
+            except RetryAfter as e:
+                # Flood-Limit: der ganze Bucket pausiert, der Chat bleibt bis dahin belegt
+                release_after = retry_after_seconds(e)
+                self.bucket.penalize(release_after)
+                requeue = self._retry(item, e)
+            except (Forbidden, BadRequest) as e:
+                self._finish(item, error=e)
+            except (TimedOut, NetworkError) as e:
+                release_after = min(30.0, 0.5 * 2 ** item.attempts)
+                requeue = self._retry(item, e)
+            except Exception as e:
+                self._finish(item, error=e)
+            else:
+                self._finish(item, result=result)
+        except asyncio.CancelledError:
+            if item.future is not None:
+                item.future.cancel() # stop() während des Versands
+            raise
+        finally:
+            self._slots.release()
+            if item.chat_id < 0 and requeue is None:
+                release_after = max(release_after, OUTBOX_GROUP_INTERVAL_SECONDS)
+            if release_after > 0:
+                asyncio.get_running_loop().call_later(release_after, self._release, item.chat_id, requeue)
+            else:
+                self._release(item.chat_id, requeue)
+        if item.spill_id is not None and requeue is None:
+            # Zugestellt oder endgültig gescheitert, erst danach aus der Auslagerung löschen
+            await db.run(delete_spilled_message, item.spill_id)
+
+    def _retry(self, item: _Item, error: Exception) -> _Item | None:
+        item.attempts += 1
+        if item.attempts >= OUTBOX_MAX_ATTEMPTS:
+            self._finish(item, error=error)
+            return None
+        self.retries += 1
+        return item
+
+    def _finish(self, item: _Item, result=None, error: Exception = None):
+        if error is None:
+            self.sent += 1
+        else:
+            self.failed += 1
+        if item.spill_id is not None:
+            self._spill_loaded -= 1
+            if error is not None:
+                logger.warning(f"Ausgelagerte Nachricht {item.spill_id} an {item.chat_id} nicht zustellbar: {error}")
+        elif not item.future.done():
+            if error is None:
+                item.future.set_result(result)
+            else:
+                item.future.set_exception(error)
+
+    def stats(self) -> dict:
+        return {
+            'running': self.running,
+            'queued': {PRIORITY_NAMES[priority]: count for priority, count in self.queued.items()},
+            'in_flight': len(self._deliveries),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retries': self.retries,
+            'spilled': self.spilled,
+            'wait_ms_p50': {PRIORITY_NAMES[priority]: percentile(list(samples), 50) for priority, samples in self._wait_ms.items()},
+            'wait_ms_p99': {PRIORITY_NAMES[priority]: percentile(list(samples), 99) for priority, samples in self._wait_ms.items()},
+        }
+
+
+# Gemeinsame Instanz für alle Module
+outbox = OutboundQueue()
+
+
+class OutboxRateLimiter(BaseRateLimiter):
+    """Rate-Limiter der Application: Bot-Aufrufe an einen Chat laufen durch die Sende-Queue.
+
+    Handler antworten weiter mit reply_text & Co., landen damit aber als interaktiv
+    (oder mit rate_limit_args als andere Priorität) in derselben Queue wie Bulk.
+    Aufrufe ohne Chat (getUpdates, answerCallbackQuery, ...) und Aufrufe vor dem
+    Start der Queue gehen direkt raus.
+    """
+
+    def __init__(self, queue: OutboundQueue = outbox):
+        self.queue = queue
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if _dispatching.get() or not self.queue.running or not isinstance(chat_id, int):
+            return await callback(*args, **kwargs)
+        priority = rate_limit_args if rate_limit_args in PRIORITY_NAMES else INTERACTIVE
+        return await self.queue.submit(lambda: callback(*args, **kwargs), chat_id, priority)
+
+
+async def start_outbox(application):
+    """post_init-Callback der Application."""
+    await outbox.start(application.bot)
+
+
+async def stop_outbox(application):
+    """post_shutdown-Callback der Application."""
+    await outbox.stop()
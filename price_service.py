@@ -0,0 +1,196 @@
+import os
+import time
+import asyncio
+import logging
+
+import httpx
+
+from http_client import http
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# KRYPTO-PREISE MIT TTL-CACHE UND REQUEST-COALESCING
+# =================================================================================
+# Alle Preisabfragen (/preis, /kurs, Krypto-Kurse-Button, News-Job) laufen über
+# einen gemeinsamen Cache pro Symbol. Gleichzeitige Fehlgriffe für dasselbe
+# Symbol teilen sich eine Upstream-Anfrage (single-flight). Ein abgelaufener
+# Preis wird noch PRICE_STALE_SECONDS lang ausgeliefert, während im Hintergrund
+# aktualisiert wird (stale-while-revalidate). Fehlgriffe, die innerhalb von
+# PRICE_BATCH_WINDOW_MS eintreffen, werden zu einer Anfrage mit mehreren IDs
+# zusammengefasst (bis PRICE_BATCH_SIZE Symbole pro Anfrage).
+
+PRICE_API_BASE_URL = os.environ.get("PRICE_API_BASE_URL", "https://api.coingecko.com/api/v3")
+PRICE_CACHE_TTL_SECONDS = float(os.environ.get("PRICE_CACHE_TTL_SECONDS", 60))
+PRICE_STALE_SECONDS = float(os.environ.get("PRICE_STALE_SECONDS", 5 * 60))
+PRICE_BATCH_WINDOW_MS = float(os.environ.get("PRICE_BATCH_WINDOW_MS", 5))
+PRICE_BATCH_SIZE = int(os.environ.get("PRICE_BATCH_SIZE", 50)) # IDs pro Upstream-Anfrage
+PRICE_VS_CURRENCY = "usd"
+
+# Ticker-Symbol -> CoinGecko-ID, unbekannte Symbole werden kleingeschrieben als ID versucht
+COINGECKO_IDS = {
+    'BTC': 'bitcoin',
+    'ETH': 'ethereum',
+    'DOGE': 'dogecoin',
+    'XRP': 'ripple',
+    'XRDOGE': 'xrdoge',
+    'LTC': 'litecoin',
+    'SOL': 'solana',
+    'ADA': 'cardano',
+    'BNB': 'binancecoin',
+    'TRX': 'tron',
+    'USDT': 'tether',
+}
+
+
+def coingecko_id(symbol: str) -> str:
+    return COINGECKO_IDS.get(symbol, symbol.lower())
+
+
+class PriceService:
+    """Preis-Cache pro Symbol mit gebündeltem single-flight-Abruf und stale-while-revalidate."""
+
+    def __init__(self, client=http, base_url: str = PRICE_API_BASE_URL, ttl: float = PRICE_CACHE_TTL_SECONDS,
+                 stale: float = PRICE_STALE_SECONDS, clock=time.monotonic,
+                 batch_window_ms: float = PRICE_BATCH_WINDOW_MS, batch_size: int = PRICE_BATCH_SIZE):
+        self._client = client
+        self.base_url = base_url.rstrip('/')
+        self.ttl = ttl
+        self.stale = stale
+        self._clock = clock
+        self.batch_window = batch_window_ms / 1000
+        self.batch_size = batch_size
+        self._cache = {} # Symbol -> (Preis, Abrufzeitpunkt)
+        self._inflight = {} # Symbol -> Future des laufenden oder geplanten Abrufs
+        self._pending = [] # Symbole, die auf das Ende des Bündelungsfensters warten
+        self._flush_handle = None
+        self._tasks = set() # Referenzen auf laufende Abrufe, sonst kann der GC sie einsammeln
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_requests = 0
+        self.upstream_errors = 0
+        self.upstream_symbols = 0
+
+    def _lookup(self, symbol: str):
+        # (True, Preis) bei Treffer oder brauchbarem Stale-Wert, sonst (False, None)
+        entry = self._cache.get(symbol)
+        if entry is not None:
+            age = self._clock() - entry[1]
+            if age < self.ttl:
+                self.hits += 1
+                return True, entry[0]
+            if age < self.ttl + self.stale:
+                # Abgelaufen, aber noch brauchbar: sofort antworten, im Hintergrund aktualisieren
+                self.stale_hits += 1
+                self._refresh(symbol)
+                return True, entry[0]
+        self.misses += 1
+        return False, None
+
+    async def get_price(self, symbol: str) -> float | None:
+        """USD-Preis eines Symbols oder None, wenn er nicht verfügbar ist.
+
+        Fehlgriffe verschiedener Aufrufer innerhalb des Bündelungsfensters teilen sich eine Anfrage.
+        """
+        symbol = symbol.upper()
+        found, price = self._lookup(symbol)
+        if found:
+            return price
+        # shield: bricht ein Wartender ab, läuft der gemeinsame Abruf für die anderen weiter
+        return await asyncio.shield(self._refresh(symbol))
+
+    async def get_prices(self, symbols) -> dict:
+        """USD-Preise mehrerer Symbole mit einer Upstream-Anfrage pro Block, fehlende Preise sind None."""
+        result = {}
+        waiting = {}
+        for symbol in {symbol.upper() for symbol in symbols}:
+            found, price = self._lookup(symbol)
+            if found:
+                result[symbol] = price
+            else:
+                waiting[symbol] = self._refresh(symbol)
+        if self._pending:
+            self._flush() # Die Menge ist bekannt, auf das Fenster zu warten bringt nichts
+        if waiting:
+            values = await asyncio.shield(asyncio.gather(*waiting.values()))
+            result.update(zip(waiting, values))
+        return result
+
+    def _refresh(self, symbol: str) -> asyncio.Future:
+        future = self._inflight.get(symbol)
+        if future is not None:
+            self.coalesced += 1
+            return future
+        loop = asyncio.get_running_loop()
+        future = self._inflight[symbol] = loop.create_future()
+        self._pending.append(symbol)
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        symbols, self._pending = self._pending, []
+        if symbols:
+            task = asyncio.get_running_loop().create_task(self._load_batch(symbols))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _load_batch(self, symbols: list):
+        prices = {}
+        try:
+            chunks = [symbols[i:i + self.batch_size] for i in range(0, len(symbols), self.batch_size)]
+            for chunk_prices in await asyncio.gather(*(self._fetch_upstream(chunk) for chunk in chunks)):
+                prices.update(chunk_prices)
+            fetched_at = self._clock()
+            for symbol, price in prices.items():
+                self._cache[symbol] = (price, fetched_at)
+        finally:
+            for symbol in symbols:
+                future = self._inflight.pop(symbol, None)
+                if future is not None and not future.done():
+                    future.set_result(prices.get(symbol))
+
+    async def _fetch_upstream(self, symbols: list) -> dict:
+        ids = {coingecko_id(symbol): symbol for symbol in symbols}
+        self.upstream_requests += 1
+        self.upstream_symbols += len(ids)
+        try:
+            response = await self._client.get(f"{self.base_url}/simple/price",
+                                              params={'ids': ",".join(ids), 'vs_currencies': PRICE_VS_CURRENCY}, timeout=10.0)
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            self.upstream_errors += 1
+            logger.error(f"Fehler beim Abrufen der Preise für {', '.join(symbols)}: {e}")
+            return {}
+        return {symbol: float(data[coin_id][PRICE_VS_CURRENCY])
+                for coin_id, symbol in ids.items()
+                if PRICE_VS_CURRENCY in data.get(coin_id, {})}
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'cached_symbols': len(self._cache),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'upstream_requests': self.upstream_requests,
+            'upstream_errors': self.upstream_errors,
+            'symbols_per_request': self.upstream_symbols / self.upstream_requests if self.upstream_requests else 0.0,
+            'hit_ratio': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
+
+
+def format_usd(price: float) -> str:
+    # Kleine Preise (Memecoins) brauchen mehr Nachkommastellen
+    return f"{price:,.2f}" if price >= 1 else f"{price:.6f}"
+
+
+# Gemeinsame Instanz für alle Module
+prices = PriceService()
@@ -1,34 +1,31 @@
-import sqlite3
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, CallbackQueryHandler, CommandHandler, filters
 from telegram.constants import ParseMode
+from db_pool import connection
 
 logger = logging.getLogger(__name__)
-DB_NAME = 'scamlingbot.db'
 
 # Conversation states for profile management
 PROFILE_VIEW, PROFILE_EDIT_NAME, PROFILE_EDIT_USERNAME = range(3)
 
 def get_user_profile(user_id: int):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT first_name, last_name, username FROM users WHERE id = ?', (user_id,))
-    profile = cursor.fetchone()
-    conn.close()
-    return profile
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT first_name, last_name, username FROM users WHERE id = ?', (user_id,))
+        profile = cursor.fetchone()
+        return profile
 
 def update_user_profile(user_id: int, first_name: str = None, last_name: str = None, username: str = None):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    if first_name:
-        cursor.execute('UPDATE users SET first_name = ? WHERE id = ?', (first_name, user_id))
-    if last_name:
-        cursor.execute('UPDATE users SET last_name = ? WHERE id = ?', (last_name, user_id))
-    if username:
-        cursor.execute('UPDATE users SET username = ? WHERE id = ?', (username, user_id))
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        if first_name:
+            cursor.execute('UPDATE users SET first_name = ? WHERE id = ?', (first_name, user_id))
+        if last_name:
+            cursor.execute('UPDATE users SET last_name = ? WHERE id = ?', (last_name, user_id))
+        if username:
+            cursor.execute('UPDATE users SET username = ? WHERE id = ?', (username, user_id))
+        conn.commit()
 
 async def profile_view(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
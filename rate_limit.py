@@ -0,0 +1,88 @@
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token-Bucket für asyncio: rate Tokens pro Sekunde, höchstens burst auf Vorrat.
+
+    acquire() wartet, bis ein Token frei ist. Wartende werden in Aufrufreihenfolge bedient.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated_at = clock()
+        self._lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1):
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                delay = (tokens - self._tokens) / self.rate
+                self.waited_seconds += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self._tokens -= tokens
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Nimmt ein Token, wenn sofort eines frei ist, ohne zu warten."""
+        self._refill()
+        if self._lock.locked() or self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        return True
+
+    def delay(self, tokens: float = 1) -> float:
+        """Sekunden, bis tokens Tokens frei sind."""
+        self._refill()
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def penalize(self, seconds: float):
+        """Leert den Bucket für seconds Sekunden, z.B. nach einem RetryAfter des Servers."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+class ThrottledEditor:
+    """Ruft eine edit-Funktion höchstens alle interval Sekunden auf, der letzte Stand geht nie verloren."""
+
+    def __init__(self, edit, interval: float = 1.0, clock=time.monotonic):
+        self._edit = edit
+        self.interval = interval
+        self._clock = clock
+        self._last_edit = None
+        self._pending = None
+        self._last_text = None
+        self.edits = 0
+
+    async def update(self, text: str, final: bool = False):
+        self._pending = text
+        now = self._clock()
+        if final or self._last_edit is None or now - self._last_edit >= self.interval:
+            await self.flush()
+
+    async def flush(self):
+        if self._pending is None:
+            return
+        text, self._pending = self._pending, None
+        if text == self._last_text:
+            return # Telegram lehnt unveränderte Nachrichten ab
+        self._last_text = text
+        self._last_edit = self._clock()
+        self.edits += 1
+        try:
+            await self._edit(text)
+        except Exception as e:
+            # z.B. "Message is not modified" oder ein Flood-Limit, der nächste Stand folgt ohnehin
+            logger.warning(f"Zwischenstand konnte nicht angezeigt werden: {e}")
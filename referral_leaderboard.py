@@ -1,27 +1,24 @@
-import sqlite3
 import logging
+from db_pool import connection
 
 logger = logging.getLogger(__name__)
-DB_NAME = 'scamlingbot.db'
 
 def get_top_referrers(limit=10):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    try:
-        cursor.execute('''
-            SELECT user_id, COUNT(*) as referral_count, SUM(sale_amount) as total_revenue
-            FROM affiliate_sales
-            GROUP BY user_id
-            ORDER BY total_revenue DESC
-            LIMIT ?
-        ''', (limit,))
-        results = cursor.fetchall()
-        return results
-    except Exception as e:
-        logger.error(f"Error fetching top referrers: {e}")
-        return []
-    finally:
-        conn.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                SELECT user_id, COUNT(*) as referral_count, SUM(sale_amount) as total_revenue
+                FROM affiliate_sales
+                GROUP BY user_id
+                ORDER BY total_revenue DESC
+                LIMIT ?
+            ''', (limit,))
+            results = cursor.fetchall()
+            return results
+        except Exception as e:
+            logger.error(f"Error fetching top referrers: {e}")
+            return []
 
 async def referral_leaderboard_handler(update, context):
     top_referrers = get_top_referrers()
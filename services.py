@@ -1,24 +1,33 @@
 import asyncio
 
+from price_service import prices, format_usd
+
+OVERVIEW_SYMBOLS = ('BTC', 'ETH', 'DOGE') # Symbole für den Krypto-Kurse-Button
+
 async def fetch_ethermine_stats(pool_type: str, pool_address: str) -> str:
     # Simulated response for Ethermine stats
     await asyncio.sleep(0.1)
     return f"Simulierte Ethermine Stats für Pool {pool_type} mit Adresse {pool_address}."
 
 async def get_exchange_rate(currency_from: str, currency_to: str) -> str:
-    # Simulated exchange rate
-    await asyncio.sleep(0.1)
-    return f"Simulierter Wechselkurs von {currency_from} zu {currency_to}: 1.23"
+    # Kurs über die USD-Preise beider Symbole, beide kommen aus dem gemeinsamen Preis-Cache
+    quotes = await prices.get_prices({currency_from, currency_to})
+    price_from, price_to = quotes.get(currency_from), quotes.get(currency_to)
+    if not price_from or not price_to:
+        return f"Kein Wechselkurs von {currency_from} zu {currency_to} verfügbar."
+    return f"Wechselkurs: 1 {currency_from} = {format_usd(price_from / price_to)} {currency_to}"
 
 async def fetch_crypto_prices_coingecko() -> str:
-    # Simulated crypto prices
-    await asyncio.sleep(0.1)
-    return "Simulierte Krypto-Preise: BTC 30000 USD, ETH 2000 USD, DOGE 0.05 USD."
+    quotes = await prices.get_prices(OVERVIEW_SYMBOLS)
+    lines = [f"{symbol}: {format_usd(quotes[symbol])} USD" if quotes.get(symbol) else f"{symbol}: nicht verfügbar"
+             for symbol in OVERVIEW_SYMBOLS]
+    return "*Aktuelle Krypto-Preise:*\n" + "\n".join(lines)
 
 async def get_single_crypto_price(symbol: str) -> str:
-    # Simulated single crypto price
-    await asyncio.sleep(0.1)
-    return f"Simulierter Preis für {symbol}: 123.45 USD."
+    price = await prices.get_price(symbol)
+    if price is None:
+        return f"Kein Preis für {symbol} gefunden."
+    return f"Preis für {symbol}: {format_usd(price)} USD."
 
 async def get_weather_info(location: str) -> str:
     # Simulated weather info
@@ -0,0 +1,145 @@
+import os
+import time
+import logging
+import datetime
+from typing import Final
+
+import db_pool
+from async_db import db
+from job_checkpoints import job_checkpoints
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# SQLITE-SPEICHERKONFIGURATION (WAL, PRAGMAS, CHECKPOINTS)
+# =================================================================================
+# Alle Werte lassen sich über Umgebungsvariablen überschreiben.
+
+SQLITE_JOURNAL_MODE: Final[str] = os.environ.get("SQLITE_JOURNAL_MODE", "WAL").upper()
+SQLITE_SYNCHRONOUS: Final[str] = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL").upper() # NORMAL reicht im WAL-Modus
+SQLITE_CACHE_SIZE_KB: Final[int] = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 64 * 1024)) # Page-Cache pro Verbindung
+SQLITE_MMAP_SIZE: Final[int] = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_TEMP_STORE: Final[str] = os.environ.get("SQLITE_TEMP_STORE", "MEMORY").upper()
+SQLITE_WAL_AUTOCHECKPOINT: Final[int] = int(os.environ.get("SQLITE_WAL_AUTOCHECKPOINT", 1000)) # Seiten
+SQLITE_CHECKPOINT_MODE: Final[str] = os.environ.get("SQLITE_CHECKPOINT_MODE", "PASSIVE").upper()
+SQLITE_CHECKPOINT_INTERVAL_SECONDS: Final[int] = int(os.environ.get("SQLITE_CHECKPOINT_INTERVAL_SECONDS", 60 * 5))
+SQLITE_OPTIMIZE_INTERVAL_SECONDS: Final[int] = int(os.environ.get("SQLITE_OPTIMIZE_INTERVAL_SECONDS", 60 * 60))
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+# Ergebnis der letzten Wartungsläufe, für den Admin-Status
+_last_checkpoint = {}
+_last_optimize = {}
+
+
+def connection_pragmas() -> dict:
+    """PRAGMAs, die der Pool auf jeder neuen Verbindung setzt."""
+    pragmas = dict(db_pool.DEFAULT_PRAGMAS)
+    pragmas.update({
+        'synchronous': SQLITE_SYNCHRONOUS,
+        'cache_size': -SQLITE_CACHE_SIZE_KB, # Negativ = Größe in KiB statt in Seiten
+        'mmap_size': SQLITE_MMAP_SIZE,
+        'temp_store': SQLITE_TEMP_STORE,
+        'wal_autocheckpoint': SQLITE_WAL_AUTOCHECKPOINT,
+    })
+    return pragmas
+
+
+def configure_storage(db_path: str = None) -> str:
+    """Konfiguriert den Pool mit den PRAGMAs und stellt den Journal-Modus um.
+
+    Der Journal-Modus WAL wird in der Datenbankdatei gespeichert und muss nur
+    einmal gesetzt werden. Gibt den tatsächlich aktiven Modus zurück.
+    """
+    pool = db_pool.configure_pool(db_path, pragmas=connection_pragmas())
+    with pool.connection() as conn:
+        mode = conn.execute(f'PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}').fetchone()[0]
+    if mode.upper() != SQLITE_JOURNAL_MODE:
+        logger.warning(f"SQLite journal_mode {SQLITE_JOURNAL_MODE} konnte nicht gesetzt werden, aktiv ist: {mode}")
+    else:
+        logger.info(f"SQLite journal_mode: {mode}")
+    return mode
+
+
+def run_checkpoint(mode: str = SQLITE_CHECKPOINT_MODE) -> dict:
+    """Schreibt das WAL in die Datenbankdatei zurück (PRAGMA wal_checkpoint)."""
+    mode = mode.upper()
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f"Unbekannter Checkpoint-Modus: {mode}")
+    started = time.perf_counter()
+    with db_pool.connection() as conn:
+        busy, log_frames, checkpointed = conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+    result = {
+        'mode': mode,
+        'busy': bool(busy),
+        'log_frames': log_frames,
+        'checkpointed_frames': checkpointed,
+        'duration_ms': (time.perf_counter() - started) * 1000,
+        'at': datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+    _last_checkpoint.clear()
+    _last_checkpoint.update(result)
+    return result
+
+
+def run_optimize() -> dict:
+    """Aktualisiert die Statistiken des Query-Planers (PRAGMA optimize)."""
+    started = time.perf_counter()
+    with db_pool.connection() as conn:
+        conn.execute('PRAGMA optimize')
+    result = {
+        'duration_ms': (time.perf_counter() - started) * 1000,
+        'at': datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+    _last_optimize.clear()
+    _last_optimize.update(result)
+    return result
+
+
+async def checkpoint_job(context):
+    """Job für die job_queue: regelmäßiger WAL-Checkpoint."""
+    try:
+        result = await db.run(run_checkpoint)
+        if result['busy']:
+            logger.info(f"WAL-Checkpoint unvollständig (Leser aktiv): {result['checkpointed_frames']}/{result['log_frames']} Frames.")
+    except Exception as e:
+        logger.error(f"Fehler beim WAL-Checkpoint: {e}")
+
+
+async def optimize_job(context):
+    """Job für die job_queue: regelmäßiges PRAGMA optimize."""
+    try:
+        await db.run(run_optimize)
+    except Exception as e:
+        logger.error(f"Fehler bei PRAGMA optimize: {e}")
+
+
+def schedule_storage_jobs(job_queue):
+    # Checkpoint und optimize wirken auf die gemeinsame Datenbankdatei, eine Instanz genügt
+    exclusive = job_checkpoints.exclusive
+    job_queue.run_repeating(exclusive('wal_checkpoint', min_interval_seconds=SQLITE_CHECKPOINT_INTERVAL_SECONDS // 2)(checkpoint_job),
+                            interval=SQLITE_CHECKPOINT_INTERVAL_SECONDS, first=SQLITE_CHECKPOINT_INTERVAL_SECONDS)
+    job_queue.run_repeating(exclusive('sqlite_optimize', min_interval_seconds=SQLITE_OPTIMIZE_INTERVAL_SECONDS // 2)(optimize_job),
+                            interval=SQLITE_OPTIMIZE_INTERVAL_SECONDS, first=SQLITE_OPTIMIZE_INTERVAL_SECONDS)
+
+
+def get_storage_status() -> dict:
+    """Aktuelle Speichereinstellungen und Wartungsergebnisse für den Admin-Status."""
+    with db_pool.connection() as conn:
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        synchronous = conn.execute('PRAGMA synchronous').fetchone()[0]
+        cache_size = conn.execute('PRAGMA cache_size').fetchone()[0]
+        mmap_size = conn.execute('PRAGMA mmap_size').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    wal_path = db_pool.DB_NAME + '-wal'
+    return {
+        'journal_mode': journal_mode,
+        'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA')[synchronous] if 0 <= synchronous <= 3 else synchronous,
+        'cache_size_kb': -cache_size if cache_size < 0 else cache_size * page_size // 1024,
+        'mmap_size': mmap_size,
+        'db_size_kb': page_count * page_size // 1024,
+        'wal_size_kb': os.path.getsize(wal_path) // 1024 if os.path.exists(wal_path) else 0,
+        'last_checkpoint': dict(_last_checkpoint),
+        'last_optimize': dict(_last_optimize),
+    }
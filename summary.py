@@ -2,6 +2,8 @@ import logging
 import datetime
 from database import get_user_internal_balance, get_user_products, get_wallet_transactions, get_affiliate_stats
 from telegram import ParseMode
+from money import format_amount
+from outbox import outbox
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +19,7 @@ async def send_daily_summary(context):
         transaction_count = len(transactions) if transactions else 0
 
         message = f"📅 Dein tägliches Summary für {datetime.date.today()}:\n\n"
-        message += f"💰 Internes Guthaben: {balance:.2f} SCAMCOIN\n"
+        message += f"💰 Internes Guthaben: {format_amount(balance)} SCAMCOIN\n"
         message += f"🛍️ Anzahl deiner Produkte im Marktplatz: {product_count}\n"
         message += f"📜 Letzte {transaction_count} Transaktionen:\n"
         for tx in transactions:
@@ -26,12 +28,12 @@ async def send_daily_summary(context):
             else:
                 amount, tx_type, timestamp, description = tx
                 currency = ""
-            message += f"- {timestamp}: {tx_type} {amount} {currency} - {description}\n"
+            message += f"- {timestamp}: {tx_type} {format_amount(amount)} {currency} - {description}\n"
         message += f"\n📈 Affiliate Statistiken:\n"
         message += f"- Klicks: {affiliate_stats['clicks']}\n"
         message += f"- Verkäufe: {affiliate_stats['sales_count']}\n"
         message += f"- Einnahmen: {affiliate_stats['total_revenue']:.2f} SCAMCOIN\n"
 
-        await context.bot.send_message(chat_id=user_id, text=message, parse_mode=ParseMode.MARKDOWN)
+        await outbox.enqueue_bulk('send_message', user_id, text=message, parse_mode=ParseMode.MARKDOWN)
     except Exception as e:
         logger.error(f"Fehler beim Senden des täglichen Summary an Nutzer {user_id}: {e}")
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_pool
+
+
+@pytest.fixture
+def temp_db(tmp_path):
+    """Frische, migrierte Datenbank in einem temporären Verzeichnis."""
+    import database
+    db_pool.configure_pool(str(tmp_path / 'test.db'))
+    database.init_db()
+    yield db_pool.get_pool()
+    db_pool.close_pool()
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+import pytest
+
+import database
+from async_db import AsyncDatabase
+from metrics import percentile
+
+
+@pytest.fixture
+def facade():
+    facade = AsyncDatabase(database, workers=1, max_queue=2)
+    yield facade
+    facade.shutdown(wait=False)
+
+
+def test_calls_run_on_worker_threads_and_attributes_are_forwarded(temp_db):
+    facade = AsyncDatabase(database, workers=2)
+
+    async def scenario():
+        thread = await facade.run(lambda: threading.current_thread().name)
+        balance = await facade.get_user_internal_balance(database.BOT_OWNER_ID)
+        return thread, balance
+
+    try:
+        thread, balance = asyncio.run(scenario())
+    finally:
+        facade.shutdown()
+    assert thread.startswith("db-worker-")
+    assert balance == 0
+    assert facade.INITIAL_INTERNAL_BALANCE == database.INITIAL_INTERNAL_BALANCE # Konstanten direkt
+
+
+def test_exceptions_propagate_and_are_counted(facade):
+    def broken():
+        raise ValueError("kaputt")
+
+    async def scenario():
+        with pytest.raises(ValueError, match="kaputt"):
+            await facade.run(broken)
+        return await facade.run(lambda x: x * 2, 21)
+
+    assert asyncio.run(scenario()) == 42
+    stats = facade.stats()
+    assert (stats['completed'], stats['failed']) == (1, 1)
+    assert stats['per_query']['broken']['calls'] == 1
+    assert stats['run_ms_p99'] >= stats['run_ms_p50'] >= 0
+
+
+def test_queue_is_bounded_without_blocking_the_loop(facade):
+    release = threading.Event()
+
+    async def scenario():
+        calls = [asyncio.create_task(facade.run(release.wait)) for _ in range(6)]
+        await asyncio.sleep(0.05)
+        # Der Event-Loop läuft weiter, während Aufrufer auf einen Platz warten
+        ticks = 0
+        for _ in range(5):
+            await asyncio.sleep(0)
+            ticks += 1
+        depth = facade.queue_depth()
+        release.set()
+        await asyncio.gather(*calls)
+        return ticks, depth
+
+    ticks, depth = asyncio.run(scenario())
+    assert ticks == 5
+    assert depth <= 2
+    assert facade.stats()['max_queue_depth'] <= 2
+
+
+def test_cancelled_callers_keep_their_slot_until_dequeued(facade):
+    release = threading.Event()
+
+    async def scenario():
+        blocker = asyncio.create_task(facade.run(release.wait)) # Belegt den einzigen Worker
+        await asyncio.sleep(0.02)
+        waiting = [asyncio.create_task(facade.run(lambda: "alt")) for _ in range(2)]
+        await asyncio.sleep(0.02)
+        for task in waiting:
+            task.cancel()
+            await asyncio.sleep(0.01) # Ein freigewordener Platz würde sofort neu vergeben
+        # Die abgebrochenen Items liegen noch in der Queue, neue Aufrufe warten statt queue.Full
+        fresh = [asyncio.create_task(facade.run(lambda: "neu")) for _ in range(3)]
+        await asyncio.sleep(0.02)
+        release.set()
+        return await blocker, await asyncio.gather(*fresh)
+
+    assert asyncio.run(scenario()) == (True, ["neu", "neu", "neu"])
+
+
+def test_percentile():
+    assert percentile([], 99) == 0.0
+    assert percentile(range(1, 101), 50) == 51
+    assert percentile([5, 1, 3], 99) == 5
@@ -0,0 +1,83 @@
+import asyncio
+
+from telegram.error import RetryAfter, Forbidden
+
+import broadcast
+import database
+from outbox import OutboundQueue
+
+
+class FakeBot:
+    def __init__(self, blocked=(), flood_once=(), hang_on=None):
+        self.blocked = set(blocked)
+        self.flood_once = set(flood_once)
+        self.hang_on = hang_on
+        self.delivered = []
+
+    async def send_message(self, chat_id, text):
+        if chat_id == self.hang_on:
+            await asyncio.Event().wait() # Hängt, bis der Broadcast abgebrochen wird
+        if chat_id in self.flood_once:
+            self.flood_once.discard(chat_id)
+            raise RetryAfter(0)
+        if chat_id in self.blocked:
+            raise Forbidden("bot was blocked by the user")
+        self.delivered.append(chat_id)
+
+
+def _add_users(count):
+    for user_id in range(1, count + 1):
+        database.add_user_to_db(user_id, f"user{user_id}")
+
+
+async def _run(bot, broadcast_id, **kwargs):
+    queue = OutboundQueue(rate=10000, burst=100, bulk_rate=10000)
+    await queue.start(bot)
+    try:
+        return await broadcast.BroadcastRun(queue, broadcast.get_broadcast(broadcast_id), **kwargs).run()
+    finally:
+        await queue.stop()
+
+
+def test_broadcast_counts_blocked_and_retries_flood(temp_db):
+    _add_users(30)
+    broadcast_id = broadcast.create_broadcast("Hallo")
+    bot = FakeBot(blocked={3, 17}, flood_once={5, 20})
+    progress = asyncio.run(_run(bot, broadcast_id, concurrency=4, page_size=7))
+    # init_db legt zusätzlich das Owner-Konto an
+    assert sorted(bot.delivered) == [i for i in range(1, 31) if i not in (3, 17)] + [database.BOT_OWNER_ID]
+    assert (progress['sent'], progress['blocked'], progress['failed']) == (29, 2, 0)
+    stored = broadcast.get_broadcast(broadcast_id)
+    assert stored['status'] == 'done'
+    assert stored['last_user_id'] == database.BOT_OWNER_ID
+    assert broadcast.get_running_broadcast_ids() == []
+
+
+def test_interrupted_broadcast_resumes_after_watermark(temp_db):
+    _add_users(10)
+    broadcast_id = broadcast.create_broadcast("Hallo")
+    first = FakeBot(hang_on=6)
+
+    async def interrupt():
+        task = asyncio.create_task(_run(first, broadcast_id, concurrency=1))
+        while len(first.delivered) < 5:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(interrupt())
+    stored = broadcast.get_broadcast(broadcast_id)
+    assert stored['status'] == 'running'
+    assert stored['last_user_id'] == 5
+    assert broadcast.get_running_broadcast_ids() == [broadcast_id]
+
+    second = FakeBot()
+    progress = asyncio.run(_run(second, broadcast_id, concurrency=3))
+    # Niemand bekommt die Nachricht doppelt, niemand geht verloren
+    assert sorted(second.delivered) == [6, 7, 8, 9, 10, database.BOT_OWNER_ID]
+    assert progress['sent'] == 11
+    assert broadcast.get_broadcast(broadcast_id)['status'] == 'done'
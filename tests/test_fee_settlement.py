@@ -0,0 +1,68 @@
+import pytest
+
+import database
+import ledger
+from db_pool import connection
+from money import to_micros
+
+BUYER, SELLER = 1, 2
+
+
+@pytest.fixture
+def sell(temp_db):
+    database.add_user_to_db(BUYER, "buyer")
+    database.add_user_to_db(SELLER, "seller")
+
+    def sell(price):
+        product_id = database.add_product(SELLER, "Guide", "", to_micros(price), "SCAMCOIN", "file", "General")
+        assert database.process_transaction(product_id, BUYER, SELLER, to_micros(price), 0.01)
+    return sell
+
+
+def _watermark():
+    with connection() as conn:
+        return conn.execute('SELECT COALESCE(MAX(last_fee_id), 0) FROM fee_settlements').fetchone()[0]
+
+
+def _ledger_total():
+    with connection() as conn:
+        return conn.execute('SELECT COALESCE(SUM(amount), 0) FROM fee_ledger').fetchone()[0]
+
+
+def test_settlement_advances_the_watermark(sell):
+    sell("10")
+    sell("20")
+    assert database.get_pending_fees() == (to_micros("0.6"), 2)
+    assert database.settle_fees() == to_micros("0.6")
+    first = _watermark()
+    assert first > 0 and database.get_pending_fees() == (0, 0)
+    sell("5")
+    # Nur der neue Eintrag wird abgerechnet
+    assert database.settle_fees() == to_micros("0.1")
+    assert _watermark() > first
+
+
+def test_settling_twice_without_new_fees_changes_nothing(sell):
+    sell("10")
+    database.settle_fees()
+    owner_balance = database.get_user_internal_balance(database.BOT_OWNER_ID)
+    with connection() as conn:
+        settlements = conn.execute('SELECT COUNT(*) FROM fee_settlements').fetchone()[0]
+    assert database.settle_fees() == 0
+    assert database.settle_fees() == 0
+    assert database.get_user_internal_balance(database.BOT_OWNER_ID) == owner_balance
+    with connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM fee_settlements').fetchone()[0] == settlements
+
+
+def test_owner_is_credited_exactly_the_ledger_sum(sell):
+    owner_before = database.get_user_internal_balance(database.BOT_OWNER_ID)
+    for price in ("19.99", "0.07", "3.33"):
+        sell(price)
+    settled = database.settle_fees()
+    sell("1")
+    settled += database.settle_fees()
+    assert settled == _ledger_total()
+    assert database.get_user_internal_balance(database.BOT_OWNER_ID) - owner_before == settled
+    assert ledger.account_balance(ledger.FEES_ACCOUNT) == 0
+    assert database.reconcile_balances()['mismatches'] == []
@@ -0,0 +1,121 @@
+import asyncio
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import database
+import feed_scheduler
+import news_service
+from feed_scheduler import backoff_delay, due_feeds, learn_publish_interval, parse_timestamp, plan_next_poll, poll_interval
+from http_client import http
+
+NOW = datetime.datetime(2023, 1, 2, 12, 0)
+
+
+def _minutes_ago(*minutes):
+    return [NOW - datetime.timedelta(minutes=m) for m in minutes]
+
+
+def test_interval_follows_the_publish_cadence():
+    # Alle 40 Minuten ein Artikel -> alle 20 Minuten abrufen
+    avg, last = learn_publish_interval(None, None, _minutes_ago(120, 80, 40, 0))
+    assert (avg, last) == (40 * 60, NOW)
+    assert poll_interval(avg, last, NOW) == 20 * 60
+    # Ein Artikel pro Minute -> Untergrenze
+    avg, last = learn_publish_interval(None, None, _minutes_ago(3, 2, 1, 0))
+    assert poll_interval(avg, last, NOW) == feed_scheduler.NEWS_MIN_POLL_SECONDS
+    # Unbekannter Takt
+    assert poll_interval(None, None, NOW) == feed_scheduler.NEWS_DEFAULT_POLL_SECONDS
+
+
+def test_cadence_is_smoothed_and_quiet_feeds_are_polled_less():
+    avg, last = learn_publish_interval(40 * 60, NOW - datetime.timedelta(hours=2), [NOW])
+    # Beobachtet 120 Minuten, gleitender Mittelwert bewegt sich nur anteilig dorthin
+    assert avg == pytest.approx(40 * 60 + feed_scheduler.NEWS_CADENCE_SMOOTHING * 80 * 60)
+    # Bereits bekannte Artikel ändern nichts
+    assert learn_publish_interval(avg, last, _minutes_ago(30, 0)) == (avg, last)
+    # Seit zwei Tagen still -> Obergrenze
+    assert poll_interval(40 * 60, NOW, NOW + datetime.timedelta(days=2)) == feed_scheduler.NEWS_MAX_POLL_SECONDS
+
+
+def test_errors_back_off_exponentially_up_to_the_cap():
+    assert [backoff_delay(600, streak) for streak in range(4)] == [600, 1200, 2400, 4800]
+    assert backoff_delay(600, 40) == feed_scheduler.NEWS_MAX_BACKOFF_SECONDS
+    plan = plan_next_poll({'poll_interval_seconds': 600, 'error_streak': 2}, False, [], NOW)
+    assert parse_timestamp(plan['next_poll_at']) == NOW + datetime.timedelta(seconds=4800)
+    assert plan['poll_interval_seconds'] == 600
+
+
+def test_only_due_feeds_are_polled():
+    states = {
+        'https://a.example/rss': {'next_poll_at': '2023-01-02 11:59:00'},
+        'https://b.example/rss': {'next_poll_at': '2023-01-02 12:30:00'},
+    }
+    urls = ['https://a.example/rss', 'https://b.example/rss', 'https://neu.example/rss']
+    assert due_feeds(urls, states, NOW) == ['https://a.example/rss', 'https://neu.example/rss']
+
+
+class _FlakyFeedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failing = True
+
+    def do_GET(self):
+        if _FlakyFeedHandler.failing:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        items = "".join(f"<item><title>Artikel {i}</title><link>https://flaky.example/{i}</link>"
+                        f"<pubDate>Mon, 02 Jan 2023 {10 + i}:00:00 GMT</pubDate></item>" for i in range(3))
+        body = f'<?xml version="1.0"?><rss version="2.0"><channel><title>Flaky</title>{items}</channel></rss>'.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def flaky_feed():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _FlakyFeedHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    _FlakyFeedHandler.failing = True
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/rss"
+    httpd.shutdown()
+
+
+def _fetch(url):
+    async def scenario():
+        try:
+            await news_service.save_feed_states(await news_service.fetch_all_feeds([url]))
+        finally:
+            await http.close()
+        return database.get_news_feed_states([url])[url]
+    return asyncio.run(scenario())
+
+
+def test_health_is_recorded_per_feed(temp_db, flaky_feed):
+    delays = []
+    for _ in range(3):
+        state = _fetch(flaky_feed)
+        delays.append(parse_timestamp(state['next_poll_at']) - parse_timestamp(state['checked_at']))
+    assert state['error_streak'] == 3
+    assert state['last_status'] == 503
+    assert state['last_success_at'] is None
+    # Die Wartezeit verdoppelt sich mit jedem Fehler (Sekundenrundung der Zeitstempel toleriert)
+    assert [round(d.total_seconds() / feed_scheduler.NEWS_DEFAULT_POLL_SECONDS) for d in delays] == [2, 4, 8]
+    assert "3 Fehler in Folge (HTTP 503)" in news_service.format_feed_health({flaky_feed: state}, [flaky_feed])
+
+    _FlakyFeedHandler.failing = False
+    state = _fetch(flaky_feed)
+    assert (state['error_streak'], state['last_status']) == (0, 200)
+    assert state['last_success_at'] is not None and state['latency_ms'] >= 0
+    # Drei Artikel im Stundentakt gelernt
+    assert state['avg_publish_seconds'] == 3600
+    assert state['last_item_at'] == '2023-01-02 12:00:00'
+    assert state['poll_interval_seconds'] == feed_scheduler.NEWS_MAX_POLL_SECONDS # Seitdem lange still
+    assert "OK" in news_service.format_feed_health({flaky_feed: state}, [flaky_feed])
@@ -0,0 +1,99 @@
+import datetime
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from feed_stream import FeedStreamParser, parse_feed_date
+from news_service import entry_id, entry_published
+
+START = datetime.datetime(2023, 1, 1)
+
+
+def _rss_newest_first(count):
+    yield b'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Gro\xc3\x9fer Feed</title>'
+    for i in reversed(range(count)):
+        published = (START + datetime.timedelta(minutes=i)).strftime("%a, %d %b %Y %H:%M:%S GMT")
+        yield (f"<item><title>Artikel {i}</title><link>https://news.example/{i}</link>"
+               f"<guid>https://news.example/{i}</guid><pubDate>{published}</pubDate>"
+               f"<description>{'x' * 500}</description></item>").encode()
+    yield b"</channel></rss>"
+
+
+def _chunks(parts, size=113):
+    # Absichtlich krumme Blockgröße, damit Items über Blockgrenzen hinweg geparst werden
+    buffer = b""
+    for part in parts:
+        buffer += part
+        while len(buffer) >= size:
+            yield buffer[:size]
+            buffer = buffer[size:]
+    if buffer:
+        yield buffer
+
+
+def _consume(parser, parts):
+    read = 0
+    for chunk in _chunks(parts):
+        parser.feed(chunk)
+        read += 1
+        if parser.done:
+            break
+    parser.close()
+    return read
+
+
+def test_keeps_only_the_newest_candidates_in_order():
+    parser = FeedStreamParser(limit=10)
+    largest_channel = 0
+    for chunk in _chunks(_rss_newest_first(5000)):
+        parser.feed(chunk)
+        if len(parser._stack) > 1:
+            largest_channel = max(largest_channel, len(parser._stack[1]))
+    parser.close()
+    entries = parser.entries()
+    # Fertige Items werden aus dem Baum entfernt, der Speicher wächst nicht mit dem Feed
+    assert largest_channel <= 2 # Titel und höchstens ein halbes Item
+    assert parser.items_seen == 5000
+    assert parser.title == "Großer Feed"
+    assert [entry.title for entry in entries] == [f"Artikel {i}" for i in range(4990, 5000)]
+    assert entry_id(entries[0]) == "https://news.example/4990"
+    assert entry_published(entries[-1]) == START + datetime.timedelta(minutes=4999)
+
+
+def test_stops_reading_at_items_older_than_since():
+    since = START + datetime.timedelta(minutes=4980)
+    parser = FeedStreamParser(since=since, limit=50)
+    total_chunks = sum(1 for _ in _chunks(_rss_newest_first(5000)))
+    read = _consume(parser, _rss_newest_first(5000))
+    assert parser.done
+    assert [entry.title for entry in parser.entries()] == [f"Artikel {i}" for i in range(4981, 5000)]
+    assert parser.items_seen == 19 + 3
+    assert read < total_chunks / 100
+
+
+def test_parses_atom_entries():
+    atom = b"""<?xml version="1.0" encoding="utf-8"?>
+    <feed xmlns="http://www.w3.org/2005/Atom"><title>Atom-Feed</title>
+      <entry><title>Eins</title><id>urn:1</id><link rel="alternate" href="https://atom.example/1"/>
+        <updated>2023-01-02T10:00:00+01:00</updated></entry>
+      <entry><title>Zwei</title><id>urn:2</id><link href="https://atom.example/2"/>
+        <published>2023-01-03T10:00:00Z</published></entry>
+    </feed>"""
+    parser = FeedStreamParser()
+    _consume(parser, [atom])
+    entries = parser.entries()
+    assert parser.title == "Atom-Feed"
+    assert [(entry.id, entry.link) for entry in entries] == [("urn:1", "https://atom.example/1"), ("urn:2", "https://atom.example/2")]
+    assert entry_published(entries[0]) == datetime.datetime(2023, 1, 2, 9, 0)
+
+
+def test_truncated_feed_is_a_parse_error():
+    parser = FeedStreamParser()
+    with pytest.raises(ET.ParseError):
+        _consume(parser, [b'<rss><channel><item><title>halb'])
+
+
+def test_parse_feed_date_formats():
+    assert parse_feed_date("Mon, 02 Jan 2023 10:00:00 +0200") == datetime.datetime(2023, 1, 2, 8, 0)
+    assert parse_feed_date("2023-01-02T10:00:00Z") == datetime.datetime(2023, 1, 2, 10, 0)
+    assert parse_feed_date("gestern") is None
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_client import HttpClientManager
+
+
+class _SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-Alive
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with _SlowHandler.lock:
+            _SlowHandler.active += 1
+            _SlowHandler.peak = max(_SlowHandler.peak, _SlowHandler.active)
+        time.sleep(0.05)
+        with _SlowHandler.lock:
+            _SlowHandler.active -= 1
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    _SlowHandler.peak = 0
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+def test_requests_share_connections_and_respect_host_limit(server):
+    manager = HttpClientManager(per_host_limit=3)
+
+    async def scenario():
+        await manager.start()
+        responses = await asyncio.gather(*(manager.get(f"{server}/{i}") for i in range(12)))
+        stats = manager.stats()
+        await manager.close()
+        return responses, stats
+
+    responses, stats = asyncio.run(scenario())
+    assert all(r.status_code == 200 for r in responses)
+    assert _SlowHandler.peak <= 3
+    assert stats['requests'] == 12
+    assert stats['connections'] <= 3 # Wiederverwendet statt pro Anfrage neu aufgebaut
+    assert stats['per_host'][server.removeprefix("http://")]['in_flight'] == 0
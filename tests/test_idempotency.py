@@ -0,0 +1,46 @@
+import time
+
+import database
+import idempotency
+from db_pool import connection
+from money import to_micros
+
+
+def _history_rows():
+    with connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM wallet_transactions').fetchone()[0]
+
+
+def test_replayed_deposit_is_claimed_once(temp_db):
+    database.add_user_to_db(1, "user")
+    key = 'deposit:msg:1:42'
+    assert idempotency.claim_idempotency_key(key) is None
+    assert database.update_user_internal_balance(1, to_micros(5), 'deposit', idempotency_key=key)
+    rows = _history_rows()
+    # Wiederholung bekommt das gespeicherte Ergebnis, der Handler bucht nichts mehr
+    assert idempotency.claim_idempotency_key(key) == idempotency.SUCCEEDED
+    assert _history_rows() == rows
+    assert database.get_user_internal_balance(1) == database.INITIAL_INTERNAL_BALANCE + to_micros(5)
+
+
+def test_concurrent_claims_have_one_winner(temp_db):
+    key = 'buy:cb:1:7:buy_product_confirm_3'
+    assert idempotency.claim_idempotency_key(key) is None
+    assert idempotency.claim_idempotency_key(key) == idempotency.PENDING
+
+
+def test_failed_transfer_releases_key(temp_db):
+    database.add_user_to_db(1, "a")
+    database.add_user_to_db(2, "b")
+    key = 'transfer:msg:1:9'
+    assert idempotency.claim_idempotency_key(key) is None
+    assert not database.transfer_funds(1, 2, database.INITIAL_INTERNAL_BALANCE + 1, idempotency_key=key)
+    assert idempotency.claim_idempotency_key(key) is None # Erneuter Versuch ist erlaubt
+
+
+def test_expired_keys_can_be_claimed_again(temp_db, monkeypatch):
+    key = 'deposit:msg:1:43'
+    assert idempotency.claim_idempotency_key(key) is None
+    monkeypatch.setattr(time, 'time', lambda: 10 ** 12)
+    assert idempotency.purge_expired_idempotency_keys() == 1
+    assert idempotency.claim_idempotency_key(key) is None
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+
+import pytest
+
+from db_pool import connection
+from job_checkpoints import (JOB_SKIPPED, JobCheckpoints, acquire_job_lease, get_job_checkpoints, get_job_cursor,
+                             release_job_lease, save_job_cursor)
+
+
+def test_only_one_owner_holds_the_lease(temp_db):
+    assert acquire_job_lease('news_check', 'a')
+    assert not acquire_job_lease('news_check', 'b')
+    assert not acquire_job_lease('news_check', 'a') # Auch derselbe Prozess startet keinen zweiten Lauf
+    release_job_lease('news_check', 'a')
+    assert acquire_job_lease('news_check', 'b')
+    assert get_job_checkpoints()[0]['lease_owner'] == 'b'
+
+
+def test_expired_lease_can_be_taken_over(temp_db):
+    assert acquire_job_lease('news_check', 'abgestürzt', lease_seconds=0)
+    assert acquire_job_lease('news_check', 'b')
+    # Der alte Halter kann weder den Cursor schreiben noch die neue Lease freigeben
+    assert not save_job_cursor('news_check', '2023-01-01T00:00:00', 'abgestürzt')
+    release_job_lease('news_check', 'abgestürzt')
+    assert get_job_checkpoints()[0]['lease_owner'] == 'b'
+
+
+def test_cursor_is_written_by_the_lease_holder(temp_db):
+    assert get_job_cursor('news_check') is None
+    acquire_job_lease('news_check', 'a')
+    assert save_job_cursor('news_check', '2023-01-02T10:00:00', 'a')
+    release_job_lease('news_check', 'a')
+    assert get_job_cursor('news_check') == '2023-01-02T10:00:00'
+    job = get_job_checkpoints()[0]
+    assert (job['last_status'], job['lease_owner']) == ('ok', None)
+    assert job['last_run_at'] is not None
+
+
+def test_min_interval_prevents_a_second_run_by_another_instance(temp_db):
+    assert acquire_job_lease('xrdoge_price', 'a', min_interval_seconds=900)
+    release_job_lease('xrdoge_price', 'a')
+    assert not acquire_job_lease('xrdoge_price', 'b', min_interval_seconds=900)
+    assert acquire_job_lease('xrdoge_price', 'b', min_interval_seconds=0)
+
+
+def test_concurrent_acquires_have_exactly_one_winner(temp_db):
+    results = []
+    barrier = threading.Barrier(8)
+
+    def contender(owner):
+        barrier.wait()
+        results.append(acquire_job_lease('daily_summary', owner))
+
+    threads = [threading.Thread(target=contender, args=(f"p{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [False] * 7 + [True]
+
+
+def test_exclusive_job_skips_while_another_process_runs_it(temp_db):
+    first, second = JobCheckpoints(owner='a'), JobCheckpoints(owner='b')
+    runs = []
+
+    async def scenario():
+        started, finish = asyncio.Event(), asyncio.Event()
+
+        async def job(context, name):
+            runs.append(name)
+            started.set()
+            await finish.wait()
+            return name
+
+        running = asyncio.create_task(first.exclusive('news_check')(job)(None, 'a'))
+        await started.wait()
+        skipped = await second.exclusive('news_check')(job)(None, 'b')
+        finish.set()
+        return await running, skipped
+
+    assert asyncio.run(scenario()) == ('a', JOB_SKIPPED)
+    assert runs == ['a'] and second.skipped == 1
+    assert get_job_checkpoints()[0]['lease_owner'] is None
+
+
+def test_failed_run_releases_the_lease(temp_db):
+    jobs = JobCheckpoints(owner='a')
+
+    @jobs.exclusive('fee_settlement')
+    async def failing(context):
+        raise RuntimeError("kaputt")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(failing(None))
+    job = get_job_checkpoints()[0]
+    assert (job['last_status'], job['lease_owner']) == ('error', None)
+
+
+def test_job_is_cancelled_when_its_lease_is_taken_over(temp_db):
+    jobs = JobCheckpoints(owner='a', lease_seconds=0.06)
+    progress = []
+
+    @jobs.exclusive('news_check')
+    async def long_job(context):
+        with connection() as conn:
+            # Ein anderer Prozess übernimmt, z.B. weil dieser zu lange hing
+            conn.execute("UPDATE job_checkpoints SET lease_owner = 'b' WHERE job = 'news_check'")
+            conn.commit()
+        for step in range(50):
+            progress.append(step)
+            await asyncio.sleep(0.01)
+        return "fertig"
+
+    assert asyncio.run(long_job(None)) is JOB_SKIPPED
+    assert len(progress) < 50
+    assert get_job_checkpoints()[0]['lease_owner'] == 'b' # Die fremde Lease bleibt unangetastet
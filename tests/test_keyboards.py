@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import keyboards
+from keyboards import KeyboardRegistry
+from localization import LOCALIZATION_DATA, translate
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Eigene Registry mit den echten Buildern, damit der gemeinsame Cache unberührt bleibt
+    registry = KeyboardRegistry()
+    registry._builders = dict(keyboards.KEYBOARDS._builders)
+    registry._templates = dict(keyboards.KEYBOARDS._templates)
+    monkeypatch.setattr(keyboards, 'KEYBOARDS', registry)
+    return registry
+
+
+def _context(lang):
+    return SimpleNamespace(user_data={'lang': lang})
+
+
+def _labels(markup):
+    return [button.text for row in markup.inline_keyboard for button in row]
+
+
+def test_static_keyboards_are_built_once_per_language(registry):
+    async def scenario():
+        return [await keyboards.get_main_menu_keyboard(_context(lang)) for lang in ('de', 'de', 'en', 'de')]
+
+    de, de_again, en, de_third = asyncio.run(scenario())
+    assert de is de_again is de_third
+    assert en is not de
+    assert _labels(de)[0] == translate("menu_earn_money", 'de')
+    assert _labels(en)[0] == translate("menu_earn_money", 'en')
+    assert registry.stats() == {'cached': 2, 'builds': 2, 'hits': 2}
+
+
+def test_product_buyer_template_renders_parameters(registry):
+    async def scenario(lang, product_id, price):
+        return await keyboards.get_product_keyboard(_context(lang), product_id, price=price, currency="SCAMCOIN")
+
+    first = asyncio.run(scenario('de', 5, 1.5))
+    second = asyncio.run(scenario('de', 6, 2.0))
+    assert first is not second # Jeder Aufruf ergibt ein eigenes Markup
+    buy, back = first.inline_keyboard
+    assert buy[0].text == translate("marketplace_buy_button", 'de', price=1.5, currency="SCAMCOIN")
+    assert buy[0].callback_data == "buy_product_confirm_5"
+    assert second.inline_keyboard[0][0].callback_data == "buy_product_confirm_6"
+    # Die Zurück-Zeile stammt aus dem gecachten Template und wird geteilt
+    assert back[0] is second.inline_keyboard[1][0]
+    assert registry.stats()['builds'] == 1
+
+
+def test_not_localized_keyboards_are_shared_across_languages(registry):
+    assert keyboards.get_admin_menu_keyboard() is keyboards.get_admin_menu_keyboard()
+    registry.warm_up(['de', 'en'])
+    # Einmal ohne Sprache statt je Sprache
+    assert ('static', 'admin_menu', None) in registry._cache
+    assert ('static', 'admin_menu', 'de') not in registry._cache
+    assert ('static', 'main_menu', 'de') in registry._cache and ('static', 'main_menu', 'en') in registry._cache
+    assert ('template', 'product_buyer', 'en') in registry._cache
+
+
+def test_warm_up_covers_every_language(registry):
+    registry.warm_up()
+    localized = [name for name, builder in registry._builders.items() if getattr(builder, 'localized', True)]
+    fixed = len(registry._builders) - len(localized)
+    expected = (len(localized) + len(registry._templates)) * len(LOCALIZATION_DATA) + fixed
+    assert registry.stats()['cached'] == expected
+    builds = registry.builds
+    registry.warm_up()
+    assert registry.builds == builds
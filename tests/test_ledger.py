@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+import database
+import ledger
+from db_pool import connection
+from money import to_micros
+
+
+@pytest.fixture
+def marketplace(temp_db):
+    database.add_user_to_db(1, "buyer")
+    database.add_user_to_db(2, "seller")
+    product_id = database.add_product(2, "Guide", "", to_micros("19.99"), "SCAMCOIN", "file", "General")
+    return product_id
+
+
+def _journal_total():
+    with connection() as conn:
+        return conn.execute('SELECT COALESCE(SUM(amount), 0) FROM ledger_entries').fetchone()[0]
+
+
+def test_every_movement_is_a_balanced_posting(marketplace):
+    assert database.process_transaction(marketplace, 1, 2, to_micros("19.99"), 0.01)
+    assert database.transfer_funds(2, 1, to_micros(5))
+    assert database.update_user_internal_balance(1, to_micros(3), 'deposit')
+    assert not database.update_user_internal_balance(2, -to_micros(10 ** 6), 'withdrawal')
+    fees = database.settle_fees()
+    assert fees == 2 * 199_900
+    assert _journal_total() == 0
+    assert ledger.account_balance(ledger.FEES_ACCOUNT) == 0
+    assert ledger.account_balance(ledger.user_account(database.BOT_OWNER_ID)) == fees
+    assert database.reconcile_balances()['mismatches'] == []
+
+
+def test_unbalanced_posting_is_rejected(temp_db):
+    with connection() as conn:
+        with pytest.raises(ValueError):
+            ledger.post_entries(conn.cursor(), 'transfer', [('user:1', -5), ('user:2', 4)])
+
+
+def test_entries_are_append_only(marketplace):
+    with connection() as conn:
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute('UPDATE ledger_entries SET amount = 0')
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute('DELETE FROM ledger_entries')
+        conn.rollback()
+
+
+def test_snapshot_plus_tail_matches_projection(marketplace):
+    database.transfer_funds(1, 2, to_micros(1))
+    assert ledger.snapshot_balances() >= 2
+    assert ledger.snapshot_balances() == 0 # Nichts Neues seit dem letzten Snapshot
+    database.transfer_funds(1, 2, to_micros(2))
+    assert ledger.account_balance('user:1') == database.get_user_internal_balance(1) == to_micros(997)
+    assert ledger.account_balance('user:2') == database.get_user_internal_balance(2) == to_micros(1003)
+    assert database.reconcile_balances()['mismatches'] == []
+
+
+def test_purchase_fee_matches_across_transactions_fee_ledger_and_journal(marketplace):
+    price = to_micros("19.99")
+    assert database.process_transaction(marketplace, 1, 2, price, 0.01)
+    with connection() as conn:
+        amount, fee, seller_fee, total_paid, transaction_id = conn.execute(
+            'SELECT amount, fee_amount, seller_fee_amount, total_paid, id FROM transactions').fetchone()
+        ledger_fee = conn.execute('SELECT amount FROM fee_ledger WHERE transaction_id = ?', (transaction_id,)).fetchone()[0]
+    assert (amount, fee, seller_fee) == (price, 199_900, 199_900)
+    assert total_paid == amount + fee
+    assert ledger_fee == fee + seller_fee
+    assert ledger.account_balance(ledger.FEES_ACCOUNT) == ledger_fee
+    # Käufer zahlt Preis plus Gebühr, Verkäufer erhält Preis minus Gebühr
+    assert database.get_user_internal_balance(1) == to_micros(1000) - total_paid
+    assert database.get_user_internal_balance(2) == to_micros(1000) + amount - seller_fee
+
+
+def test_reconciliation_compares_totals_and_lists_only_differing_accounts(marketplace):
+    database.transfer_funds(1, 2, to_micros(1))
+    ledger.snapshot_balances()
+    database.transfer_funds(2, 1, to_micros(3)) # Nach dem Snapshot, zählt über die neueren Einträge
+    result = database.reconcile_balances()
+    assert result['balance_total'] == result['ledger_total'] and result['mismatches'] == []
+    with connection() as conn:
+        conn.execute('UPDATE users SET internal_balance = internal_balance + 5 WHERE id = 2')
+        conn.commit()
+    result = database.reconcile_balances()
+    assert result['balance_total'] - result['ledger_total'] == 5
+    assert result['mismatches'] == [(2, to_micros(998) + 5, to_micros(998))]
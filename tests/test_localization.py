@@ -0,0 +1,111 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import database
+import localization
+from localization import LOCALIZATION_DATA, CATALOG, CompiledCatalog, LanguageCache, translate
+
+
+def test_catalog_placeholders_match_between_languages():
+    assert CATALOG.issues == []
+
+
+@pytest.mark.parametrize("lang", sorted(LOCALIZATION_DATA))
+def test_compiled_templates_match_str_format(lang):
+    sample = {'name': 'Alice', 'price': 12.5, 'currency': 'SCAMCOIN', 'balance': 3.25, 'needed': 7.0,
+              'amount': 1.5, 'coin': 'Bitcoin', 'percent': 12, 'user': 'Bob', 'text': 'Hallo',
+              'total_users': 1, 'users_with_feedback': 2, 'total_products': 3, 'total_transactions': 4}
+    for key, text in LOCALIZATION_DATA[lang].items():
+        assert translate(key, lang, **sample) == text.format(**sample)
+
+
+def test_unknown_language_and_key_fall_back():
+    assert translate("menu_tools", "fr") == LOCALIZATION_DATA["en"]["menu_tools"]
+    assert translate("does_not_exist", "de") == "UNKNOWN_TEXT_KEY_does_not_exist"
+
+
+def test_templates_with_unusual_placeholders_render_like_str_format():
+    catalog = CompiledCatalog({'en': {
+        'keyword': "{class} kostet {price:.2f} {currency!r}",
+        'index': "{items[0]}!",
+        'braces': "{{wörtlich}} {name}",
+    }})
+    assert catalog.render('en', 'keyword', **{'class': "Kurs", 'price': 2, 'currency': "SC"}) == "Kurs kostet 2.00 'SC'"
+    assert catalog.render('en', 'index', items=["a"]) == "a!"
+    assert catalog.render('en', 'braces', name="x") == "{wörtlich} x"
+    with pytest.raises(KeyError):
+        catalog.render('en', 'keyword', price=1)
+
+
+def test_language_cache_counts_hits_and_misses():
+    cache = LanguageCache(max_size=2)
+    assert cache.get(1) is None
+    cache.set(1, 'de')
+    assert cache.get(1) == 'de'
+    cache.set(2, 'en')
+    cache.set(3, 'es') # Verdrängt den ältesten Eintrag
+    assert cache.get(1) is None
+    assert cache.stats() == {'size': 2, 'hits': 1, 'misses': 2, 'hit_ratio': 1 / 3}
+
+
+def test_language_cache_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(localization.time, 'monotonic', lambda: now[0])
+    cache = LanguageCache(ttl=60)
+    cache.set(1, 'de')
+    now[0] += 59
+    assert cache.get(1) == 'de'
+    now[0] += 2
+    assert cache.get(1) is None
+    assert cache.stats()['size'] == 0
+
+
+@pytest.fixture
+def language_cache(monkeypatch):
+    cache = LanguageCache()
+    monkeypatch.setattr(localization, 'LANGUAGE_CACHE', cache)
+    return cache
+
+
+def _context(user_data=None):
+    return SimpleNamespace(user_data={} if user_data is None else user_data)
+
+
+def test_language_is_loaded_from_the_update_once_and_then_cached(temp_db, language_cache):
+    database.add_user_to_db(7, "nutzer")
+    database.set_user_language(7, 'de')
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=7))
+
+    async def scenario():
+        first, second = _context(), _context()
+        await localization.load_user_language(update, first)
+        await localization.load_user_language(update, second)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.user_data['lang'] == second.user_data['lang'] == 'de'
+    assert (language_cache.misses, language_cache.hits) == (1, 1)
+    assert asyncio.run(localization.T('menu_tools', second)) == LOCALIZATION_DATA['de']['menu_tools']
+
+
+def test_changing_the_language_invalidates_the_cache(temp_db, language_cache):
+    database.add_user_to_db(7, "nutzer")
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=7))
+    context = _context()
+    asyncio.run(localization.load_user_language(update, context))
+    assert context.user_data['lang'] == 'en'
+    database.set_user_language(7, 'es')
+    assert language_cache.stats()['size'] == 0
+    context = _context()
+    asyncio.run(localization.load_user_language(update, context))
+    assert context.user_data['lang'] == 'es'
+
+
+def test_resolve_language_never_queries_the_database(language_cache):
+    # Ohne Datenbank und ohne 'lang' in user_data gilt Englisch
+    assert localization.resolve_language(_context()) == 'en'
+    assert localization.resolve_language(_context({'lang': 'de'})) == 'de'
+    assert localization.resolve_language(_context({'lang': 'xx'})) == 'en'
+    assert language_cache.stats()['misses'] == 0
@@ -0,0 +1,131 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import database
+from db_pool import connection
+
+SELLER = 42
+
+
+@pytest.fixture
+def products(temp_db):
+    database.add_user_to_db(SELLER, "verkaeufer")
+
+    def add(count, created_at="2023-01-01 00:00:00", category="General"):
+        ids = [database.add_product(SELLER, f"Produkt {i}", "", 1_000_000, "SCAMCOIN", "file", category)
+               for i in range(count)]
+        with connection() as conn:
+            # Gleicher Zeitstempel für alle, die Reihenfolge entscheidet dann die ID
+            conn.executemany('UPDATE products SET created_at = ? WHERE id = ?', [(created_at, i) for i in ids])
+            conn.commit()
+        return ids
+    return add
+
+
+def _ids(rows):
+    return [row[0] for row in rows]
+
+
+def _walk_forward(page_size, category=None):
+    pages, after_id = [], None
+    while True:
+        rows, has_prev, has_next = database.get_active_products_page(category, page_size=page_size, after_id=after_id)
+        pages.append((_ids(rows), has_prev, has_next))
+        if not has_next:
+            return pages
+        after_id = rows[-1][0]
+
+
+def test_ties_on_created_at_are_ordered_by_id_without_gaps(products):
+    ids = products(7)
+    pages = _walk_forward(3)
+    assert [page for page, _, _ in pages] == [ids[6:3:-1], ids[3:0:-1], ids[0:1]]
+    # Rückwärts vom ersten Produkt der letzten Seite ergibt wieder die mittlere Seite
+    rows, has_prev, has_next = database.get_active_products_page(page_size=3, before_id=ids[0])
+    assert (_ids(rows), has_prev, has_next) == (ids[3:0:-1], True, True)
+
+
+def test_has_more_is_false_on_an_exactly_full_last_page(products):
+    products(6)
+    assert [(has_prev, has_next) for _, has_prev, has_next in _walk_forward(3)] == [(False, True), (True, False)]
+    rows, has_prev, has_next = database.get_active_products_page(page_size=6)
+    assert (len(rows), has_prev, has_next) == (6, False, False)
+    assert database.get_active_products_page(page_size=3, after_id=_ids(rows)[-1]) == ([], True, False)
+
+
+def test_cursor_of_a_deleted_product_still_pages(products):
+    ids = products(6)
+    database.delete_product(ids[3], SELLER) # Status 'deleted', die Zeile bleibt als Cursor erhalten
+    rows, _, has_next = database.get_active_products_page(page_size=2, after_id=ids[3])
+    assert (_ids(rows), has_next) == ([ids[2], ids[1]], True)
+    with connection() as conn:
+        conn.execute('DELETE FROM products WHERE id = ?', (ids[2],))
+        conn.commit()
+    # Ohne Zeile ist die Position unbekannt, es geht bei der ersten Seite weiter statt mit einer leeren
+    rows, has_prev, has_next = database.get_active_products_page(page_size=2, after_id=ids[2])
+    assert (_ids(rows), has_prev, has_next) == ([ids[5], ids[4]], False, True)
+    rows, has_prev, _ = database.get_active_products_page(page_size=2, before_id=ids[2])
+    assert (_ids(rows), has_prev) == ([ids[5], ids[4]], False)
+
+
+def test_inactive_rows_between_pages_are_skipped(products):
+    ids = products(6)
+    first, _, _ = database.get_active_products_page(page_size=2)
+    with connection() as conn:
+        # Zwischen zwei Seiten werden Produkte verkauft bzw. gelöscht
+        conn.execute("UPDATE products SET status = 'sold' WHERE id = ?", (ids[3],))
+        conn.execute("UPDATE products SET status = 'deleted' WHERE id = ?", (ids[2],))
+        conn.commit()
+    rows, has_prev, has_next = database.get_active_products_page(page_size=2, after_id=_ids(first)[-1])
+    assert (_ids(rows), has_prev, has_next) == ([ids[1], ids[0]], True, False)
+
+
+def test_category_filter_pages_only_that_category(products):
+    general = products(3)
+    products(3, category="Crypto")
+    pages = _walk_forward(2, category="General")
+    assert sum((page for page, _, _ in pages), []) == general[::-1]
+
+
+def _marketplace():
+    try:
+        import marketplace
+    except SyntaxError:
+        pytest.skip("main.py benötigt Python 3.12 (f-String-Syntax)")
+    return marketplace
+
+
+class _Query:
+    def __init__(self, data):
+        self.data = data
+        self.edits = []
+
+    async def answer(self):
+        pass
+
+    async def edit_message_text(self, text, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+def _callbacks(markup):
+    return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+
+def test_page_handlers_render_navigation(products):
+    marketplace = _marketplace()
+    ids = products(marketplace.MARKETPLACE_PAGE_SIZE + 1)
+
+    async def scenario(data):
+        query = _Query(data)
+        await marketplace.list_products_page(SimpleNamespace(callback_query=query), SimpleNamespace(user_data={}))
+        return query.edits[0]
+
+    _, markup = asyncio.run(scenario(f"marketplace_page_next_{ids[-1] + 1}")) # Unbekannter Cursor -> erste Seite
+    assert f"marketplace_page_next_{ids[1]}" in _callbacks(markup)
+    assert not any(data.startswith("marketplace_page_prev_") for data in _callbacks(markup))
+    text, markup = asyncio.run(scenario(f"marketplace_page_next_{ids[1]}"))
+    assert text.count("▪️") == 1
+    assert f"marketplace_page_prev_{ids[0]}" in _callbacks(markup)
+    assert not any(data.startswith("marketplace_page_next_") for data in _callbacks(markup))
@@ -0,0 +1,104 @@
+import pytest
+
+import database
+import db_pool
+import migrations
+from db_pool import connection
+
+# Die häufigsten Abfragen der Datenmodule. Keine davon darf die Tabelle
+# komplett scannen oder für ORDER BY einen temporären B-Tree brauchen.
+HOT_QUERIES = [
+    ('SELECT id, seller_id, name, description, price, currency, file_id, status FROM products WHERE status = "active" ORDER BY created_at DESC', ()),
+    ('SELECT id, seller_id, name, description, price, currency, file_id, status FROM products WHERE status = "active" AND category = ? ORDER BY created_at DESC', ('General',)),
+    ('SELECT id, seller_id, name, description, price, currency, file_id, status FROM products WHERE seller_id = ? ORDER BY created_at DESC', (1,)),
+    ('SELECT id, seller_id, name, description, price, currency, file_id, status FROM products WHERE status = "active" AND category = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?', ('General', '2023-01-01 00:00:00', 1, 11)),
+    ('SELECT id, currency, address FROM wallets WHERE user_id = ?', (1,)),
+    ('SELECT id, pool_type, pool_address FROM pools WHERE user_id = ?', (1,)),
+    ('SELECT username, feedback_text, timestamp FROM feedback ORDER BY timestamp DESC LIMIT 10', ()),
+    ('SELECT COUNT(*) FROM affiliate_clicks WHERE user_id = ?', (1,)),
+    ('SELECT COUNT(*), SUM(sale_amount) FROM affiliate_sales WHERE user_id = ?', (1,)),
+    ('SELECT id, note, created_at FROM user_notes WHERE user_id = ? ORDER BY created_at DESC', (1,)),
+    ('SELECT amount, transaction_type, timestamp, description FROM wallet_transactions WHERE user_id = ? AND currency = ? ORDER BY timestamp DESC', (1, 'BTC')),
+    ('SELECT amount, transaction_type, currency, timestamp, description FROM wallet_transactions WHERE user_id = ? ORDER BY timestamp DESC', (1,)),
+    ('SELECT SUM(amount) FROM ledger_entries WHERE account = ? AND id > ?', ('user:1', 0)),
+]
+
+
+def _plan(sql, params):
+    with connection() as conn:
+        return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+@pytest.mark.parametrize("sql,params", HOT_QUERIES)
+def test_hot_queries_use_an_index(temp_db, sql, params):
+    plan = _plan(sql, params)
+    for step in plan:
+        assert not (step.startswith('SCAN ') and 'USING' not in step), f"Full scan: {step} in {sql}"
+        assert 'TEMP B-TREE' not in step, f"Sortierung ohne Index: {step} in {sql}"
+
+
+def test_migrations_record_version_and_are_idempotent(temp_db):
+    latest = migrations.MIGRATIONS[-1][0]
+    assert migrations.get_schema_version() == latest
+    assert migrations.migrate() == latest
+    with connection() as conn:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == latest
+        assert conn.execute('SELECT COUNT(*) FROM schema_migrations').fetchone()[0] == len(migrations.MIGRATIONS)
+
+
+def test_micro_amount_migration_converts_legacy_balances(tmp_path):
+    db_pool.configure_pool(str(tmp_path / 'legacy.db'))
+    try:
+        migrations.migrate(target=4)
+        with connection() as conn:
+            columns_before = [row[1] for row in conn.execute('PRAGMA table_info(transactions)')]
+            conn.execute('INSERT INTO users (id, username, internal_balance) VALUES (1, "a", 1000.1), (2, "b", 0.3)')
+            conn.execute('INSERT INTO products (seller_id, name, price, currency) VALUES (2, "p", 19.99, "SCAMCOIN")')
+            conn.execute("INSERT INTO wallet_transactions (user_id, currency, amount, transaction_type) VALUES (1, 'SCAMCOIN', 0.1, 'transfer')")
+            conn.commit()
+        migrations.migrate()
+        with connection() as conn:
+            assert conn.execute('SELECT internal_balance FROM users ORDER BY id').fetchall() == [(1000100000,), (300000,)]
+            assert conn.execute('SELECT price FROM products').fetchone()[0] == 19990000
+            assert conn.execute("SELECT typeof(internal_balance) FROM users LIMIT 1").fetchone()[0] == 'integer'
+            # Neuaufbau statt DROP COLUMN: Reihenfolge, Indizes, Trigger und Fremdschlüssel bleiben
+            assert [row[1] for row in conn.execute('PRAGMA table_info(transactions)')][:len(columns_before)] == columns_before
+            assert {'INTEGER'} == {row[2] for row in conn.execute('PRAGMA table_info(transactions)')
+                                   if row[1] in ('amount', 'fee_amount', 'total_paid')}
+            objects = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE tbl_name = 'products'")}
+            assert {'idx_products_status_created', 'products_fts_insert', 'products_fts_update'} <= objects
+            assert not conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '%__micros'").fetchall()
+            assert conn.execute('PRAGMA foreign_key_check').fetchall() == []
+            assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+        assert [row[2] for row in database.search_products("p")[0]] == ["p"]
+        # Die Eröffnungsbuchungen schließen die Lücke zwischen Guthaben und Verlauf
+        assert database.reconcile_balances()['mismatches'] == []
+    finally:
+        db_pool.close_pool()
+
+
+def test_seller_fee_backfill_follows_the_fee_ledger(tmp_path):
+    db_pool.configure_pool(str(tmp_path / 'legacy.db'))
+    try:
+        migrations.migrate(target=13)
+        with connection() as conn:
+            conn.execute('INSERT INTO users (id, username) VALUES (1, "buyer"), (2, "seller")')
+            conn.execute('INSERT INTO products (id, seller_id, name, price, currency) VALUES (1, 2, "p", 10000000, "SCAMCOIN")')
+            conn.executemany('''
+                INSERT INTO transactions (id, product_id, buyer_id, seller_id, amount, fee_amount, total_paid)
+                VALUES (?, 1, 1, 2, 10000000, 100000, 10100000)
+            ''', [(1,), (2,), (3,)])
+            # 1: vor dem fee_ledger, 2: eine Gebühr im fee_ledger, 3: Käufer- und Verkäufergebühr
+            conn.executemany('INSERT INTO fee_ledger (transaction_id, amount) VALUES (?, ?)', [(2, 100000), (3, 200000)])
+            conn.commit()
+        migrations.migrate()
+        with connection() as conn:
+            rows = conn.execute('''
+                SELECT t.id, t.fee_amount, t.seller_fee_amount, COALESCE(SUM(f.amount), 0) FROM transactions t
+                LEFT JOIN fee_ledger f ON f.transaction_id = t.id GROUP BY t.id ORDER BY t.id
+            ''').fetchall()
+        assert [(i, seller_fee) for i, _, seller_fee, _ in rows] == [(1, 0), (2, 0), (3, 100000)]
+        # Wo es einen Eintrag gibt, ergeben beide Anteile zusammen den fee_ledger
+        assert all(fee + seller_fee == ledger for _, fee, seller_fee, ledger in rows if ledger)
+    finally:
+        db_pool.close_pool()
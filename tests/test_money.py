@@ -0,0 +1,28 @@
+import pytest
+
+from money import apply_rate, format_amount, parse_amount, to_micros
+
+
+def test_to_micros_is_exact_for_decimal_inputs():
+    assert to_micros(0.1) + to_micros(0.2) == to_micros(0.3)
+    assert to_micros("19.99") == 19_990_000
+    assert to_micros(5) == 5_000_000
+
+
+@pytest.mark.parametrize("text", ["", "abc", "nan", "inf", "1,2,3"])
+def test_parse_amount_rejects_invalid_input(text):
+    with pytest.raises(ValueError):
+        parse_amount(text)
+
+
+def test_parse_amount_accepts_comma_and_rounds_half_up():
+    assert parse_amount(" 12,5 ") == 12_500_000
+    assert parse_amount("0.0000005") == 1
+
+
+def test_fee_split_is_exact():
+    price = to_micros("19.99")
+    fee = apply_rate(price, 0.01)
+    assert fee == 199_900
+    assert (price + fee) - (price - fee) == 2 * fee
+    assert format_amount(price + fee) == "20.19"
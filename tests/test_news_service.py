@@ -0,0 +1,123 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import database
+import news_service
+from http_client import http
+
+
+def _rss(title, items):
+    body = "".join(f"<item><title>{t}</title><link>{link}</link><guid>{link}</guid><pubDate>{date}</pubDate></item>"
+                   for t, link, date in items)
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>{title}</title>{body}</channel></rss>'.encode()
+
+
+FEEDS = {
+    '/a.xml': _rss("Feed A", [
+        ("A neu", "https://a.example/neu", "Tue, 03 Jan 2023 10:00:00 GMT"),
+        ("A alt", "https://a.example/alt", "Sun, 01 Jan 2023 10:00:00 GMT"),
+    ]),
+    '/b.xml': _rss("Feed B", [
+        ("B mitte", "https://b.example/mitte", "Mon, 02 Jan 2023 10:00:00 GMT"),
+        ("A neu (Kopie)", "https://a.example/neu", "Tue, 03 Jan 2023 10:00:00 GMT"),
+    ]),
+}
+
+
+class _FeedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def do_GET(self):
+        etag = f'"{self.path}-v1"'
+        _FeedHandler.requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = FEEDS[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def feed_server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _FeedHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    _FeedHandler.requests = []
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+def _fetch_all(urls):
+    async def scenario():
+        try:
+            results = await news_service.fetch_all_feeds(urls)
+            await news_service.save_feed_states(results)
+            return results
+        finally:
+            await http.close()
+    return asyncio.run(scenario())
+
+
+def test_feeds_are_merged_deduplicated_and_time_ordered(temp_db, feed_server):
+    results = _fetch_all([f"{feed_server}/a.xml", f"{feed_server}/b.xml"])
+    merged = news_service.merge_feed_entries(results)
+    assert [(source, entry.title) for source, entry in merged] == [
+        ("Feed A", "A alt"), ("Feed B", "B mitte"), ("Feed A", "A neu"),
+    ]
+
+
+def test_second_check_sends_validators_and_skips_unchanged_feeds(temp_db, feed_server):
+    urls = [f"{feed_server}/a.xml", f"{feed_server}/b.xml"]
+    _fetch_all(urls)
+    assert database.get_news_feed_states(urls)[urls[0]]['etag'] == '"/a.xml-v1"'
+    results = _fetch_all(urls)
+    assert [result['status'] for result in results] == [304, 304]
+    assert news_service.merge_feed_entries(results) == []
+    assert sorted(_FeedHandler.requests[2:]) == [('/a.xml', '"/a.xml-v1"'), ('/b.xml', '"/b.xml-v1"')]
+    # Ein 304 darf die gespeicherten Validatoren nicht löschen
+    assert database.get_news_feed_states(urls)[urls[1]]['etag'] == '"/b.xml-v1"'
+
+
+def test_feed_state_is_saved_only_after_posting(temp_db, feed_server, monkeypatch):
+    urls = [f"{feed_server}/a.xml", f"{feed_server}/b.xml"]
+    monkeypatch.setattr(news_service, 'NEWS_FEED_URLS', urls)
+    enqueue = news_service.outbox.enqueue_bulk_many
+
+    async def broken(rows):
+        raise RuntimeError("Queue nicht erreichbar")
+
+    def check():
+        async def scenario():
+            try:
+                await news_service.check_and_post_news(None, force=True)
+            finally:
+                await http.close()
+        asyncio.run(scenario())
+
+    monkeypatch.setattr(news_service.outbox, 'enqueue_bulk_many', broken)
+    check()
+    # Weder Validatoren noch Erfolg noch Cursor, sonst gingen die Artikel verloren
+    assert database.get_news_feed_states(urls) == {}
+    assert asyncio.run(news_service.job_checkpoints.get_cursor(news_service.NEWS_JOB)) is None
+
+    monkeypatch.setattr(news_service.outbox, 'enqueue_bulk_many', enqueue)
+    check()
+    assert all(etag is None for _, etag in _FeedHandler.requests) # Beide Läufe ohne If-None-Match
+    with database.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM outbound_messages').fetchone()[0] == 3
+    assert database.get_news_feed_states(urls)[urls[0]]['etag'] == '"/a.xml-v1"'
+    assert asyncio.run(news_service.job_checkpoints.get_cursor(news_service.NEWS_JOB)) is not None
@@ -0,0 +1,71 @@
+import asyncio
+
+import feedparser
+import pytest
+
+import database
+from news_service import entry_id, entry_published
+from news_store import NewsStore
+
+ENTRY_COUNT = 5000
+
+
+@pytest.fixture
+def large_feed(tmp_path):
+    """Lokaler RSS-Feed mit tausenden Einträgen."""
+    items = "".join(
+        f"<item><title>Artikel {i}</title><link>https://news.example/{i}</link><guid>https://news.example/{i}</guid>"
+        f"<pubDate>Mon, 02 Jan 2023 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d} GMT</pubDate></item>"
+        for i in range(ENTRY_COUNT))
+    path = tmp_path / "feed.xml"
+    path.write_text(f'<?xml version="1.0"?><rss version="2.0"><channel><title>Test</title>{items}</channel></rss>')
+    feed = feedparser.parse(str(path))
+    assert not feed.bozo and len(feed.entries) == ENTRY_COUNT
+    return feed.entries
+
+
+def _rows(entries):
+    return [(entry_id(entry), entry.title, entry_published(entry).isoformat()) for entry in entries]
+
+
+def test_thousands_of_entries_are_checked_with_one_query(temp_db, large_feed):
+    ids = [entry_id(entry) for entry in large_feed]
+
+    async def scenario():
+        store = NewsStore()
+        assert await store.filter_unsent(ids) == set(ids)
+        await store.mark_sent(_rows(large_feed[:2000]))
+        await store.mark_seen(_rows(large_feed[2000:]))
+        first = store.stats()
+
+        cold = NewsStore() # z.B. nach einem Neustart
+        unsent = await cold.filter_unsent(ids)
+        cold_stats = cold.stats()
+        again = await cold.filter_unsent(ids)
+        return first, unsent, cold_stats, again, cold.stats()
+
+    first, unsent, cold_stats, again, warm_stats = asyncio.run(scenario())
+    assert first['db_queries'] == 1
+    assert unsent == set(ids[2000:])
+    assert (cold_stats['db_queries'], cold_stats['cached_ids']) == (1, 2000)
+    # Gesendete IDs beantwortet jetzt der Cache, nur die ungesendeten gehen noch an die DB
+    assert again == unsent
+    assert warm_stats['cache_hits'] == 2000
+    assert warm_stats['db_lookups'] - cold_stats['db_lookups'] == ENTRY_COUNT - 2000
+
+
+def test_sent_state_persists_and_never_reverts(temp_db):
+    database.mark_news_item_as_sent("https://news.example/1")
+    assert database.check_if_news_item_sent("https://news.example/1")
+    database.record_news_items([("https://news.example/1", "Titel", None)], sent=False)
+    assert database.check_if_news_item_sent("https://news.example/1")
+    assert not database.check_if_news_item_sent("https://news.example/2")
+
+
+def test_cache_is_bounded(temp_db):
+    async def scenario():
+        store = NewsStore(capacity=10)
+        await store.mark_sent([(f"id{i}", None, None) for i in range(25)])
+        return store.stats()['cached_ids']
+
+    assert asyncio.run(scenario()) == 10
@@ -0,0 +1,162 @@
+import asyncio
+
+from telegram.error import RetryAfter, Forbidden
+
+import outbox
+from db_pool import connection
+from outbox import OutboundQueue, OutboxRateLimiter, INTERACTIVE, TRANSACTIONAL, BULK
+
+
+class RecordingBot:
+    def __init__(self, flood_once=(), blocked=(), delay=0.0):
+        self.flood_once = set(flood_once)
+        self.blocked = set(blocked)
+        self.delay = delay
+        self.delivered = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.delay)
+        if text in self.flood_once:
+            self.flood_once.discard(text)
+            raise RetryAfter(0)
+        if chat_id in self.blocked:
+            raise Forbidden("bot was blocked by the user")
+        self.delivered.append((chat_id, text))
+        return text
+
+
+def _spilled_rows():
+    with connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM outbound_messages').fetchone()[0]
+
+
+def test_interactive_overtakes_queued_bulk(temp_db):
+    async def scenario():
+        bot = RecordingBot()
+        queue = OutboundQueue(rate=200, burst=1, bulk_rate=200)
+        await queue.start(bot)
+        bulk = [asyncio.create_task(queue.send_message(user_id, "news", BULK)) for user_id in range(1, 41)]
+        await asyncio.sleep(0.02)
+        await queue.send_message(999, "antwort", INTERACTIVE)
+        position = bot.delivered.index((999, "antwort"))
+        await asyncio.gather(*bulk)
+        await queue.stop()
+        return position, len(bot.delivered)
+
+    position, delivered = asyncio.run(scenario())
+    assert delivered == 41
+    assert position < 10 # Wartet nicht hinter allen 40 Bulk-Nachrichten
+
+
+def test_per_chat_order_survives_flood_retry(temp_db, monkeypatch):
+    async def scenario():
+        bot = RecordingBot(flood_once={"m0"}, delay=0.001)
+        queue = OutboundQueue(rate=1000, burst=10, bulk_rate=1000)
+        await queue.start(bot)
+        results = await asyncio.gather(*(queue.send_message(7, f"m{i}", TRANSACTIONAL) for i in range(5)))
+        stats = queue.stats()
+        await queue.stop()
+        return bot, results, stats
+
+    bot, results, stats = asyncio.run(scenario())
+    assert results == [f"m{i}" for i in range(5)]
+    assert [text for _, text in bot.delivered] == [f"m{i}" for i in range(5)]
+    assert stats['retries'] == 1
+
+
+def test_spilled_bulk_is_delivered_after_restart(temp_db):
+    async def enqueue():
+        # Queue läuft nicht, z.B. vor einem Neustart: die Nachrichten liegen nur in SQLite
+        queue = OutboundQueue()
+        await queue.enqueue_bulk_many([(user_id, 'send_message', {'text': f"summary {user_id}"}) for user_id in range(1, 6)])
+
+    async def deliver():
+        bot = RecordingBot(blocked={3})
+        queue = OutboundQueue(rate=1000, burst=10, bulk_rate=1000, spill_batch=2)
+        await queue.start(bot)
+        for _ in range(200):
+            if _spilled_rows() == 0:
+                break
+            await asyncio.sleep(0.01)
+        stats = queue.stats()
+        await queue.stop()
+        return bot, stats
+
+    asyncio.run(enqueue())
+    assert _spilled_rows() == 5
+    bot, stats = asyncio.run(deliver())
+    assert sorted(bot.delivered) == [(1, "summary 1"), (2, "summary 2"), (4, "summary 4"), (5, "summary 5")]
+    assert (stats['sent'], stats['failed']) == (4, 1)
+    assert _spilled_rows() == 0 # Auch die nicht zustellbare Nachricht ist weg
+
+
+def test_handler_replies_go_through_the_queue_as_interactive(temp_db):
+    async def scenario():
+        bot = RecordingBot()
+        queue = OutboundQueue(rate=200, burst=1, bulk_rate=200)
+        limiter = OutboxRateLimiter(queue)
+        await queue.start(bot)
+        bulk = [asyncio.create_task(queue.send_message(user_id, "news", BULK)) for user_id in range(1, 41)]
+        await asyncio.sleep(0.02)
+
+        async def reply(text):
+            # So ruft PTB den eigentlichen HTTP-Request auf, z.B. für update.message.reply_text
+            bot.delivered.append((999, text))
+            return {'ok': True}
+
+        result = await limiter.process_request(reply, ("antwort",), {}, 'sendMessage', {'chat_id': 999, 'text': "antwort"}, None)
+        position = bot.delivered.index((999, "antwort"))
+        # Ohne Chat (z.B. answerCallbackQuery) geht der Aufruf direkt raus
+        direct = await limiter.process_request(reply, ("callback",), {}, 'answerCallbackQuery', {'callback_query_id': "1"}, None)
+        await asyncio.gather(*bulk)
+        stats = queue.stats()
+        await queue.stop()
+        return result, position, direct, stats
+
+    result, position, direct, stats = asyncio.run(scenario())
+    assert result == direct == {'ok': True}
+    assert position < 10
+    assert stats['sent'] == 41 # 40 Bulk + die Antwort, der direkte Aufruf zählt nicht
+
+
+def test_spilled_rows_are_sent_by_only_one_instance(temp_db):
+    async def scenario():
+        bots = [RecordingBot(delay=0.001), RecordingBot(delay=0.001)]
+        queues = [OutboundQueue(rate=1000, burst=10, bulk_rate=1000, spill_batch=4, owner=owner) for owner in ("a", "b")]
+        await queues[0].enqueue_bulk_many([(user_id, 'send_message', {'text': f"news {user_id}"}) for user_id in range(1, 21)])
+        for queue, bot in zip(queues, bots):
+            await queue.start(bot)
+        for _ in range(300):
+            if _spilled_rows() == 0:
+                break
+            await asyncio.sleep(0.01)
+        for queue in queues:
+            await queue.stop()
+        return bots
+
+    bots = asyncio.run(scenario())
+    delivered = bots[0].delivered + bots[1].delivered
+    assert sorted(delivered) == [(user_id, f"news {user_id}") for user_id in range(1, 21)]
+
+
+def test_stop_releases_claims_for_other_instances(temp_db):
+    async def scenario():
+        queue = OutboundQueue(owner="a")
+        await queue.enqueue_bulk_many([(1, 'send_message', {'text': "x"})])
+        assert len(await outbox.db.run(outbox.claim_spilled_messages, "a", 10)) == 1
+        assert await outbox.db.run(outbox.claim_spilled_messages, "b", 10) == []
+        await outbox.db.run(outbox.release_spill_claims, "a")
+        return await outbox.db.run(outbox.claim_spilled_messages, "b", 10)
+
+    assert [row[3] for row in asyncio.run(scenario())] == [{'text': "x"}]
+
+
+def test_send_requires_started_queue():
+    async def scenario():
+        try:
+            await OutboundQueue().send_message(1, "x")
+        except RuntimeError:
+            return True
+        return False
+
+    assert asyncio.run(scenario())
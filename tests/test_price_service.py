@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from http_client import HttpClientManager
+from price_service import PriceService
+
+FAKE_PRICES = {'bitcoin': 30000.0, 'ethereum': 2000.0, 'dogecoin': 0.05}
+
+
+class _FakePriceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    calls = []
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        ids = query['ids'][0].split(',')
+        _FakePriceHandler.calls.append(ids)
+        time.sleep(0.05) # Langsamer Upstream, damit sich gleichzeitige Anfragen überlappen
+        body = json.dumps({i: {'usd': FAKE_PRICES[i]} for i in ids if i in FAKE_PRICES}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def price_server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _FakePriceHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    _FakePriceHandler.calls = []
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _run(service, coro_fn):
+    async def scenario():
+        try:
+            return await coro_fn()
+        finally:
+            await service._client.close()
+    return asyncio.run(scenario())
+
+
+def test_concurrent_misses_share_one_request(price_server):
+    service = PriceService(client=HttpClientManager(), base_url=price_server, ttl=60, stale=60)
+    results = _run(service, lambda: asyncio.gather(*(service.get_price('btc') for _ in range(50))))
+    assert results == [30000.0] * 50
+    assert len(_FakePriceHandler.calls) == 1
+    assert service.stats()['coalesced'] == 49
+
+
+def test_stale_value_is_served_while_revalidating(price_server):
+    clock = _Clock()
+    service = PriceService(client=HttpClientManager(), base_url=price_server, ttl=10, stale=30, clock=clock)
+
+    async def scenario():
+        assert await service.get_price('ETH') == 2000.0
+        assert await service.get_price('ETH') == 2000.0 # Treffer
+        clock.now = 15 # Abgelaufen, aber im Stale-Fenster
+        FAKE_PRICES['ethereum'] = 2100.0
+        assert await service.get_price('ETH') == 2000.0
+        await asyncio.gather(*service._inflight.values())
+        assert await service.get_price('ETH') == 2100.0
+        clock.now = 100 # Außerhalb des Stale-Fensters: warten auf frischen Wert
+        return await service.get_price('ETH')
+
+    try:
+        assert _run(service, scenario) == 2100.0
+    finally:
+        FAKE_PRICES['ethereum'] = 2000.0
+    stats = service.stats()
+    assert (stats['hits'], stats['stale_hits'], stats['misses']) == (2, 1, 2)
+    assert stats['upstream_requests'] == 3
+    assert stats['hit_ratio'] == pytest.approx(3 / 5)
+
+
+def test_unknown_symbol_and_upstream_errors_return_none():
+    service = PriceService(client=HttpClientManager(), base_url="http://127.0.0.1:9", ttl=60, stale=60)
+    assert _run(service, lambda: service.get_price('BTC')) is None
+    assert service.stats()['upstream_errors'] == 1
+
+
+def test_misses_within_window_are_batched(price_server):
+    service = PriceService(client=HttpClientManager(), base_url=price_server, ttl=60, stale=60, batch_window_ms=20)
+
+    async def scenario():
+        singles = await asyncio.gather(service.get_price('BTC'), service.get_price('ETH'), service.get_price('DOGE'))
+        cached = await service.get_prices(['btc', 'eth'])
+        return singles, cached
+
+    singles, cached = _run(service, scenario)
+    assert singles == [30000.0, 2000.0, 0.05]
+    assert cached == {'BTC': 30000.0, 'ETH': 2000.0}
+    assert len(_FakePriceHandler.calls) == 1
+    assert sorted(_FakePriceHandler.calls[0]) == ['bitcoin', 'dogecoin', 'ethereum']
+
+
+def test_get_prices_chunks_and_reports_missing(price_server):
+    service = PriceService(client=HttpClientManager(), base_url=price_server, ttl=60, stale=60, batch_size=2)
+    result = _run(service, lambda: service.get_prices({'BTC', 'ETH', 'DOGE', 'NOPE'}))
+    assert result == {'BTC': 30000.0, 'ETH': 2000.0, 'DOGE': 0.05, 'NOPE': None}
+    assert len(_FakePriceHandler.calls) == 2
+    assert service.stats()['symbols_per_request'] == 2.0
@@ -0,0 +1,127 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import database
+from db_pool import connection
+
+SELLER = 42
+
+
+@pytest.fixture
+def products(temp_db):
+    database.add_user_to_db(SELLER, "verkaeufer")
+
+    def add(name, description="", category="General"):
+        return database.add_product(SELLER, name, description, 1_000_000, "SCAMCOIN", "file", category)
+    return add
+
+
+def _names(rows):
+    return [row[2] for row in rows]
+
+
+def test_prefix_and_phrase_matching(products):
+    products("Bitcoin Guide", "Einstieg in Bitcoin")
+    products("Rote Kerze", "Chart mit roter Kerze")
+    products("Kerze rot", "Dekoration")
+    assert _names(database.search_products("bitc")[0]) == ["Bitcoin Guide"] # Angefangenes letztes Wort
+    assert sorted(_names(database.search_products("kerze")[0])) == ["Kerze rot", "Rote Kerze"]
+    # In Anführungszeichen nur die Wortfolge
+    assert _names(database.search_products('"rote kerze"')[0]) == ["Rote Kerze"]
+    # FTS5-Syntax in der Eingabe wird nicht interpretiert
+    assert database.search_products('name: OR "') == ([], False)
+
+
+def test_name_matches_rank_above_description_matches_regardless_of_age(products):
+    old = products("Solana Handbuch", "Alles über Solana")
+    for i in range(400):
+        products(f"Produkt {i}", "erwähnt solana am Rande")
+    rows, has_next = database.search_products("solana", page_size=5)
+    # Ein älterer, relevanterer Treffer fällt nicht aus einem Fenster der neuesten Treffer
+    assert rows[0][0] == old
+    assert has_next
+
+
+def test_inactive_products_are_excluded(products):
+    sold = products("Ledger Anleitung")
+    products("Ledger Backup")
+    database.delete_product(sold, SELLER)
+    with connection() as conn:
+        conn.execute("UPDATE products SET status = 'sold' WHERE name = 'Ledger Backup'")
+        conn.commit()
+    assert database.search_products("ledger") == ([], False)
+
+
+def test_pagination_returns_each_match_once(products):
+    ids = {products(f"Wallet {i}", "gleich relevant") for i in range(23)}
+    seen, offset, pages = [], 0, 0
+    while True:
+        rows, has_next = database.search_products("wallet", page_size=10, offset=offset)
+        seen += [row[0] for row in rows]
+        pages += 1
+        if not has_next:
+            break
+        offset += 10
+    assert pages == 3
+    assert len(seen) == len(set(seen)) and set(seen) == ids
+
+
+def test_index_follows_updates_and_deletes(products):
+    product_id = products("Altcoin Report")
+    with connection() as conn:
+        conn.execute("UPDATE products SET name = 'Memecoin Report' WHERE id = ?", (product_id,))
+        conn.commit()
+    assert database.search_products("altcoin") == ([], False)
+    assert _names(database.search_products("memecoin")[0]) == ["Memecoin Report"]
+    with connection() as conn:
+        conn.execute("DELETE FROM products WHERE id = ?", (product_id,))
+        conn.commit()
+    assert database.search_products("memecoin") == ([], False)
+    with connection() as conn:
+        # Der External-Content-Index ist nach den Triggern konsistent
+        conn.execute("INSERT INTO products_fts (products_fts) VALUES ('integrity-check')")
+
+
+def _marketplace():
+    try:
+        import marketplace
+    except SyntaxError:
+        pytest.skip("main.py benötigt Python 3.12 (f-String-Syntax)")
+    return marketplace
+
+
+class _Recorder:
+    def __init__(self):
+        self.calls = []
+
+    async def reply_text(self, text, reply_markup=None):
+        self.calls.append((text, reply_markup))
+
+    async def answer(self, results, **kwargs):
+        self.calls.append((results, kwargs))
+
+
+def test_search_command_and_inline_mode(products):
+    marketplace = _marketplace()
+    for i in range(marketplace.MARKETPLACE_PAGE_SIZE + 1):
+        products(f"Trading Kurs {i}")
+
+    async def scenario():
+        message = _Recorder()
+        update = SimpleNamespace(message=message, callback_query=None)
+        context = SimpleNamespace(args=["trading"], user_data={})
+        await marketplace.search_command(update, context)
+        inline = _Recorder()
+        inline.query, inline.offset = "trading", ""
+        await marketplace.inline_search(SimpleNamespace(inline_query=inline), SimpleNamespace())
+        return message.calls, inline.calls
+
+    message_calls, inline_calls = asyncio.run(scenario())
+    text, markup = message_calls[0]
+    assert text.startswith('Suchergebnisse für "trading"')
+    callbacks = [button.callback_data for row in markup.inline_keyboard for button in row]
+    assert f"marketplace_search_{marketplace.MARKETPLACE_PAGE_SIZE}" in callbacks
+    results, kwargs = inline_calls[0]
+    assert len(results) == min(marketplace.INLINE_SEARCH_PAGE_SIZE, marketplace.MARKETPLACE_PAGE_SIZE + 1)
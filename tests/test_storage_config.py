@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+import database
+import db_pool
+import storage_config
+
+PRAGMAS = ('journal_mode', 'synchronous', 'busy_timeout', 'foreign_keys', 'cache_size', 'temp_store')
+
+
+@pytest.fixture
+def storage(tmp_path):
+    mode = storage_config.configure_storage(str(tmp_path / 'storage.db'))
+    database.init_db()
+    yield mode
+    db_pool.close_pool()
+
+
+def _pragmas(conn):
+    return {name: conn.execute(f'PRAGMA {name}').fetchone()[0] for name in PRAGMAS}
+
+
+def test_pooled_connections_use_the_configured_pragmas(storage):
+    assert storage.upper() == 'WAL'
+    seen = []
+    held = threading.Event()
+    done = threading.Event()
+
+    def second_connection():
+        # Eigener Thread, damit der Pool eine zweite Verbindung öffnet statt die erste wiederzuverwenden
+        with db_pool.connection() as conn:
+            seen.append((id(conn), _pragmas(conn)))
+            held.set()
+            done.wait(5)
+
+    thread = threading.Thread(target=second_connection)
+    thread.start()
+    held.wait(5)
+    with db_pool.connection() as conn:
+        seen.append((id(conn), _pragmas(conn)))
+    done.set()
+    thread.join()
+
+    assert seen[0][0] != seen[1][0]
+    for _, pragmas in seen:
+        assert pragmas == {
+            'journal_mode': 'wal',
+            'synchronous': 1, # NORMAL
+            'busy_timeout': db_pool.BUSY_TIMEOUT_MS,
+            'foreign_keys': 1,
+            'cache_size': -storage_config.SQLITE_CACHE_SIZE_KB,
+            'temp_store': 2, # MEMORY
+        }
+
+
+def test_checkpoint_reports_the_wal_state(storage):
+    database.add_user_to_db(7, "nutzer")
+    result = storage_config.run_checkpoint('TRUNCATE')
+    assert result['mode'] == 'TRUNCATE' and not result['busy']
+    status = storage_config.get_storage_status()
+    assert status['journal_mode'] == 'wal'
+    assert status['last_checkpoint']['mode'] == 'TRUNCATE'
+    with pytest.raises(ValueError):
+        storage_config.run_checkpoint('SOFORT')
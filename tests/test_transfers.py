@@ -0,0 +1,87 @@
+import random
+import threading
+
+import pytest
+
+import database
+from db_pool import connection
+from money import to_micros
+
+USERS = 10
+START_BALANCE = to_micros(100)
+
+
+@pytest.fixture
+def funded_users(temp_db):
+    for user_id in range(1, USERS + 1):
+        database.add_user_to_db(user_id, f"user{user_id}")
+        # Über die normale Buchung, damit Guthaben und Verlauf zusammenpassen
+        database.update_user_internal_balance(user_id, START_BALANCE - database.INITIAL_INTERNAL_BALANCE)
+    with connection() as conn:
+        # Protokolliert jeden Versuch, ein Guthaben negativ zu schreiben, auch wenn er später zurückgerollt würde
+        conn.execute('CREATE TABLE negative_balances (user_id INTEGER, balance INTEGER)')
+        conn.execute('''
+            CREATE TRIGGER guard_negative_balance AFTER UPDATE OF internal_balance ON users
+            WHEN new.internal_balance < 0 BEGIN
+                INSERT INTO negative_balances VALUES (new.id, new.internal_balance);
+            END
+        ''')
+        conn.commit()
+    return list(range(1, USERS + 1))
+
+
+def _total_balance(user_ids):
+    with connection() as conn:
+        return conn.execute(f'SELECT SUM(internal_balance) FROM users WHERE id IN ({",".join("?" * len(user_ids))})',
+                            user_ids).fetchone()[0]
+
+
+def test_transfer_moves_funds_and_writes_history(funded_users):
+    assert database.transfer_funds(1, 2, to_micros(30))
+    assert not database.transfer_funds(1, 2, to_micros(80)) # Nur noch 70 übrig
+    assert not database.transfer_funds(1, 1, to_micros(5))
+    assert not database.transfer_funds(1, 999, to_micros(5)) # Unbekannter Empfänger
+    assert database.get_user_internal_balance(1) == to_micros(70)
+    assert database.get_user_internal_balance(2) == to_micros(130)
+    with connection() as conn:
+        rows = conn.execute("SELECT user_id, amount FROM wallet_transactions WHERE transaction_type = 'transfer' ORDER BY id").fetchall()
+    assert rows == [(1, -to_micros(30)), (2, to_micros(30))]
+
+
+def test_batch_isolates_failed_transfers(funded_users):
+    results = database.transfer_batch([(1, 2, to_micros(60)), (1, 3, to_micros(60)), (3, 1, to_micros(10)), (4, 999, to_micros(1))])
+    assert results == [True, False, True, False]
+    assert database.get_user_internal_balance(1) == to_micros(50)
+    assert _total_balance(funded_users) == USERS * START_BALANCE
+    assert database.reconcile_balances()['mismatches'] == []
+
+
+def test_concurrent_transfers_never_overdraw(funded_users):
+    threads = 8
+    rounds = 200
+    successes = [0] * threads
+
+    def worker(index):
+        rng = random.Random(index)
+        for _ in range(rounds):
+            if rng.random() < 0.3:
+                batch = [(rng.choice(funded_users), rng.choice(funded_users), to_micros(rng.randint(1, 60))) for _ in range(5)]
+                successes[index] += sum(database.transfer_batch(batch))
+            else:
+                sender, receiver = rng.sample(funded_users, 2)
+                successes[index] += database.transfer_funds(sender, receiver, to_micros(rng.randint(1, 60)))
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    with connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM negative_balances').fetchone()[0] == 0
+        assert conn.execute('SELECT MIN(internal_balance) FROM users WHERE id BETWEEN 1 AND ?', (USERS,)).fetchone()[0] >= 0
+        history_rows = conn.execute("SELECT COUNT(*) FROM wallet_transactions WHERE transaction_type = 'transfer'").fetchone()[0]
+    assert sum(successes) > 0
+    assert history_rows == 2 * sum(successes)
+    assert _total_balance(funded_users) == USERS * START_BALANCE
+    assert database.reconcile_balances()['mismatches'] == []
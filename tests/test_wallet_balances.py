@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import pytest
+
+import wallet_balances
+from rate_limit import TokenBucket, ThrottledEditor
+from wallet_balances import stream_wallet_balances
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    calls = []
+
+    async def fetch(currency, address):
+        calls.append(time.monotonic())
+        await asyncio.sleep(0.1 if address != "slow" else 0.3)
+        if address == "broken":
+            raise RuntimeError("Upstream kaputt")
+        return f"{address} ok"
+
+    monkeypatch.setitem(wallet_balances.PROVIDERS, 'blockchair', (fetch, 1000, 1000))
+    monkeypatch.setitem(wallet_balances._provider_buckets, 'blockchair', TokenBucket(1000, 1000))
+    return calls
+
+
+def _collect(wallets):
+    async def scenario():
+        return [item async for item in stream_wallet_balances(wallets)]
+    return asyncio.run(scenario())
+
+
+def test_wallets_are_checked_concurrently(fake_provider):
+    wallets = [(i, 'BTC', f"addr{i}") for i in range(20)]
+    started = time.monotonic()
+    results = _collect(wallets)
+    assert time.monotonic() - started < 1.0 # Nacheinander wären es 2 Sekunden
+    assert sorted(results) == [(i, f"addr{i} ok") for i in range(20)]
+
+
+def test_fast_results_arrive_first_and_errors_are_contained(fake_provider):
+    results = _collect([(1, 'BTC', "slow"), (2, 'ETH', "broken"), (3, 'LTC', "fast")])
+    assert results[-1] == (0, "slow ok")
+    assert dict(results)[1] == "Fehler bei der Abfrage."
+
+
+def test_provider_rate_limit_spaces_requests(fake_provider, monkeypatch):
+    monkeypatch.setitem(wallet_balances._provider_buckets, 'blockchair', TokenBucket(20, 1))
+    _collect([(i, 'BTC', f"addr{i}") for i in range(5)])
+    gaps = [b - a for a, b in zip(fake_provider, fake_provider[1:])]
+    assert min(gaps) >= 0.04 # 20 pro Sekunde
+
+
+def test_throttled_editor_skips_intermediate_states():
+    sent = []
+    now = [0.0]
+
+    async def edit(text):
+        sent.append(text)
+
+    async def scenario():
+        editor = ThrottledEditor(edit, interval=1.0, clock=lambda: now[0])
+        for i in range(10):
+            now[0] = i * 0.25
+            await editor.update(f"stand {i}")
+        await editor.update("stand 9", final=True)
+
+    asyncio.run(scenario())
+    assert sent == ["stand 0", "stand 4", "stand 8", "stand 9"]
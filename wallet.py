@@ -1,12 +1,19 @@
+import os
 import sqlite3
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, CallbackQueryHandler, CommandHandler, filters
 from telegram.constants import ParseMode
 
+from async_db import db
+from money import format_amount, parse_amount
+from ledger import snapshot_balances
+from idempotency import (
+    idempotency_key, claim_idempotency_key, release_idempotency_key, purge_expired_idempotency_keys
+)
 from database import (
     add_user_wallet, get_user_wallets, remove_user_wallet,
-    get_user_internal_balance, update_user_internal_balance
+    get_user_internal_balance
 )
 from wallet_history import (
     init_wallet_history_table, log_wallet_transaction, get_wallet_transactions
@@ -39,26 +46,30 @@ async def internal_transfer_receiver_handler(update: Update, context: ContextTyp
 
 async def internal_transfer_amount_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        amount = float(update.message.text.replace(',', '.'))
+        amount = parse_amount(update.message.text)
         if amount <= 0:
             raise ValueError
     except ValueError:
         await update.message.reply_text("Ungültiger Betrag. Bitte gib eine positive Zahl ein.")
         return States.INTERNAL_TRANSFER_AMOUNT
 
+    # Erneut zugestellte Nachricht: die Überweisung ist schon gelaufen oder läuft gerade
+    key = idempotency_key(update, 'transfer')
+    if await db.run(claim_idempotency_key, key) is not None:
+        return ConversationHandler.END
+
     sender_id = update.effective_user.id
     receiver_id = context.user_data.get('transfer_receiver_id')
-    sender_balance = get_user_internal_balance(sender_id)
+    sender_balance = await db.get_user_internal_balance(sender_id)
 
     if amount > sender_balance:
-        await update.message.reply_text(f"Unzureichendes Guthaben. Dein aktuelles Guthaben: {sender_balance:.2f} SCAMCOIN.")
+        await db.run(release_idempotency_key, key)
+        await update.message.reply_text(f"Unzureichendes Guthaben. Dein aktuelles Guthaben: {format_amount(sender_balance)} SCAMCOIN.")
         return States.INTERNAL_TRANSFER_AMOUNT
 
-    # Update balances
-    if update_user_internal_balance(sender_id, -amount) and update_user_internal_balance(receiver_id, amount):
-        log_wallet_transaction(sender_id, "SCAMCOIN", -amount, "transfer", f"Überweisung an Nutzer {receiver_id}")
-        log_wallet_transaction(receiver_id, "SCAMCOIN", amount, "transfer", f"Empfang von Nutzer {sender_id}")
-        await update.message.reply_text(f"✅ Überweisung von {amount:.2f} SCAMCOIN an Nutzer {receiver_id} erfolgreich.")
+    # Abbuchung, Gutschrift und Verlauf in einer Transaktion, das Guthaben wird dabei erneut geprüft
+    if await db.transfer_funds(sender_id, receiver_id, amount, idempotency_key=key):
+        await update.message.reply_text(f"✅ Überweisung von {format_amount(amount)} SCAMCOIN an Nutzer {receiver_id} erfolgreich.")
     else:
         await update.message.reply_text("❌ Fehler bei der Überweisung. Bitte versuche es später erneut.")
 
@@ -82,12 +93,15 @@ async def wallet_transaction_history(update: Update, context: ContextTypes.DEFAU
         else:
             amount, tx_type, timestamp, description = tx
             currency = ""
-        text += f"{timestamp}: {tx_type} {amount} {currency} - {description}\n"
+        text += f"{timestamp}: {tx_type} {format_amount(amount)} {currency} - {description}\n"
 
     await query.edit_message_text(text, reply_markup=await get_my_wallets_menu_keyboard(context))
 
 logger = logging.getLogger(__name__)
 
+RECONCILIATION_INTERVAL_SECONDS = int(os.environ.get("RECONCILIATION_INTERVAL_SECONDS", 3600)) # Abgleich Guthaben gegen Journal
+LEDGER_SNAPSHOT_INTERVAL_SECONDS = int(os.environ.get("LEDGER_SNAPSHOT_INTERVAL_SECONDS", 900)) # Saldo-Snapshots des Journals
+
 from main import States
 
 async def my_wallets_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -96,7 +110,7 @@ async def my_wallets_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     internal_balance = get_user_internal_balance(query.from_user.id)
 
     text = "Deine registrierten Wallets:\n\n"
-    text += f"▪️ Internes Guthaben: `{internal_balance:.2f} SCAMCOIN`\n"
+    text += f"▪️ Internes Guthaben: `{format_amount(internal_balance)} SCAMCOIN`\n"
 
     if wallets:
         text += "\nExterne Wallets:\n"
@@ -132,7 +146,7 @@ async def add_wallet_address_handler(update: Update, context: ContextTypes.DEFAU
         user_id = update.effective_user.id
         if add_user_wallet(user_id, currency, address):
             # Log wallet addition as a transaction
-            log_wallet_transaction(user_id, currency, 0.0, 'add_wallet', f'Added wallet {address}')
+            log_wallet_transaction(user_id, currency, 0, 'add_wallet', f'Added wallet {address}')
             await update.message.reply_text(f"✅ Wallet für **{currency}** wurde hinzugefügt!", parse_mode=ParseMode.MARKDOWN)
         else:
             await update.message.reply_text("❌ Fehler: Diese Wallet existiert bereits.")
@@ -168,7 +182,7 @@ async def remove_wallet_select_handler(update: Update, context: ContextTypes.DEF
         user_id = query.from_user.id
         if remove_user_wallet(wallet_id, user_id):
             # Log wallet removal as a transaction
-            log_wallet_transaction(user_id, '', 0.0, 'remove_wallet', f'Removed wallet id {wallet_id}')
+            log_wallet_transaction(user_id, '', 0, 'remove_wallet', f'Removed wallet id {wallet_id}')
             await query.answer("Wallet entfernt.", show_alert=True)
         else:
             await query.answer("Fehler beim Entfernen.", show_alert=True)
@@ -178,3 +192,30 @@ async def remove_wallet_select_handler(update: Update, context: ContextTypes.DEF
         if update.callback_query:
             await update.callback_query.edit_message_text("Ein Fehler ist aufgetreten.")
     return ConversationHandler.END
+
+async def reconcile_balances_job(context: ContextTypes.DEFAULT_TYPE):
+    # Guthaben müssen exakt ihrem Saldo im Journal entsprechen, jede Abweichung ist ein Buchungsfehler
+    result = await db.reconcile_balances()
+    if result['mismatches']:
+        for user_id, balance, ledger in result['mismatches'][:20]:
+            logger.error(f"Abgleich: Nutzer {user_id} hat Guthaben {format_amount(balance, 6)}, Journal ergibt {format_amount(ledger, 6)} SCAMCOIN.")
+        logger.error(f"Abgleich: {len(result['mismatches'])} von {result['accounts']} Konten weichen ab.")
+    else:
+        logger.info(f"Abgleich: {result['accounts']} Konten stimmen, Summe {format_amount(result['balance_total'])} SCAMCOIN.")
+
+async def snapshot_balances_job(context: ContextTypes.DEFAULT_TYPE):
+    # Hält das Nachrechnen eines Saldos auf die Einträge seit dem letzten Snapshot beschränkt
+    try:
+        accounts = await db.run(snapshot_balances)
+        if accounts:
+            logger.info(f"Journal-Snapshot für {accounts} Konten fortgeschrieben.")
+    except Exception as e:
+        logger.error(f"Fehler beim Journal-Snapshot: {e}")
+
+async def purge_idempotency_keys_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        purged = await db.run(purge_expired_idempotency_keys)
+        if purged:
+            logger.info(f"{purged} abgelaufene Idempotenz-Schlüssel gelöscht.")
+    except Exception as e:
+        logger.error(f"Fehler beim Löschen abgelaufener Idempotenz-Schlüssel: {e}")
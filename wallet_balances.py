@@ -0,0 +1,58 @@
+import os
+import asyncio
+import logging
+
+from rate_limit import TokenBucket
+from services import fetch_wallet_balance_blockchair
+
+logger = logging.getLogger(__name__)
+
+# =================================================================================
+# PARALLELE GUTHABENABFRAGE FÜR EXTERNE WALLETS
+# =================================================================================
+# Alle Wallets eines Nutzers werden gleichzeitig abgefragt. Eine globale Semaphore
+# begrenzt die Anfragen über alle Nutzer hinweg, ein Token-Bucket pro Anbieter
+# hält dessen Rate-Limit ein. Ergebnisse kommen in der Reihenfolge ihres
+# Eintreffens zurück, damit der Handler sie sofort anzeigen kann.
+
+WALLET_CHECK_CONCURRENCY = int(os.environ.get("WALLET_CHECK_CONCURRENCY", 16)) # Gleichzeitige Abfragen insgesamt
+WALLET_CHECK_TIMEOUT_SECONDS = float(os.environ.get("WALLET_CHECK_TIMEOUT_SECONDS", 15))
+
+# Anbieter -> (Abfragefunktion, Anfragen pro Sekunde, Burst)
+PROVIDERS = {
+    'blockchair': (fetch_wallet_balance_blockchair, float(os.environ.get("BLOCKCHAIR_RATE_PER_SECOND", 5)), 5),
+}
+
+_global_slots = asyncio.Semaphore(WALLET_CHECK_CONCURRENCY)
+_provider_buckets = {name: TokenBucket(rate, burst) for name, (_, rate, burst) in PROVIDERS.items()}
+
+
+def provider_for(currency: str) -> str:
+    # Blockchair deckt alle unterstützten Chains ab, weitere Anbieter kommen hier dazu
+    return 'blockchair'
+
+
+async def _check_one(index: int, currency: str, address: str):
+    provider = provider_for(currency)
+    fetch, _, _ = PROVIDERS[provider]
+    async with _global_slots:
+        await _provider_buckets[provider].acquire()
+        try:
+            return index, await asyncio.wait_for(fetch(currency, address), WALLET_CHECK_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            return index, "Zeitüberschreitung bei der Abfrage."
+        except Exception as e:
+            logger.error(f"Fehler bei der Guthabenabfrage für {currency} {address[:8]}...: {e}")
+            return index, "Fehler bei der Abfrage."
+
+
+async def stream_wallet_balances(wallets):
+    """Fragt alle Wallets (id, currency, address) gleichzeitig ab und liefert (index, text) in Eintreffreihenfolge."""
+    tasks = [asyncio.create_task(_check_one(index, currency, address))
+             for index, (_, currency, address) in enumerate(wallets)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel() # Falls der Aufrufer vorzeitig abbricht